@@ -1,5 +1,28 @@
 import abc
+import bisect
+import collections
 import enum
+import functools
+import itertools
+
+
+# The state of a single car in an elevator bank, as seen by the dispatcher when a rider requests a ride
+CarStatus = collections.namedtuple('CarStatus', ['location', 'assigned_riders'])
+
+
+@functools.lru_cache(maxsize=None)
+def get_class_by_name(class_name):
+    '''
+    Work some python magic -
+    Load the initial module (probably 'algo'), and then recursively import its children until left with the
+    relevant class type to instantiate.
+    The result is cached, so every class is only resolved once per process.
+    '''
+    module_name = ".".join(class_name.split(".")[:-1])
+    module = __import__(module_name)
+    for attribute in class_name.split(".")[1:]:
+        module = getattr(module, attribute)
+    return module
 
 
 class UpDown(enum.Enum):
@@ -12,7 +35,117 @@ class TaskType(enum.Enum):
     DROPOFF = 1
 
 
+class FloorBuckets(object):
+    '''
+    Task counts per floor, with a sorted index of the floors that have tasks.
+    Adding or removing a task on a floor that already has tasks costs O(1). The first task on a floor, or the last
+    one removed, costs O(F) (F - number of floors with tasks) to keep the floors sorted - F is at most the number of
+    floors, so the sorted list is cheaper than a tree in practice. The floors can be walked in order from any location
+    in O(log F) plus the walked floors, without sorting the tasks.
+    '''
+    def __init__(self):
+        self.floor_to_count = {}
+        self.sorted_floors = []
+
+    def add(self, floor):
+        count = self.floor_to_count.get(floor, 0)
+        if not count:
+            bisect.insort(self.sorted_floors, floor)
+        self.floor_to_count[floor] = count + 1
+
+    def remove(self, floor):
+        count = self.floor_to_count[floor] - 1
+        if count:
+            self.floor_to_count[floor] = count
+        else:
+            del self.floor_to_count[floor]
+            del self.sorted_floors[bisect.bisect_left(self.sorted_floors, floor)]
+
+    def count(self, floor):
+        return self.floor_to_count.get(floor, 0)
+
+    def __bool__(self):
+        return bool(self.sorted_floors)
+
+    def min_floor(self):
+        return self.sorted_floors[0]
+
+    def max_floor(self):
+        return self.sorted_floors[-1]
+
+    def floors_above(self, location, inclusive=True):
+        '''
+        Returns an iterator over the floors above the location (a float while the elevator is between floors),
+        in ascending order. Like the rest of the returned task sequences, it is only valid until the next change.
+        '''
+        start = (bisect.bisect_left if inclusive else bisect.bisect_right)(self.sorted_floors, location)
+        return itertools.islice(self.sorted_floors, start, None)
+
+    def floors_below(self, location, inclusive=True):
+        '''
+        Returns an iterator over the floors below the location, in descending order
+        '''
+        end = (bisect.bisect_right if inclusive else bisect.bisect_left)(self.sorted_floors, location)
+        return (self.sorted_floors[i] for i in range(end - 1, -1, -1))
+
+
+class Task(object):
+    '''
+    A single rider's pickup or dropoff task.
+    pickup_direction - the direction the rider requested, for algos that get it (see UpDownElevatorAlgoInterface)
+    '''
+    __slots__ = ('rider_id', 'floor', 'task_type', 'pickup_direction')
+
+    def __init__(self, rider_id, floor, task_type, pickup_direction=None):
+        self.rider_id = rider_id
+        self.floor = floor
+        self.task_type = task_type
+        self.pickup_direction = pickup_direction
+
+
+class TaskStore(object):
+    '''
+    The tasks an algo still has to handle. Tasks are indexed by (rider_id, task_type) so a rider's task is found and
+    removed in O(1), they are iterated in insertion order, and they are counted per floor in floor buckets.
+    '''
+    def __init__(self):
+        # (rider_id, task_type) -> Task, dicts keep the insertion order of the remaining tasks
+        self.tasks = {}
+        self.floors = FloorBuckets()
+
+    def add(self, rider_id, floor, task_type, pickup_direction=None):
+        task = Task(rider_id, floor, task_type, pickup_direction)
+        self.tasks[(rider_id, task_type)] = task
+        self.floors.add(floor)
+        return task
+
+    def get(self, rider_id, task_type):
+        return self.tasks[(rider_id, task_type)]
+
+    def remove(self, rider_id, task_type):
+        '''
+        Returns the removed task
+        '''
+        task = self.tasks.pop((rider_id, task_type))
+        self.floors.remove(task.floor)
+        return task
+
+    def __iter__(self):
+        return iter(self.tasks.values())
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __bool__(self):
+        return bool(self.tasks)
+
+
 class BaseAlgoInterface(abc.ABC):
+    '''
+    Every rider event returns the elevator's next tasks - an iterable of floors, which can be a list, or a view that
+    generates the floors lazily from the algo's state. The elevator consumes it without copying, so the algo must not
+    change a list it already returned, and a returned view is only valid until the algo's next event.
+    '''
     def __init__(self, elevator_conf, max_floor):
         self.current_timestamp = 0
         self.elevator_location = elevator_conf["INITIAL_FLOOR"]
@@ -20,17 +153,15 @@ class BaseAlgoInterface(abc.ABC):
         self.max_floor = max_floor
 
     @staticmethod
-    def get_algo(algo_class, elevator_conf, max_floor):
+    def get_algo_type(algo_class):
+        return get_class_by_name(algo_class)
+
+    @staticmethod
+    def get_algo(algo_class, elevator_conf, max_floor, **algo_kwargs):
         '''
-        Work some python magic -
-        Load the initial module (probably 'algo'), and then recursively import its children until left with the
-        relevant class type to instantiate.
+        algo_kwargs - passed on to the algo's constructor, for algos that take extra arguments (e.g. a model)
         '''
-        algo_module = ".".join(algo_class.split(".")[:-1])
-        module = __import__(algo_module)
-        for attribute in algo_class.split(".")[1:]:
-            module = getattr(module, attribute)
-        return module(elevator_conf, max_floor)
+        return BaseAlgoInterface.get_algo_type(algo_class)(elevator_conf, max_floor, **algo_kwargs)
 
     def get_algo_name(self):
         module_name_split = self.__module__.split('.')
@@ -50,7 +181,7 @@ class BaseAlgoInterface(abc.ABC):
         Used to register a rider's destination, for algorithms where the rider inputs his destination floor
         only upon entering the elevator.
 
-        Returns - list of next tasks to visit (floors)
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
         '''
         pass
 
@@ -65,7 +196,7 @@ class BaseAlgoInterface(abc.ABC):
         '''
         Signal the algo that a rider pickup took place
 
-        Returns - list of next tasks to visit (floors)
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
         '''
         pass
 
@@ -73,15 +204,59 @@ class BaseAlgoInterface(abc.ABC):
         '''
         Signal the algo that a rider dropoff took place
 
-        Returns - list of next tasks to visit (floors)
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
+        '''
+
+    # Batch events - all the riders requesting a ride at the same time, or picked up / dropped off at the same floor.
+    # By default every rider is handled on its own (and only the last returned tasks are used), algos override these
+    # to update their schedule once per batch.
+
+    def register_rider_sources(self, rider_sources):
+        '''
+        rider_sources - (rider_id, *event data) of every rider, the event data as returned by
+        convert_event_for_rider_registration
+
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
         '''
+        next_tasks = []
+        for rider_source in rider_sources:
+            next_tasks = self.register_rider_source(*rider_source)
+        return next_tasks
+
+    def report_rider_pickups(self, timestamp, elevator_location, rider_destinations):
+        '''
+        Signal the algo that riders were picked up, and register the destination floor every one of them input once
+        he walked into the elevator.
+        elevator_location - reported (see elevator_heartbeat) after every pickup, before the rider's destination is
+        registered
+        rider_destinations - (rider_id, destination_floor) of every rider picked up
+
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
+        '''
+        next_tasks = []
+        for rider_id, destination_floor in rider_destinations:
+            self.report_rider_pickup(timestamp, rider_id)
+            self.elevator_heartbeat(timestamp, elevator_location)
+            next_tasks = self.register_rider_destination(rider_id, destination_floor)
+        return next_tasks
+
+    def report_rider_dropoffs(self, timestamp, rider_ids):
+        '''
+        Signal the algo that riders were dropped off
+
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
+        '''
+        next_tasks = []
+        for rider_id in rider_ids:
+            next_tasks = self.report_rider_dropoff(timestamp, rider_id)
+        return next_tasks
 
 
 class NaiveElevatorAlgoInterface(BaseAlgoInterface):
     @abc.abstractmethod
     def register_rider_source(self, rider_id, source_floor):
         '''
-        Returns - list of next tasks to visit (floors)
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
         '''
         pass
 
@@ -96,7 +271,7 @@ class UpDownElevatorAlgoInterface(BaseAlgoInterface):
     @abc.abstractmethod
     def register_rider_source(self, rider_id, source_floor, direction: UpDown):
         '''
-        Returns - list of next tasks to visit (floors)
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
         '''
         pass
 
@@ -112,7 +287,7 @@ class DestinationFirstElevatorAlgoInterface(BaseAlgoInterface):
     @abc.abstractmethod
     def register_rider_source(self, rider_id, source_floor, destination_floor):
         '''
-        Returns - list of next tasks to visit (floors)
+        Returns - next tasks to visit (an iterable of floors, see BaseAlgoInterface)
         '''
         pass
 
@@ -121,3 +296,30 @@ class DestinationFirstElevatorAlgoInterface(BaseAlgoInterface):
         Destination-first algo receives both the source and the destination floors immediately
         '''
         return [source_floor, destination_floor]
+
+
+class BaseDispatcherInterface(abc.ABC):
+    '''
+    In an elevator bank, the dispatcher decides which car handles every rider request.
+    Every car then runs its own instance of a (single car) elevator algo.
+    '''
+    def __init__(self, elevator_conf, max_floor, cars_count):
+        self.elevator_conf = elevator_conf
+        self.max_floor = max_floor
+        self.cars_count = cars_count
+
+    @staticmethod
+    def get_dispatcher(dispatcher_class, elevator_conf, max_floor, cars_count):
+        return get_class_by_name(dispatcher_class)(elevator_conf, max_floor, cars_count)
+
+    def get_dispatcher_name(self):
+        return self.__module__.split('.')[-1].replace('_dispatcher', '')
+
+    @abc.abstractmethod
+    def assign_rider(self, timestamp, rider_id, source_floor, destination_floor, car_statuses):
+        '''
+        car_statuses - list of CarStatus, one per car, describing the cars at the request timestamp
+
+        Returns - the index of the car that should handle the rider
+        '''
+        pass
@@ -0,0 +1,78 @@
+import unittest
+from algo.algo_interface import FloorBuckets, NaiveElevatorAlgoInterface, TaskStore, TaskType
+
+
+class FloorBucketsTest(unittest.TestCase):
+    def test_floors_walk(self):
+        floor_buckets = FloorBuckets()
+        for floor in [5, 2, 8, 5, 1]:
+            floor_buckets.add(floor)
+        floor_buckets.remove(1)
+
+        self.assertEqual(floor_buckets.count(5), 2)
+        self.assertEqual((floor_buckets.min_floor(), floor_buckets.max_floor()), (2, 8))
+        self.assertEqual(list(floor_buckets.floors_above(5)), [5, 8])
+        self.assertEqual(list(floor_buckets.floors_above(5, inclusive=False)), [8])
+        self.assertEqual(list(floor_buckets.floors_below(5.5)), [5, 2])
+        self.assertEqual(list(floor_buckets.floors_below(5, inclusive=False)), [2])
+
+
+class TaskStoreTest(unittest.TestCase):
+    def test_insertion_order_and_removal(self):
+        task_store = TaskStore()
+        task_store.add(1, 3, TaskType.PICKUP)
+        task_store.add(2, 7, TaskType.PICKUP)
+        task_store.add(1, 9, TaskType.DROPOFF)
+        task_store.add(3, 3, TaskType.PICKUP)
+
+        removed_task = task_store.remove(1, TaskType.PICKUP)
+        self.assertEqual((removed_task.rider_id, removed_task.floor), (1, 3))
+        self.assertEqual([(task.rider_id, task.floor) for task in task_store], [(2, 7), (1, 9), (3, 3)])
+        self.assertEqual(task_store.floors.count(3), 1)
+        self.assertEqual(len(task_store), 3)
+        self.assertEqual(task_store.get(1, TaskType.DROPOFF).floor, 9)
+
+
+class EventLogAlgo(NaiveElevatorAlgoInterface):
+    '''
+    Returns the events it got so far as its next tasks
+    '''
+    def __init__(self, elevator_conf, max_floor):
+        super().__init__(elevator_conf, max_floor)
+        self.events = []
+
+    def register_rider_source(self, rider_id, source_floor):
+        self.events.append(("source", rider_id, source_floor))
+        return list(self.events)
+
+    def register_rider_destination(self, rider_id, destination_floor):
+        self.events.append(("destination", rider_id, destination_floor))
+        return list(self.events)
+
+    def report_rider_pickup(self, timestamp, rider_id):
+        self.events.append(("pickup", rider_id))
+        return list(self.events)
+
+    def report_rider_dropoff(self, timestamp, rider_id):
+        self.events.append(("dropoff", rider_id))
+        return list(self.events)
+
+    def elevator_heartbeat(self, timestamp, elevator_location):
+        super().elevator_heartbeat(timestamp, elevator_location)
+        self.events.append(("heartbeat", timestamp, elevator_location))
+
+
+class BaseAlgoInterfaceTest(unittest.TestCase):
+    def test_default_batch_events(self):
+        algo = EventLogAlgo({"INITIAL_FLOOR": 1}, 10)
+        self.assertEqual(list(algo.register_rider_sources([])), [])
+        algo.register_rider_sources([(1, 3), (2, 5)])
+        algo.report_rider_pickups(10, 3, [(1, 7), (2, 4)])
+        # Every rider is handled on its own, and the last tasks are returned
+        self.assertEqual(algo.report_rider_dropoffs(20, [2, 1]), [
+            ("source", 1, 3), ("source", 2, 5), ("pickup", 1), ("heartbeat", 10, 3), ("destination", 1, 7),
+            ("pickup", 2), ("heartbeat", 10, 3), ("destination", 2, 4), ("dropoff", 2), ("dropoff", 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
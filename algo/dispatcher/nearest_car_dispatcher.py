@@ -0,0 +1,11 @@
+from algo.algo_interface import BaseDispatcherInterface
+
+
+class NearestCarDispatcher(BaseDispatcherInterface):
+    '''
+    The NearestCarDispatcher assigns every rider to the car closest to the rider's source floor,
+    breaking ties in favor of the car with the fewest riders already assigned to it
+    '''
+    def assign_rider(self, timestamp, rider_id, source_floor, destination_floor, car_statuses):
+        return min(range(len(car_statuses)),
+                   key=lambda car: (abs(car_statuses[car].location - source_floor), car_statuses[car].assigned_riders))
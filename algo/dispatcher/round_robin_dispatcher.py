@@ -0,0 +1,15 @@
+from algo.algo_interface import BaseDispatcherInterface
+
+
+class RoundRobinDispatcher(BaseDispatcherInterface):
+    '''
+    The RoundRobinDispatcher assigns riders to the cars in turns, ignoring the cars' state
+    '''
+    def __init__(self, elevator_conf, max_floor, cars_count):
+        super().__init__(elevator_conf, max_floor, cars_count)
+        self.next_car = 0
+
+    def assign_rider(self, timestamp, rider_id, source_floor, destination_floor, car_statuses):
+        car = self.next_car
+        self.next_car = (self.next_car + 1) % self.cars_count
+        return car
@@ -1,5 +1,5 @@
 from algo.algo_interface import NaiveElevatorAlgoInterface
-from algo.algo_interface import TaskType
+from algo.algo_interface import TaskStore, TaskType
 
 
 class FIFOElevatorAlgo(NaiveElevatorAlgoInterface):
@@ -7,30 +7,42 @@ class FIFOElevatorAlgo(NaiveElevatorAlgoInterface):
     The FIFOElevatorAlgo always handles tasks in the order in which they registered into the system, no matter
     the elevator will just go past another potential task.
     '''
-    class Task(object):
-        def __init__(self, rider_id, floor, task_type):
-            self.rider_id = rider_id
-            self.floor = floor
-            self.task_type = task_type
-
     def __init__(self, elevator_conf, max_floor):
         super().__init__(elevator_conf, max_floor)
-        self.tasks = []
+        self.task_store = TaskStore()
+
+    def _get_next_tasks(self):
+        return (task.floor for task in self.task_store)
 
     def register_rider_source(self, rider_id, source_floor):
-        self.tasks.append(FIFOElevatorAlgo.Task(rider_id, source_floor, TaskType.PICKUP))
-        return [task.floor for task in self.tasks]
+        self.task_store.add(rider_id, source_floor, TaskType.PICKUP)
+        return self._get_next_tasks()
 
     def register_rider_destination(self, rider_id, destination_floor):
-        self.tasks.append(FIFOElevatorAlgo.Task(rider_id, destination_floor, TaskType.DROPOFF))
-        return [task.floor for task in self.tasks]
+        self.task_store.add(rider_id, destination_floor, TaskType.DROPOFF)
+        return self._get_next_tasks()
 
     def report_rider_pickup(self, timestamp, rider_id):
-        pickup_task = [a for a in self.tasks if a.rider_id == rider_id and a.task_type == TaskType.PICKUP][0]
-        self.tasks.remove(pickup_task)
-        return [task.floor for task in self.tasks]
+        self.task_store.remove(rider_id, TaskType.PICKUP)
+        return self._get_next_tasks()
 
     def report_rider_dropoff(self, timestamp, rider_id):
-        pickup_task = [a for a in self.tasks if a.rider_id == rider_id and a.task_type == TaskType.DROPOFF][0]
-        self.tasks.remove(pickup_task)
-        return [task.floor for task in self.tasks]
+        self.task_store.remove(rider_id, TaskType.DROPOFF)
+        return self._get_next_tasks()
+
+    def register_rider_sources(self, rider_sources):
+        for rider_id, source_floor in rider_sources:
+            self.task_store.add(rider_id, source_floor, TaskType.PICKUP)
+        return self._get_next_tasks()
+
+    def report_rider_pickups(self, timestamp, elevator_location, rider_destinations):
+        self.elevator_heartbeat(timestamp, elevator_location)
+        for rider_id, destination_floor in rider_destinations:
+            self.task_store.remove(rider_id, TaskType.PICKUP)
+            self.task_store.add(rider_id, destination_floor, TaskType.DROPOFF)
+        return self._get_next_tasks()
+
+    def report_rider_dropoffs(self, timestamp, rider_ids):
+        for rider_id in rider_ids:
+            self.task_store.remove(rider_id, TaskType.DROPOFF)
+        return self._get_next_tasks()
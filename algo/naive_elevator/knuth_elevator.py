@@ -1,5 +1,6 @@
+import itertools
 from algo.algo_interface import NaiveElevatorAlgoInterface
-from algo.algo_interface import TaskType, UpDown
+from algo.algo_interface import TaskStore, TaskType, UpDown
 
 
 class KnuthElevatorAlgo(NaiveElevatorAlgoInterface):
@@ -8,26 +9,22 @@ class KnuthElevatorAlgo(NaiveElevatorAlgoInterface):
     1. Continue travelling in the same direction while there are remaining requests in that same direction.
     2. If there are no further requests in that direction,
         then stop and become idle, or change direction if there are requests in the opposite direction.
-    '''
-    class Task(object):
-        def __init__(self, rider_id, floor, task_type):
-            self.rider_id = rider_id
-            self.floor = floor
-            self.task_type = task_type
 
+    Tasks are kept in floor buckets, so every event updates the schedule in O(log F) instead of re-sorting all the
+    tasks, and the next tasks are generated lazily by walking the floors from the elevator location.
+    '''
     def __init__(self, elevator_conf, max_floor):
         super().__init__(elevator_conf, max_floor)
-        self.all_tasks = []
+        self.task_store = TaskStore()
+        self.task_floors = self.task_store.floors
         # Arbitrarily set initial direction as "UP" if the elevator location is not the top floor
         self.current_direction = UpDown.UP if self.elevator_location < self.max_floor else UpDown.DOWN
 
     def _remaining_tasks_in_current_direction(self):
-        if (self.current_direction == UpDown.UP and [a for a in self.all_tasks if a.floor >= self.elevator_location]) \
-                or \
-                (self.current_direction == UpDown.DOWN and [a for a in self.all_tasks if a.floor <= self.elevator_location]):
-            return True
+        if self.current_direction == UpDown.UP:
+            return self.task_floors.max_floor() >= self.elevator_location
         else:
-            return False
+            return self.task_floors.min_floor() <= self.elevator_location
 
     def _change_direction(self):
         if self.current_direction == UpDown.UP:
@@ -35,44 +32,65 @@ class KnuthElevatorAlgo(NaiveElevatorAlgoInterface):
         else:
             self.current_direction = UpDown.UP
 
+    def _update_direction(self):
+        # If no more tasks in current direction - change direction
+        if self.task_floors and not self._remaining_tasks_in_current_direction():
+            self._change_direction()
+
     def _get_next_tasks(self):
         # If not more tasks - return an empty list
-        if not self.all_tasks:
+        if not self.task_floors:
             return []
 
-        # If no more tasks in current direction - change direction
-        if not self._remaining_tasks_in_current_direction():
-            self._change_direction()
+        self._update_direction()
 
-        # Return ordered list of tasks in the current direction followed be reverse direction
+        # Tasks in the current direction followed be reverse direction, every floor repeated once per task
         if self.current_direction == UpDown.UP:
-            current_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor >= self.elevator_location],
-                                             reverse=False)
-            reverse_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor < self.elevator_location],
-                                             reverse=True)
+            floors = itertools.chain(self.task_floors.floors_above(self.elevator_location),
+                                     self.task_floors.floors_below(self.elevator_location, inclusive=False))
         else:
-            current_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor <= self.elevator_location],
-                                             reverse=True)
-            reverse_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor > self.elevator_location],
-                                             reverse=False)
+            floors = itertools.chain(self.task_floors.floors_below(self.elevator_location),
+                                     self.task_floors.floors_above(self.elevator_location, inclusive=False))
 
-        next_tasks = current_direction_tasks + reverse_direction_tasks
-        return next_tasks
+        return itertools.chain.from_iterable(itertools.repeat(floor, self.task_floors.count(floor))
+                                             for floor in floors)
 
     def register_rider_source(self, rider_id, source_floor):
-        self.all_tasks.append(KnuthElevatorAlgo.Task(rider_id, source_floor, TaskType.PICKUP))
+        self.task_store.add(rider_id, source_floor, TaskType.PICKUP)
         return self._get_next_tasks()
 
     def register_rider_destination(self, rider_id, destination_floor):
-        self.all_tasks.append(KnuthElevatorAlgo.Task(rider_id, destination_floor, TaskType.DROPOFF))
+        self.task_store.add(rider_id, destination_floor, TaskType.DROPOFF)
         return self._get_next_tasks()
 
     def report_rider_pickup(self, timestamp, rider_id):
-        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.PICKUP][0]
-        self.all_tasks.remove(pickup_task)
+        self.task_store.remove(rider_id, TaskType.PICKUP)
         return self._get_next_tasks()
 
     def report_rider_dropoff(self, timestamp, rider_id):
-        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.DROPOFF][0]
-        self.all_tasks.remove(pickup_task)
+        self.task_store.remove(rider_id, TaskType.DROPOFF)
+        return self._get_next_tasks()
+
+    # Batch events only generate the next tasks once, but the direction is still updated after every rider's event
+    # (as it would be if the riders were handled one by one)
+
+    def register_rider_sources(self, rider_sources):
+        for rider_id, source_floor in rider_sources:
+            self.task_store.add(rider_id, source_floor, TaskType.PICKUP)
+            self._update_direction()
+        return self._get_next_tasks()
+
+    def report_rider_pickups(self, timestamp, elevator_location, rider_destinations):
+        for rider_id, destination_floor in rider_destinations:
+            self.task_store.remove(rider_id, TaskType.PICKUP)
+            self._update_direction()
+            self.elevator_heartbeat(timestamp, elevator_location)
+            self.task_store.add(rider_id, destination_floor, TaskType.DROPOFF)
+            self._update_direction()
+        return self._get_next_tasks()
+
+    def report_rider_dropoffs(self, timestamp, rider_ids):
+        for rider_id in rider_ids:
+            self.task_store.remove(rider_id, TaskType.DROPOFF)
+            self._update_direction()
         return self._get_next_tasks()
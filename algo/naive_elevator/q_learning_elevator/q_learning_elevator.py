@@ -1,7 +1,9 @@
 import enum
+import itertools
 
 from algo.algo_interface import NaiveElevatorAlgoInterface, UpDown
-from algo.algo_interface import TaskType
+from algo.algo_interface import TaskStore, TaskType
+from algo.naive_elevator.q_learning_elevator.q_table import DenseQTable, create_q_table
 
 import numpy as np
 import collections
@@ -12,6 +14,11 @@ import pickle
 MAX_FLOOR_TASKS_TO_COUNT = 3
 REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND = 10
 
+# Q table backend - a dense table is used as long as it has up to this many (state, action) entries,
+# bigger state spaces (10+ floors) use a sparse table, optionally capped to a max number of states (LRU eviction)
+DENSE_Q_TABLE_MAX_ENTRIES = 10 ** 7
+SPARSE_Q_TABLE_MAX_STATES = None
+
 # Q-learning constants
 INITIAL_EPSILON = 1
 MIN_EPSILON = 0.05
@@ -24,6 +31,25 @@ ROUND_TO_START_LEARNING_DECAY = 0
 ROUND_TO_END_LEARNING_DECAY = 10000
 
 
+def get_next_episode_params(episode, epsilon, learning_rate):
+    '''
+    Returns the (episode, epsilon, learning rate) of the episode following the given one
+    '''
+    # This is a new episode, so increment the counter
+    episode += 1
+
+    # If needed, decay epsilon and learning rate
+    if ROUND_TO_END_LEARNING_DECAY >= episode >= ROUND_TO_START_LEARNING_DECAY:
+        count_rounds_to_decay = ROUND_TO_END_LEARNING_DECAY - ROUND_TO_START_LEARNING_DECAY
+        epsilon_decay_factor = (MIN_EPSILON / INITIAL_EPSILON) ** (1 / count_rounds_to_decay)
+        learning_decay_factor = (MIN_LEARNING_RATE / INITIAL_LEARNING_RATE) ** (1 / count_rounds_to_decay)
+
+        epsilon = max(MIN_EPSILON, epsilon * epsilon_decay_factor)
+        learning_rate = max(MIN_LEARNING_RATE, learning_rate * learning_decay_factor)
+
+    return episode, epsilon, learning_rate
+
+
 class DirectionTrend(enum.Enum):
     MOSTLY_UP = 0
     MOSTLY_DOWN = 1
@@ -34,47 +60,58 @@ class QLearningElevatorAlgo(NaiveElevatorAlgoInterface):
     '''
     The QLearningElevatorAlgo uses Q-learning to decide on the elevator action.
 
-    System state is (l, P1, P2 ... Pn, D1, D2 ... Dn) where:
+    System state is (l, d, P1, P2 ... Pn, D1, D2 ... Dn) where:
     l - discreet elevator location
     d - direction trend (mostly up / mostly down / neither)
-    Pi - number of pending pickups at floor i (1 <= i <= max_floor)
-    Di - number of registered dropoffs for floor i (1 <= i <= max_floor)
+    Pi - number of pending pickups at floor i (1 <= i <= max_floor), capped at MAX_FLOOR_TASKS_TO_COUNT
+    Di - number of registered dropoffs for floor i (1 <= i <= max_floor), capped at MAX_FLOOR_TASKS_TO_COUNT
 
     System actions are {1, 2 .. max_floor} and denote which floor the elevator is heading to next
     '''
     MODEL_PICKLE_FILENAME = "algo/naive_elevator/q_learning_elevator/model.pkl"
 
-    class Task(object):
-        def __init__(self, rider_id, floor, task_type):
-            self.rider_id = rider_id
-            self.floor = floor
-            self.task_type = task_type
-
-    def __init__(self, elevator_conf, max_floor):
+    def __init__(self, elevator_conf, max_floor, model=None):
+        '''
+        model - a model to continue training in memory as a new episode (see get_model), instead of loading the model
+        file. Used by the training loop, to avoid writing and reading the model file every episode.
+        '''
         super().__init__(elevator_conf, max_floor)
-        self.tasks = []
-        self.request_direction_times = []
+        self.task_store = TaskStore()
+        # The direction of the last REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND requests, and the count of every direction
+        # for all the requests before them
+        self.recent_request_directions = collections.deque()
+        self.older_request_direction_counts = {UpDown.UP: 0, UpDown.DOWN: 0}
+
+        # Pending pickups/dropoffs per floor (indexed by floor, index 0 is unused), updated on every task change
+        self.pickups_per_floor = np.zeros(max_floor + 1, dtype=np.int64)
+        self.dropoffs_per_floor = np.zeros(max_floor + 1, dtype=np.int64)
 
         # Q-learning related params
         self.action_space = list(range(1, max_floor+1))
         self.state_space = [max_floor, len(DirectionTrend)] + \
                            ([MAX_FLOOR_TASKS_TO_COUNT + 1] * max_floor) + \
                            ([MAX_FLOOR_TASKS_TO_COUNT + 1] * max_floor)
+        self._init_state_index()
         self.previous_state_and_action = None
 
         # Params for calculating reward
         self.last_action_ts = None
         self.rider_registration_ts = {}
 
-        try:
-            self.load_model_from_file()
-        except Exception as e:
-            self.reset_model()
+        if model is not None:
+            self.set_model(model)
+            self.start_new_episode()
+        else:
+            try:
+                self.load_model_from_file()
+            except Exception as e:
+                self.reset_model()
 
     ####################################################################################################
     # The following methods are responsible for maintaining a persistent state between multiple runs (episodes)
     def reset_model(self):
-        self.q_table = np.random.uniform(low=-200, high=-100, size=(self.state_space + [len(self.action_space)]))
+        self.q_table = create_q_table(self.state_space, len(self.action_space),
+                                      DENSE_Q_TABLE_MAX_ENTRIES, SPARSE_Q_TABLE_MAX_STATES)
         self.episode = 0
         self.epsilon = INITIAL_EPSILON
         self.learning_rate = INITIAL_LEARNING_RATE
@@ -83,44 +120,93 @@ class QLearningElevatorAlgo(NaiveElevatorAlgoInterface):
         with open(self.MODEL_PICKLE_FILENAME, 'rb') as file:
             (self.q_table, self.episode, self.epsilon, self.learning_rate) = pickle.load(file)
 
-        # This is a new episode, so increment the counter
-        self.episode += 1
+        # Model files saved before the Q table backends were added hold a plain array
+        if isinstance(self.q_table, np.ndarray):
+            self.q_table = DenseQTable(None, len(self.action_space), self.q_table)
 
-        # If needed, decay epsilon and learning rate
-        if ROUND_TO_END_LEARNING_DECAY >= self.episode >= ROUND_TO_START_LEARNING_DECAY:
-            count_rounds_to_decay = ROUND_TO_END_LEARNING_DECAY - ROUND_TO_START_LEARNING_DECAY
-            epsilon_decay_factor = (MIN_EPSILON / INITIAL_EPSILON) ** (1 / count_rounds_to_decay)
-            learning_decay_factor = (MIN_LEARNING_RATE / INITIAL_LEARNING_RATE) ** (1 / count_rounds_to_decay)
+        self.start_new_episode()
 
-            self.epsilon = max(MIN_EPSILON, self.epsilon * epsilon_decay_factor)
-            self.learning_rate = max(MIN_LEARNING_RATE, self.learning_rate * learning_decay_factor)
+    def start_new_episode(self):
+        self.episode, self.epsilon, self.learning_rate = \
+            get_next_episode_params(self.episode, self.epsilon, self.learning_rate)
+
+    def get_model(self):
+        '''
+        Returns the model - (q_table, episode, epsilon, learning_rate), the Q table is returned by reference
+        '''
+        return self.q_table, self.episode, self.epsilon, self.learning_rate
+
+    def set_model(self, model):
+        (self.q_table, self.episode, self.epsilon, self.learning_rate) = model
 
     def save_model_to_file(self):
         with open(self.MODEL_PICKLE_FILENAME, 'wb') as file:
-            pickle.dump((self.q_table, self.episode, self.epsilon, self.learning_rate), file)
+            pickle.dump(self.get_model(), file)
 
     ####################################################################################################
 
+    def _init_state_index(self):
+        '''
+        The state is flattened (row-major, like np.ravel_multi_index) into a single integer.
+        The floor tasks part of the index is kept up to date on every task change, so getting the current state index
+        is O(1) instead of counting all the tasks on every decision.
+        '''
+        # Strides are plain python ints, since the state space of a large building overflows int64
+        state_strides = []
+        stride = 1
+        for dimension_size in reversed(self.state_space):
+            state_strides.append(stride)
+            stride *= dimension_size
+        state_strides.reverse()
+
+        self.location_stride = state_strides[0]
+        self.direction_trend_stride = state_strides[1]
+        # Indexed by floor, same as the per floor task counts
+        self.pickup_strides = [0] + state_strides[2:2 + self.max_floor]
+        self.dropoff_strides = [0] + state_strides[2 + self.max_floor:]
+        self.floor_tasks_state_index = 0
+
+    def _update_floor_task_count(self, tasks_per_floor, strides, floor, delta):
+        previous_count = int(tasks_per_floor[floor])
+        tasks_per_floor[floor] = previous_count + delta
+        # Task counts are capped, so the state only changes while below the cap
+        capped_delta = min(previous_count + delta, MAX_FLOOR_TASKS_TO_COUNT) - \
+            min(previous_count, MAX_FLOOR_TASKS_TO_COUNT)
+        self.floor_tasks_state_index += capped_delta * strides[floor]
+
+    def _add_task(self, rider_id, floor, task_type):
+        self.task_store.add(rider_id, floor, task_type)
+        if task_type == TaskType.PICKUP:
+            self._update_floor_task_count(self.pickups_per_floor, self.pickup_strides, floor, 1)
+        else:
+            self._update_floor_task_count(self.dropoffs_per_floor, self.dropoff_strides, floor, 1)
+
+    def _remove_task(self, rider_id, task_type):
+        task = self.task_store.remove(rider_id, task_type)
+        if task_type == TaskType.PICKUP:
+            self._update_floor_task_count(self.pickups_per_floor, self.pickup_strides, task.floor, -1)
+        else:
+            self._update_floor_task_count(self.dropoffs_per_floor, self.dropoff_strides, task.floor, -1)
+
     def _discreet_elevator_location(self):
         '''
         For simplicity, just round the elevator's location to the nearest integer floor
         '''
         return int(round(self.elevator_location))
 
+    def _add_request_direction(self, direction):
+        self.recent_request_directions.append(direction)
+        if len(self.recent_request_directions) > REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND:
+            self.older_request_direction_counts[self.recent_request_directions.popleft()] += 1
+
     def _direction_trend(self):
         '''
-        Given the general request direction trend, over the last REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND requests
-        We can say a specific direction is a "trend", if >=70% of the requests are following it
+        Given the general request direction trend, over the requests before the last
+        REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND requests, we can say a specific direction is a "trend",
+        if the number of requests following it is >=70% of REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND
         '''
-        directions_list = [x["direction"] for x in sorted(self.request_direction_times,
-                                                          key=lambda a: a["timestamp"], reverse=False)]
-        up = 0
-        down = 0
-        for direction in directions_list[:-REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND]:
-            if direction == UpDown.UP:
-                up += 1
-            else:
-                down += 1
+        up = self.older_request_direction_counts[UpDown.UP]
+        down = self.older_request_direction_counts[UpDown.DOWN]
 
         if up / REQUESTS_TO_CONSIDER_FOR_DIRECTION_TREND >= 0.7:
             return DirectionTrend.MOSTLY_UP
@@ -131,32 +217,11 @@ class QLearningElevatorAlgo(NaiveElevatorAlgoInterface):
 
     def _get_state(self):
         '''
-        System state is (l, P1, P2 ... Pn, D1, D2 ... Dn) where:
-        l - discreet elevator location
-        Pi - number of pending pickups at floor i (1 <= i <= max_floor)
-        Di - number of registered dropoffs for floor i (1 <= i <= max_floor)
-        '''
-        # Note: using collections.Counter to count pickups/dropoffs in each floor, and sorting by floor
-        pickups_counter = collections.Counter([t.floor - 1 for t in self.tasks if t.task_type == TaskType.PICKUP])
-        dropoffs_counter = collections.Counter([t.floor - 1 for t in self.tasks if t.task_type == TaskType.DROPOFF])
-
-        # Add floors with no tasks to the pickup/dropoff collections,
-        # and make sure floor task count doesn't exceed the max value
-        for floor in range(self.max_floor):
-            if floor not in pickups_counter:
-                pickups_counter[floor] = 0
-            else:
-                pickups_counter[floor] = min(pickups_counter[floor], MAX_FLOOR_TASKS_TO_COUNT)
-
-            if floor not in dropoffs_counter:
-                dropoffs_counter[floor] = 0
-            else:
-                dropoffs_counter[floor] = min(dropoffs_counter[floor], MAX_FLOOR_TASKS_TO_COUNT)
-
-        state = [self._discreet_elevator_location() - 1, self._direction_trend().value] + \
-                list(pickups_counter.values()) + \
-                list(dropoffs_counter.values())
-        return tuple(state)
+        System state is (l, d, P1, P2 ... Pn, D1, D2 ... Dn) (see class docstring), returned as its flat index
+        '''
+        return (self._discreet_elevator_location() - 1) * self.location_stride + \
+            self._direction_trend().value * self.direction_trend_stride + \
+            self.floor_tasks_state_index
 
     def _last_action_reward(self):
         '''
@@ -171,7 +236,7 @@ class QLearningElevatorAlgo(NaiveElevatorAlgoInterface):
         '''
         Actually runs the Q-learning RL process and returns the action (action is the next floor to go to)
         '''
-        if not self.tasks:
+        if not self.task_store:
             return []
 
         current_state = self._get_state()
@@ -183,61 +248,49 @@ class QLearningElevatorAlgo(NaiveElevatorAlgoInterface):
         else:
             # Get random action - a random floor out of those floors with a task in them
             # Floors are [1..max_floor] while actions are [0..(max_floor-1)], so we substract -1 from the floors
-            current_action = np.random.choice(list(set([(x.floor - 1) for x in self.tasks])))
+            current_action = np.random.choice(list(set([(x.floor - 1) for x in self.task_store])))
 
         # Update the previous state's q value, only if some time has passed
         # (implying that the elevator really acted on the previous decision)
         if self.previous_state_and_action and self.last_action_ts != self.current_timestamp:
             reward = self._last_action_reward()
 
+            previous_state, previous_action = self.previous_state_and_action
             max_current_q = np.max(self.q_table[current_state])
-            previous_q = self.q_table[self.previous_state_and_action]
+            previous_q = self.q_table[previous_state][previous_action]
             updated_q = (1 - self.learning_rate) * previous_q + self.learning_rate * (reward + DISCOUNT * max_current_q)
 
             # Update Q table with new Q value
-            self.q_table[self.previous_state_and_action] = updated_q
+            self.q_table[previous_state][previous_action] = updated_q
 
-        self.previous_state_and_action = current_state + (current_action,)
+        self.previous_state_and_action = (current_state, current_action)
         self.last_action_ts = self.current_timestamp
 
         # Floors are [1..max_floor] while actions are [0..(max_floor-1)], so we add +1 to returned value
         next_floor = current_action + 1
         # We add all subsequent floors to make sure all next tasks are passed to the elevator queue
         # (this helps us avoid some weird corner cases)
-        subsequent_floors = [t.floor for t in self.tasks if t.floor != next_floor]
-        return [next_floor] + subsequent_floors
+        subsequent_floors = (t.floor for t in self.task_store if t.floor != next_floor)
+        return itertools.chain([next_floor], subsequent_floors)
 
     def register_rider_source(self, rider_id, source_floor):
-        self.tasks.append(QLearningElevatorAlgo.Task(rider_id, source_floor, TaskType.PICKUP))
+        self._add_task(rider_id, source_floor, TaskType.PICKUP)
         self.rider_registration_ts[rider_id] = self.current_timestamp
         return self._get_next_floor_tasks()
 
     def register_rider_destination(self, rider_id, destination_floor):
-        self.tasks.append(QLearningElevatorAlgo.Task(rider_id, destination_floor, TaskType.DROPOFF))
-        self.request_direction_times.append({
-            "timestamp": self.current_timestamp,
-            "direction": UpDown.UP if destination_floor > self.elevator_location else UpDown.DOWN
-        })
+        self._add_task(rider_id, destination_floor, TaskType.DROPOFF)
+        self._add_request_direction(UpDown.UP if destination_floor > self.elevator_location else UpDown.DOWN)
         return self._get_next_floor_tasks()
 
     def report_rider_pickup(self, timestamp, rider_id):
-        pickup_task = [a for a in self.tasks if a.rider_id == rider_id and a.task_type == TaskType.PICKUP][0]
-        self.tasks.remove(pickup_task)
+        self._remove_task(rider_id, TaskType.PICKUP)
         return self._get_next_floor_tasks()
 
     def report_rider_dropoff(self, timestamp, rider_id):
-        pickup_task = [a for a in self.tasks if a.rider_id == rider_id and a.task_type == TaskType.DROPOFF][0]
-        self.tasks.remove(pickup_task)
+        self._remove_task(rider_id, TaskType.DROPOFF)
         # Note - I have to calculate next tasks before removing the rider from rider_registration_ts, since
         # we need this entry to accurately calculate reward
         next_tasks = self._get_next_floor_tasks()
         del self.rider_registration_ts[rider_id]
         return next_tasks
-
-    def _load_model_from_file(self):
-        with open(self.MODEL_PICKLE_FILENAME, 'wb') as file:
-            self.q_table = pickle.load(file)
-
-    def _save_model_to_file(self):
-        with open(self.MODEL_PICKLE_FILENAME, 'wb') as file:
-            pickle.dump(self.q_table, file)
@@ -0,0 +1,131 @@
+import collections
+import numpy as np
+
+# Initial Q values are drawn uniformly from this range
+INITIAL_Q_LOW = -200
+INITIAL_Q_HIGH = -100
+
+
+class DenseQTable(object):
+    '''
+    Q table holding every (state, action) pair in a single preallocated array.
+    This is the fast path, but its size is exponential in the number of floors, so it only fits small buildings.
+    '''
+    def __init__(self, state_space, actions_count, values=None):
+        '''
+        values - an existing N-dimensional Q table (state_space + [actions_count]), a random one is created if None
+        '''
+        if values is None:
+            values = np.random.uniform(low=INITIAL_Q_LOW, high=INITIAL_Q_HIGH, size=(state_space + [actions_count]))
+
+        # Kept in its N-dimensional shape, and accessed through a 2D view of (flat state index, action)
+        self.values = values
+        self.state_values = values.reshape((-1, actions_count))
+
+    def __getitem__(self, state_index):
+        '''
+        Returns the Q values of all the actions of the state (a writable view)
+        '''
+        return self.state_values[state_index]
+
+    def __len__(self):
+        return len(self.state_values)
+
+    def copy(self):
+        return DenseQTable(None, self.state_values.shape[-1], self.values.copy())
+
+    def merge_updates(self, updated_q_tables):
+        '''
+        Merges Q tables that were trained (e.g. in parallel) starting from a copy of this table.
+        Every entry changes by the mean of the changes made to it, over the tables that changed it.
+        '''
+        changes_sum = np.zeros_like(self.values)
+        changes_count = np.zeros(self.values.shape, dtype=np.int64)
+        for updated_q_table in updated_q_tables:
+            changes = updated_q_table.values - self.values
+            changes_sum += changes
+            changes_count += (changes != 0)
+
+        self.values += changes_sum / np.maximum(changes_count, 1)
+
+    def __getstate__(self):
+        # The 2D view is rebuilt on load, pickling it would store the whole table twice
+        return self.values
+
+    def __setstate__(self, values):
+        self.__init__(None, values.shape[-1], values)
+
+
+class SparseQTable(object):
+    '''
+    Q table holding only the states that were actually visited, so its size depends on the training and not on the
+    size of the building. Unseen states are initialized lazily, the same way the dense table initializes all states.
+
+    If max_states is set, the table is capped to that number of states by evicting the least recently used state
+    (its learned values are lost, and it is re-initialized if visited again).
+    '''
+    def __init__(self, actions_count, max_states=None):
+        self.actions_count = actions_count
+        self.max_states = max_states
+        self.state_values = collections.OrderedDict()
+
+    def __getitem__(self, state_index):
+        '''
+        Returns the Q values of all the actions of the state (a writable array)
+        '''
+        values = self.state_values.get(state_index)
+        if values is None:
+            values = np.random.uniform(low=INITIAL_Q_LOW, high=INITIAL_Q_HIGH, size=self.actions_count)
+            self.state_values[state_index] = values
+            if self.max_states is not None and len(self.state_values) > self.max_states:
+                self.state_values.popitem(last=False)
+        elif self.max_states is not None:
+            self.state_values.move_to_end(state_index)
+
+        return values
+
+    def __len__(self):
+        return len(self.state_values)
+
+    def copy(self):
+        q_table = SparseQTable(self.actions_count, self.max_states)
+        q_table.state_values = collections.OrderedDict((state_index, values.copy())
+                                                       for state_index, values in self.state_values.items())
+        return q_table
+
+    def merge_updates(self, updated_q_tables):
+        '''
+        Merges Q tables that were trained (e.g. in parallel) starting from a copy of this table.
+        Every entry changes by the mean of the changes made to it, over the tables that changed it.
+        States that are new to this table get the mean of their (independently initialized) values.
+        '''
+        state_to_updated_values = collections.defaultdict(list)
+        for updated_q_table in updated_q_tables:
+            for state_index, values in updated_q_table.state_values.items():
+                state_to_updated_values[state_index].append(values)
+
+        for state_index, updated_values in state_to_updated_values.items():
+            values = self.state_values.get(state_index)
+            if values is None:
+                self.state_values[state_index] = np.mean(updated_values, axis=0)
+                continue
+
+            changes = np.array(updated_values) - values
+            values += changes.sum(axis=0) / np.maximum(np.count_nonzero(changes, axis=0), 1)
+
+        while self.max_states is not None and len(self.state_values) > self.max_states:
+            self.state_values.popitem(last=False)
+
+
+def create_q_table(state_space, actions_count, dense_max_entries, sparse_max_states=None):
+    '''
+    Uses a dense table if it has up to dense_max_entries (state, action) entries, and a sparse one otherwise
+    '''
+    entries = actions_count
+    for dimension_size in state_space:
+        entries *= dimension_size
+
+    if entries <= dense_max_entries:
+        return DenseQTable(state_space, actions_count)
+
+    return SparseQTable(actions_count, sparse_max_states)
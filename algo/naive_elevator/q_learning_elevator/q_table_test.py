@@ -0,0 +1,70 @@
+import pickle
+import unittest
+import numpy as np
+from algo.naive_elevator.q_learning_elevator.q_table import DenseQTable, SparseQTable, create_q_table, INITIAL_Q_LOW, \
+    INITIAL_Q_HIGH
+
+
+class QTableTest(unittest.TestCase):
+    def test_create_q_table_by_size(self):
+        self.assertIsInstance(create_q_table([3, 3, 4, 4], 3, dense_max_entries=1000), DenseQTable)
+        self.assertIsInstance(create_q_table([3, 3, 4, 4], 3, dense_max_entries=100), SparseQTable)
+        # A 100 floor building, way too big for a dense table
+        self.assertIsInstance(create_q_table([100, 3] + [4] * 200, 100, dense_max_entries=10 ** 7), SparseQTable)
+
+    def test_dense_state_values_are_writable(self):
+        q_table = DenseQTable([2, 3], 4)
+        q_table[5][1] = 7
+        self.assertEqual(q_table.values[1, 2, 1], 7)
+        self.assertEqual(len(q_table), 6)
+
+    def test_sparse_lazy_initialization(self):
+        q_table = SparseQTable(4)
+        self.assertEqual(len(q_table), 0)
+
+        state_values = q_table[10 ** 30]
+        self.assertEqual(len(q_table), 1)
+        self.assertTrue(np.all((state_values >= INITIAL_Q_LOW) & (state_values <= INITIAL_Q_HIGH)))
+
+        q_table[10 ** 30][2] = 7
+        self.assertEqual(q_table[10 ** 30][2], 7)
+        self.assertEqual(len(q_table), 1)
+
+    def test_sparse_lru_eviction(self):
+        q_table = SparseQTable(2, max_states=2)
+        q_table[1][0] = 1
+        q_table[2][0] = 2
+        # State 1 is now the most recently used, so adding state 3 evicts state 2
+        self.assertEqual(q_table[1][0], 1)
+        q_table[3][0] = 3
+
+        self.assertEqual(len(q_table), 2)
+        self.assertEqual(set(q_table.state_values), {1, 3})
+
+    def test_merge_updates(self):
+        for q_table in [DenseQTable([2, 3], 4), SparseQTable(4)]:
+            q_table[0][0] = 10
+            q_table[1][0] = 10
+            first_actor, second_actor = q_table.copy(), q_table.copy()
+            first_actor[0][0] = 14
+            second_actor[0][0] = 12
+            second_actor[1][0] = 16
+            second_actor[5][3] = 3
+
+            q_table.merge_updates([first_actor, second_actor])
+            # Changed by both actors - the mean change, changed by a single actor - its change
+            self.assertEqual(q_table[0][0], 13)
+            self.assertEqual(q_table[1][0], 16)
+            self.assertEqual(q_table[5][3], 3)
+
+    def test_pickle(self):
+        for q_table in [DenseQTable([2, 3], 4), SparseQTable(4, max_states=10)]:
+            q_table[3][1] = 7
+            loaded_q_table = pickle.loads(pickle.dumps(q_table))
+            self.assertEqual(loaded_q_table[3][1], 7)
+            loaded_q_table[3][2] = 8
+            self.assertEqual(loaded_q_table[3][2], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
 import os
+import multiprocessing
+import pickle
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-from simulation_runner import SimulationRunner
+from simulation_runner import SimulationRunnerFactory
 from algo.naive_elevator.q_learning_elevator import q_learning_elevator
 
 Q_LEARNING_ALGO_CLASS = 'algo.naive_elevator.q_learning_elevator.q_learning_elevator.QLearningElevatorAlgo'
@@ -12,6 +15,14 @@ EPISODES = 50000
 q_learning_elevator.ROUND_TO_START_LEARNING_DECAY = 0
 q_learning_elevator.ROUND_TO_END_LEARNING_DECAY = EPISODES * (3 / 4)
 
+# The model is kept in memory between episodes, and only written to the model file every this many episodes
+CHECKPOINT_EVERY_EPISODES = 1000
+# Number of actor processes used by run_simulations_parallel - every actor trains its own copy of the model, and
+# their updates are merged into the model after every actor ran EPISODES_PER_SYNC episodes. With a single actor the
+# training runs serially (see run_training)
+ACTORS = os.cpu_count() or 1
+EPISODES_PER_SYNC = 25
+
 
 def visualize_training_results(df):
     plt.figure()
@@ -31,16 +42,34 @@ def visualize_training_results(df):
     plt.show()
 
 
+def save_training_results(performance_stats, should_visualize_results):
+    df = pd.DataFrame(performance_stats)
+    df.to_csv('algo/naive_elevator/q_learning_elevator/performance_stats.csv', index=False)
+
+    if should_visualize_results:
+        visualize_training_results(df)
+
+
+def save_model_to_file(model):
+    with open(q_learning_elevator.QLearningElevatorAlgo.MODEL_PICKLE_FILENAME, 'wb') as file:
+        pickle.dump(model, file)
+
+
 def run_simulations(scenarios_filenames, should_visualize_results=False):
     performance_stats = []
+    runner_factory = SimulationRunnerFactory(Q_LEARNING_ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE)
+    model = None
     for i, scenario_filename in enumerate(scenarios_filenames):
-        sim_runner = SimulationRunner(scenario_filename, Q_LEARNING_ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE)
+        sim_runner = runner_factory.get_runner(scenario_filename, algo_kwargs=dict(model=model))
 
         if i == 0:
             sim_runner.algo.reset_model()
 
         sim_runner.run_simulation()
-        sim_runner.algo.save_model_to_file()
+        # The next episode continues training this model in memory
+        model = sim_runner.algo.get_model()
+        if (i + 1) % CHECKPOINT_EVERY_EPISODES == 0 or i == len(scenarios_filenames) - 1:
+            sim_runner.algo.save_model_to_file()
         # sim_runner.write_visualization_data_file()
         performance_stats.append(sim_runner.get_performance_stats())
 
@@ -50,17 +79,107 @@ def run_simulations(scenarios_filenames, should_visualize_results=False):
             print()
             print()
 
-    df = pd.DataFrame(performance_stats)
-    df.to_csv('algo/naive_elevator/q_learning_elevator/performance_stats.csv', index=False)
+    save_training_results(performance_stats, should_visualize_results)
 
-    if should_visualize_results:
-        visualize_training_results(df)
+
+def _get_episode_params_after(episode_params, episodes):
+    for _ in range(episodes):
+        episode_params = q_learning_elevator.get_next_episode_params(*episode_params)
+
+    return episode_params
+
+
+def _get_actor_tasks(q_table, next_episode_params, round_scenarios, episodes_per_sync, training_seed, round_index):
+    '''
+    Returns the tasks of a round's actors - the model with the params of the actor's first episode, the actor's chunk
+    of the scenarios, and the actor's random seed (derived from the round and the actor's index in it)
+    '''
+    return [((q_table, *_get_episode_params_after(next_episode_params, chunk_start)),
+             round_scenarios[chunk_start:chunk_start + episodes_per_sync],
+             int(np.random.SeedSequence([training_seed, round_index, actor_index]).generate_state(1)[0]))
+            for actor_index, chunk_start in enumerate(range(0, len(round_scenarios), episodes_per_sync))]
+
+
+def _run_actor_episodes(actor_task):
+    '''
+    Trains a copy of the model on a chunk of scenarios, and returns the trained Q table and the episodes' stats.
+    Defined at module level so it can be pickled and sent to the actor processes.
+    '''
+    model, scenarios_filenames, seed = actor_task
+    # Forked actors inherit the parent's random state, so without their own seed they'd all explore the same way
+    np.random.seed(seed)
+    performance_stats = []
+    runner_factory = SimulationRunnerFactory(Q_LEARNING_ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE)
+    episode_model = model
+    for i, scenario_filename in enumerate(scenarios_filenames):
+        sim_runner = runner_factory.get_runner(scenario_filename, algo_kwargs=dict(model=episode_model))
+        if i == 0:
+            # The model already holds the (episode, epsilon, learning rate) of the actor's first episode
+            sim_runner.algo.set_model(model)
+
+        sim_runner.run_simulation()
+        episode_model = sim_runner.algo.get_model()
+        performance_stats.append(sim_runner.get_performance_stats())
+
+    return model[0], performance_stats
+
+
+def run_simulations_parallel(scenarios_filenames, should_visualize_results=False, actors=ACTORS,
+                             episodes_per_sync=EPISODES_PER_SYNC):
+    '''
+    Trains a fresh model like run_simulations, but spreads the episodes over actor processes.
+    Every round, each actor trains a copy of the model on its own consecutive chunk of the scenarios, with the
+    epsilon and learning rate of these episodes, and the actors' updates are merged into the model
+    (see merge_updates). The stats are kept in the scenarios order.
+    Every actor explores with its own random seed, all derived from a single draw of the global numpy random state.
+    '''
+    algo = SimulationRunnerFactory(Q_LEARNING_ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE).get_runner(
+        scenarios_filenames[0]).algo
+    algo.reset_model()
+    q_table, *next_episode_params = algo.get_model()
+    training_seed = np.random.randint(2 ** 31)
+
+    performance_stats = []
+    episodes_per_round = actors * episodes_per_sync
+    next_checkpoint = CHECKPOINT_EVERY_EPISODES
+    with multiprocessing.Pool(processes=actors) as pool:
+        for round_index, round_start in enumerate(range(0, len(scenarios_filenames), episodes_per_round)):
+            round_scenarios = scenarios_filenames[round_start:round_start + episodes_per_round]
+            actor_tasks = _get_actor_tasks(q_table, next_episode_params, round_scenarios, episodes_per_sync,
+                                           training_seed, round_index)
+
+            actors_results = pool.map(_run_actor_episodes, actor_tasks)
+            q_table.merge_updates([actor_q_table for actor_q_table, _ in actors_results])
+            for _, actor_performance_stats in actors_results:
+                performance_stats.extend(actor_performance_stats)
+
+            last_episode_params = _get_episode_params_after(next_episode_params, len(round_scenarios) - 1)
+            next_episode_params = _get_episode_params_after(last_episode_params, 1)
+
+            episodes_done = round_start + len(round_scenarios)
+            print(f"Running episode - {episodes_done}")
+            if episodes_done >= next_checkpoint or episodes_done == len(scenarios_filenames):
+                # Saved like run_simulations does, so loading the model file continues from the next episode
+                save_model_to_file((q_table, *last_episode_params))
+                next_checkpoint += CHECKPOINT_EVERY_EPISODES
+
+    save_training_results(performance_stats, should_visualize_results)
+
+
+def run_training(scenarios_filenames, should_visualize_results=False):
+    '''
+    Trains a fresh model on the scenarios, over ACTORS processes if there are more than one
+    '''
+    if ACTORS > 1:
+        run_simulations_parallel(scenarios_filenames, should_visualize_results, actors=ACTORS)
+    else:
+        run_simulations(scenarios_filenames, should_visualize_results)
 
 
 def train_on_single_scenario():
     simulation_filename = 'demand_simulation_data/manual_scenario/tiny_office_1.csv'
     scenarios = [simulation_filename] * EPISODES
-    run_simulations(scenarios, should_visualize_results=True)
+    run_training(scenarios, should_visualize_results=True)
 
 
 def train_on_scenarios_dir():
@@ -68,7 +187,7 @@ def train_on_scenarios_dir():
     sim_files = [os.path.join(simulations_dir, f) for f in os.listdir(simulations_dir) if f.endswith('.csv')]
 
     scenarios = sim_files * ((EPISODES // len(sim_files)) + 1)
-    run_simulations(scenarios[:EPISODES], should_visualize_results=True)
+    run_training(scenarios[:EPISODES], should_visualize_results=True)
 
 
 if "__main__" == __name__:
@@ -0,0 +1,118 @@
+import pickle
+import unittest
+from unittest import mock
+import numpy as np
+from algo.algo_interface import BaseAlgoInterface
+from algo.naive_elevator.q_learning_elevator import train_q_learning
+from algo.naive_elevator.q_learning_elevator.q_table import DenseQTable, SparseQTable
+from simulation_runner import SimulationRunnerFactory, load_elevator_configuration
+
+# Run from the repository root, like the simulation runner tests
+SIMULATION_FILENAME = 'demand_simulation_data/manual_scenario/tiny_office_1.csv'
+EPISODES = 10
+ACTORS = 2
+CHECKPOINT_EVERY_EPISODES = 4
+
+
+class TrainQLearningTest(unittest.TestCase):
+    def _assert_q_tables_equal(self, q_table, expected_q_table):
+        if isinstance(expected_q_table, DenseQTable):
+            np.testing.assert_array_equal(q_table.values, expected_q_table.values)
+        else:
+            self.assertEqual(list(q_table.state_values), list(expected_q_table.state_values))
+            for state_index, values in expected_q_table.state_values.items():
+                np.testing.assert_array_equal(q_table.state_values[state_index], values)
+
+    def test_run_simulations(self):
+        saved_models = []
+        with mock.patch.object(train_q_learning.q_learning_elevator.QLearningElevatorAlgo, 'save_model_to_file',
+                               lambda algo: saved_models.append(algo.get_model())), \
+                mock.patch.object(train_q_learning, 'save_training_results'):
+            train_q_learning.run_simulations([SIMULATION_FILENAME] * 3)
+
+        # Every episode continues training the same model in memory, and it's only saved after the last episode
+        self.assertEqual(len(saved_models), 1)
+        trained_q_table, episode, _, _ = saved_models[0]
+        self.assertEqual(episode, 2)
+
+        # The trained model is handed from episode to episode explicitly, algos created later start from their own
+        elevator_conf = load_elevator_configuration(train_q_learning.ELEVATOR_CONFIGURATION_FILE)["ELEVATOR"]
+        algo = BaseAlgoInterface.get_algo(train_q_learning.Q_LEARNING_ALGO_CLASS, elevator_conf, 4)
+        self.assertIsNot(algo.get_model()[0], trained_q_table)
+
+    def test_run_simulations_parallel(self):
+        # (Q table before the merge, the actors' Q tables) of every merge
+        merges = []
+        # (episode, Q table) of every saved model
+        checkpoints = []
+
+        def record_merge(original_merge_updates):
+            def merge_updates(q_table, updated_q_tables):
+                merges.append((q_table.copy(), [updated_q_table.copy() for updated_q_table in updated_q_tables]))
+                original_merge_updates(q_table, updated_q_tables)
+            return merge_updates
+
+        def record_checkpoint(model):
+            q_table, episode, _, _ = model
+            checkpoints.append((episode, q_table.copy()))
+
+        with mock.patch.object(DenseQTable, 'merge_updates', record_merge(DenseQTable.merge_updates)), \
+                mock.patch.object(SparseQTable, 'merge_updates', record_merge(SparseQTable.merge_updates)), \
+                mock.patch.object(train_q_learning, 'save_model_to_file', record_checkpoint), \
+                mock.patch.object(train_q_learning, 'save_training_results') as save_training_results, \
+                mock.patch.object(train_q_learning, 'CHECKPOINT_EVERY_EPISODES', CHECKPOINT_EVERY_EPISODES):
+            train_q_learning.run_simulations_parallel([SIMULATION_FILENAME] * EPISODES, actors=ACTORS,
+                                                      episodes_per_sync=1)
+
+        performance_stats, _ = save_training_results.call_args[0]
+        self.assertEqual(len(performance_stats), EPISODES)
+
+        # Every round merges the updates of all the actors into the model
+        self.assertEqual(len(merges), EPISODES // ACTORS)
+        expected_q_table = merges[0][0].copy()
+        for q_table_before_merge, actors_q_tables in merges:
+            self.assertEqual(len(actors_q_tables), ACTORS)
+            self._assert_q_tables_equal(q_table_before_merge, expected_q_table)
+            expected_q_table.merge_updates(actors_q_tables)
+        # (and the actors did train the model)
+        with self.assertRaises(AssertionError):
+            self._assert_q_tables_equal(expected_q_table, merges[0][0])
+
+        # The model is only saved every CHECKPOINT_EVERY_EPISODES episodes, and after the last episode (holding the
+        # 0 based number of the last episode it was trained on)
+        self.assertEqual([episode + 1 for episode, _ in checkpoints], [4, 8, 10])
+        self._assert_q_tables_equal(checkpoints[-1][1], expected_q_table)
+
+    def test_actors_explore_differently(self):
+        algo_class = train_q_learning.q_learning_elevator.QLearningElevatorAlgo
+        runner_factory = SimulationRunnerFactory(train_q_learning.Q_LEARNING_ALGO_CLASS,
+                                                 train_q_learning.ELEVATOR_CONFIGURATION_FILE)
+        algo = runner_factory.get_runner(SIMULATION_FILENAME).algo
+        algo.reset_model()
+        q_table, *next_episode_params = algo.get_model()
+        actor_tasks = train_q_learning._get_actor_tasks(q_table, next_episode_params, [SIMULATION_FILENAME] * ACTORS,
+                                                        1, training_seed=0, round_index=0)
+
+        # The actions every actor chose
+        actors_actions = []
+        original_get_next_floor_tasks = algo_class._get_next_floor_tasks
+
+        def get_next_floor_tasks(algo):
+            next_tasks = original_get_next_floor_tasks(algo)
+            if algo.previous_state_and_action is not None:
+                actors_actions[-1].append(int(algo.previous_state_and_action[1]))
+            return next_tasks
+
+        with mock.patch.object(algo_class, '_get_next_floor_tasks', get_next_floor_tasks):
+            for actor_task in actor_tasks:
+                actors_actions.append([])
+                # Like forked actors - every actor gets its own copy of the model, and the same global random state
+                np.random.seed(0)
+                train_q_learning._run_actor_episodes(pickle.loads(pickle.dumps(actor_task)))
+
+        self.assertTrue(all(actors_actions))
+        self.assertNotEqual(actors_actions[0], actors_actions[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
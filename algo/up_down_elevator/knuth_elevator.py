@@ -1,5 +1,7 @@
+import collections
+import itertools
 from algo.algo_interface import UpDownElevatorAlgoInterface
-from algo.algo_interface import TaskType, UpDown
+from algo.algo_interface import FloorBuckets, TaskStore, TaskType, UpDown
 
 
 class KnuthElevatorAlgo(UpDownElevatorAlgoInterface):
@@ -8,27 +10,28 @@ class KnuthElevatorAlgo(UpDownElevatorAlgoInterface):
     1. Continue travelling in the same direction while there are remaining requests in that same direction.
     2. If there are no further requests in that direction,
         then stop and become idle, or change direction if there are requests in the opposite direction.
-    '''
-    class Task(object):
-        def __init__(self, rider_id, floor, task_type, pickup_direction=None):
-            self.rider_id = rider_id
-            self.floor = floor
-            self.task_type = task_type
-            self.pickup_direction = pickup_direction
 
+    Tasks are kept in floor buckets (with pickup counts per requested direction), so every event updates the schedule
+    in O(log F) instead of re-sorting all the tasks, and the next tasks are generated lazily by walking the floors.
+    '''
     def __init__(self, elevator_conf, max_floor):
         super().__init__(elevator_conf, max_floor)
-        self.all_tasks = []
+        self.task_store = TaskStore()
+        # All the tasks, and only the pickups
+        self.task_floors = self.task_store.floors
+        self.pickup_floors = FloorBuckets()
+        # Floor -> {rider_id: requested direction} of the riders waiting there, kept in registration order
+        self.floor_to_pickup_directions = {}
+        self.direction_to_pickup_counts = {UpDown.UP: collections.Counter(), UpDown.DOWN: collections.Counter()}
+        self.dropoff_counts = collections.Counter()
         # Arbitrarily set initial direction as "UP" if the elevator location is not the top floor
         self.current_direction = UpDown.UP if self.elevator_location < self.max_floor else UpDown.DOWN
 
     def _remaining_tasks_in_current_direction(self):
-        if (self.current_direction == UpDown.UP and [a for a in self.all_tasks if a.floor >= self.elevator_location]) \
-                or \
-                (self.current_direction == UpDown.DOWN and [a for a in self.all_tasks if a.floor <= self.elevator_location]):
-            return True
+        if self.current_direction == UpDown.UP:
+            return self.task_floors.max_floor() >= self.elevator_location
         else:
-            return False
+            return self.task_floors.min_floor() <= self.elevator_location
 
     def _change_direction(self):
         if self.current_direction == UpDown.UP:
@@ -36,66 +39,140 @@ class KnuthElevatorAlgo(UpDownElevatorAlgoInterface):
         else:
             self.current_direction = UpDown.UP
 
-    def _get_pickups_for_direction(self, direction, start_from_floor=None):
-        all_pickups = [t for t in self.all_tasks if
-                       t.task_type == TaskType.PICKUP and
-                       (not start_from_floor or
-                        (t.floor >= self.elevator_location and direction == UpDown.UP) or
-                        (t.floor <= self.elevator_location and direction == UpDown.DOWN)
-                        )
-                       ]
+    def _is_ahead(self, floor, direction):
+        '''
+        Whether the floor is at or past the elevator location, when heading in the given direction
+        '''
+        return floor >= self.elevator_location if direction == UpDown.UP else floor <= self.elevator_location
 
-        sorted_pickups = sorted(all_pickups, key=lambda x: x.floor, reverse=(direction == UpDown.DOWN))
-        relevant_pickups = [t for t in sorted_pickups if t.pickup_direction == direction]
-        if sorted_pickups and sorted_pickups[-1].pickup_direction != direction:
-            relevant_pickups += [sorted_pickups[-1]]
-
-        return relevant_pickups
+    def _get_floors_in_direction(self, direction, from_location):
+        if direction == UpDown.UP:
+            return self.task_floors.floors_above(self.elevator_location) if from_location \
+                else self.task_floors.floors_above(float('-inf'))
+        else:
+            return self.task_floors.floors_below(self.elevator_location) if from_location \
+                else self.task_floors.floors_below(float('inf'))
+
+    def _get_extra_pickup_floor(self, direction, from_location):
+        '''
+        The farthest pickup in the given direction is visited even if its rider is headed the other way (when several
+        riders wait on that floor, the last one to register decides). Returns its floor, or None if not needed.
+        '''
+        if not self.pickup_floors:
+            return None
+
+        floor = self.pickup_floors.max_floor() if direction == UpDown.UP else self.pickup_floors.min_floor()
+        if from_location and not self._is_ahead(floor, direction):
+            return None
+
+        last_registered_direction = next(reversed(self.floor_to_pickup_directions[floor].values()))
+        return floor if last_registered_direction != direction else None
+
+    def _iter_direction_tasks(self, direction, from_location, include_dropoffs_ahead):
+        '''
+        Returns an iterator over the floors of the pickups requested in the given direction (only the ones ahead of
+        the elevator, if from_location), and of the dropoffs ahead of the elevator (or behind it), ordered in the given
+        direction. Every floor is repeated once per task.
+        Everything that depends on the elevator location is computed right away, so the iterator stays valid until the
+        tasks change, even if it is consumed later.
+        '''
+        pickup_counts = self.direction_to_pickup_counts[direction]
+        extra_pickup_floor = self._get_extra_pickup_floor(direction, from_location)
+        floors = self._get_floors_in_direction(direction, from_location)
+        current_direction = self.current_direction
+        elevator_location = self.elevator_location
+
+        def iter_floors():
+            for floor in floors:
+                count = pickup_counts[floor] + (floor == extra_pickup_floor)
+                is_ahead = floor >= elevator_location if current_direction == UpDown.UP else floor <= elevator_location
+                if is_ahead == include_dropoffs_ahead:
+                    count += self.dropoff_counts[floor]
+
+                yield from itertools.repeat(floor, count)
+
+        return iter_floors()
+
+    def _update_direction(self):
+        # If no more tasks in current direction - change direction
+        if self.task_floors and not self._remaining_tasks_in_current_direction():
+            self._change_direction()
 
     def _get_next_tasks(self):
         # If not more tasks - return an empty list
-        if not self.all_tasks:
+        if not self.task_floors:
             return []
 
-        # If no more tasks in current direction - change direction
-        if not self._remaining_tasks_in_current_direction():
-            self._change_direction()
-
-        if self.current_direction == UpDown.UP:
-            current_direction_tasks = self._get_pickups_for_direction(UpDown.UP, self.elevator_location) + \
-                                      [t for t in self.all_tasks if
-                                       t.floor >= self.elevator_location and t.task_type != TaskType.PICKUP]
-
-            remaining_tasks = list(set(self.all_tasks) - set(current_direction_tasks))
-            reverse_direction_tasks = self._get_pickups_for_direction(UpDown.DOWN, None) + \
-                                      [t for t in remaining_tasks if t.task_type == TaskType.DROPOFF]
-        else:
-            current_direction_tasks = self._get_pickups_for_direction(UpDown.DOWN, self.elevator_location) + \
-                                      [t for t in self.all_tasks if
-                                       t.floor <= self.elevator_location and t.task_type != TaskType.PICKUP]
+        self._update_direction()
 
-            remaining_tasks = list(set(self.all_tasks) - set(current_direction_tasks))
-            reverse_direction_tasks = self._get_pickups_for_direction(UpDown.UP, None) + \
-                                      [t for t in remaining_tasks if t.task_type == TaskType.DROPOFF]
+        # Pickups are only limited to the ones ahead of the elevator while it isn't at floor 0 (a location of 0 was
+        # always treated as "no location" when gathering them)
+        from_location = bool(self.elevator_location)
+        reverse_direction = UpDown.DOWN if self.current_direction == UpDown.UP else UpDown.UP
 
         # Return ordered list of tasks in the current direction followed be reverse direction
-        return sorted([t.floor for t in current_direction_tasks], reverse=self.current_direction == UpDown.DOWN) + \
-               sorted([t.floor for t in reverse_direction_tasks], reverse=self.current_direction == UpDown.UP)
+        return itertools.chain(self._iter_direction_tasks(self.current_direction, from_location, True),
+                               self._iter_direction_tasks(reverse_direction, False, False))
+
+    def _add_pickup(self, rider_id, source_floor, direction):
+        self.task_store.add(rider_id, source_floor, TaskType.PICKUP, direction)
+        self.pickup_floors.add(source_floor)
+        self.floor_to_pickup_directions.setdefault(source_floor, {})[rider_id] = direction
+        self.direction_to_pickup_counts[direction][source_floor] += 1
+
+    def _add_dropoff(self, rider_id, destination_floor):
+        self.task_store.add(rider_id, destination_floor, TaskType.DROPOFF)
+        self.dropoff_counts[destination_floor] += 1
+
+    def _remove_pickup(self, rider_id):
+        pickup_task = self.task_store.remove(rider_id, TaskType.PICKUP)
+        self.pickup_floors.remove(pickup_task.floor)
+        floor_pickup_directions = self.floor_to_pickup_directions[pickup_task.floor]
+        del floor_pickup_directions[rider_id]
+        if not floor_pickup_directions:
+            del self.floor_to_pickup_directions[pickup_task.floor]
+        self.direction_to_pickup_counts[pickup_task.pickup_direction][pickup_task.floor] -= 1
+
+    def _remove_dropoff(self, rider_id):
+        dropoff_task = self.task_store.remove(rider_id, TaskType.DROPOFF)
+        self.dropoff_counts[dropoff_task.floor] -= 1
 
     def register_rider_source(self, rider_id, source_floor, direction):
-        self.all_tasks.append(KnuthElevatorAlgo.Task(rider_id, source_floor, TaskType.PICKUP, direction))
+        self._add_pickup(rider_id, source_floor, direction)
         return self._get_next_tasks()
 
     def register_rider_destination(self, rider_id, destination_floor):
-        self.all_tasks.append(KnuthElevatorAlgo.Task(rider_id, destination_floor, TaskType.DROPOFF, None))
+        self._add_dropoff(rider_id, destination_floor)
         return self._get_next_tasks()
 
     def report_rider_pickup(self, timestamp, rider_id):
-        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.PICKUP][0]
-        self.all_tasks.remove(pickup_task)
+        self._remove_pickup(rider_id)
         return self._get_next_tasks()
 
     def report_rider_dropoff(self, timestamp, rider_id):
-        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.DROPOFF][0]
-        self.all_tasks.remove(pickup_task)
+        self._remove_dropoff(rider_id)
+        return self._get_next_tasks()
+
+    # Batch events only generate the next tasks once, but the direction is still updated after every rider's event
+    # (as it would be if the riders were handled one by one)
+
+    def register_rider_sources(self, rider_sources):
+        for rider_id, source_floor, direction in rider_sources:
+            self._add_pickup(rider_id, source_floor, direction)
+            self._update_direction()
+        return self._get_next_tasks()
+
+    def report_rider_pickups(self, timestamp, elevator_location, rider_destinations):
+        for rider_id, destination_floor in rider_destinations:
+            self._remove_pickup(rider_id)
+            self._update_direction()
+            self.elevator_heartbeat(timestamp, elevator_location)
+            self._add_dropoff(rider_id, destination_floor)
+            self._update_direction()
+        return self._get_next_tasks()
+
+    def report_rider_dropoffs(self, timestamp, rider_ids):
+        for rider_id in rider_ids:
+            self._remove_dropoff(rider_id)
+            self._update_direction()
         return self._get_next_tasks()
@@ -0,0 +1,47 @@
+import csv
+import os
+import random
+import tempfile
+import time
+
+from simulation_runner import SimulationRunner
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+# The shabbat elevator's callbacks don't depend on the number of waiting riders, so the measured time per rider
+# is dominated by the runner's own pickup/dropoff matching
+ALGO_CLASS = 'algo.naive_elevator.shabbat_elevator.ShabbatElevatorAlgo'
+MAX_FLOOR = 10
+RIDER_COUNTS = [250, 500, 1000, 2000, 4000]
+
+
+def _write_morning_rush_scenario(filename, rider_count):
+    '''
+    All riders arrive within a few minutes (each at its own timestamp, so every arrival is a separate simulation
+    step), so hundreds of them are waiting at once
+    '''
+    with open(filename, 'w') as f:
+        csv_writer = csv.writer(f)
+        csv_writer.writerow(('timestamp', 'source_floor', 'destination_floor'))
+        for ts in sorted(random.uniform(0, 300) for _ in range(rider_count)):
+            source_floor, destination_floor = random.sample(range(1, MAX_FLOOR + 1), 2)
+            csv_writer.writerow((round(ts, 3), source_floor, destination_floor))
+
+
+def run_benchmark():
+    random.seed(1)
+    print("{:>8} {:>12} {:>16}".format("riders", "total [s]", "per rider [us]"))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rider_count in RIDER_COUNTS:
+            scenario_filename = os.path.join(tmp_dir, "rush_{}.csv".format(rider_count))
+            _write_morning_rush_scenario(scenario_filename, rider_count)
+
+            sim_runner = SimulationRunner(scenario_filename, ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE)
+            start = time.perf_counter()
+            sim_runner.run_simulation()
+            elapsed = time.perf_counter() - start
+
+            print("{:>8} {:>12.3f} {:>16.1f}".format(rider_count, elapsed, elapsed / rider_count * 1e6))
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,36 @@
+import time
+
+from simulation_runner import SimulationRunner, SimulationRunnerFactory
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+ALGO_CLASS = 'algo.naive_elevator.fifo_elevator.FIFOElevatorAlgo'
+SIMULATION_FILENAME = 'demand_simulation_data/manual_scenario/tiny_office_1.csv'
+EPISODES = 2000
+
+
+def _time_per_episode(get_runner):
+    start = time.perf_counter()
+    for _ in range(EPISODES):
+        get_runner()
+    return (time.perf_counter() - start) / EPISODES
+
+
+def run_benchmark():
+    '''
+    Measures only the per-episode setup (no simulation is run), the way batch runs and RL training pay it
+    '''
+    runner_factory = SimulationRunnerFactory(ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE)
+    setups = [
+        ("new SimulationRunner", lambda: SimulationRunner(SIMULATION_FILENAME, ALGO_CLASS,
+                                                          ELEVATOR_CONFIGURATION_FILE)),
+        ("factory.create_runner", lambda: runner_factory.create_runner(SIMULATION_FILENAME)),
+        ("factory.get_runner (reset)", lambda: runner_factory.get_runner(SIMULATION_FILENAME)),
+    ]
+
+    print("{:<30} {:>16}".format("setup", "per episode [us]"))
+    for name, get_runner in setups:
+        print("{:<30} {:>16.1f}".format(name, _time_per_episode(get_runner) * 1e6))
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from demand_simulation_data.load_simulation_data import write_simulation_events
+from demand_simulation_data.random_scenario.generate_random_sim import get_scenario_rng, \
+    generate_random_free_for_all, generate_random_office_building
+from simulation_runner import SimulationRunner
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+ALGO_CLASSES = [
+    'algo.naive_elevator.fifo_elevator.FIFOElevatorAlgo',
+    'algo.naive_elevator.knuth_elevator.KnuthElevatorAlgo',
+    'algo.naive_elevator.shabbat_elevator.ShabbatElevatorAlgo',
+    'algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo',
+    # The Q-learning algo isn't benchmarked - it loads and trains a model while running, so its throughput depends
+    # on the model rather than on the simulator
+]
+# Scenario name -> (generator, generator kwargs), from small to large. Every scenario is generated with a fixed seed
+# (see generate_random_sim.get_scenario_rng), so results of different runs are comparable.
+SCENARIOS = {
+    'tiny_office': (generate_random_office_building, dict(max_floor=3, number_of_employees=100)),
+    'large_office': (generate_random_office_building, dict(max_floor=50, number_of_employees=1000)),
+    'free_for_all': (generate_random_free_for_all, dict(max_floor=50, number_of_events=1000)),
+    'trace_10k': (generate_random_free_for_all, dict(max_floor=50, number_of_events=10000)),
+    'trace_100k': (generate_random_free_for_all, dict(max_floor=50, number_of_events=100000)),
+}
+SCENARIO_SEED = 1
+# Every (algo, scenario) pair is run this many times, and the fastest run is reported
+REPEATS = 3
+# Metric -> whether higher is better, for flagging regressions in compare
+COMPARED_METRICS = {
+    'events_per_sec': True,
+    'riders_per_sec': True,
+    'setup_sec': False,
+    'run_sec': False,
+    'stats_sec': False,
+    'peak_rss_kb': False,
+}
+# A metric that got worse by more than this fraction of its baseline value is a regression
+REGRESSION_THRESHOLD = 0.1
+
+
+def _run_case(case):
+    '''
+    Runs a single (algo_class, scenario name, scenario file) case and returns its results.
+    Runs in a fresh worker process, so that the peak RSS is the case's own.
+    '''
+    algo_class, scenario_name, scenario_filename = case
+    phase_times = dict(setup_sec=[], run_sec=[], stats_sec=[])
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        sim_runner = SimulationRunner(scenario_filename, algo_class, ELEVATOR_CONFIGURATION_FILE)
+        setup_end = time.perf_counter()
+        sim_runner.run_simulation()
+        run_end = time.perf_counter()
+        sim_runner.get_performance_stats()
+        stats_end = time.perf_counter()
+
+        phase_times['setup_sec'].append(setup_end - start)
+        phase_times['run_sec'].append(run_end - setup_end)
+        phase_times['stats_sec'].append(stats_end - run_end)
+
+    result = dict(algo=algo_class, scenario=scenario_name, riders=sim_runner.simulation_events_count,
+                  simulated_events=sim_runner.scheduler.handled_events_count)
+    result.update({phase: min(times) for phase, times in phase_times.items()})
+    result['events_per_sec'] = result['simulated_events'] / result['run_sec']
+    result['riders_per_sec'] = result['riders'] / result['run_sec']
+    # ru_maxrss is in kilobytes on linux
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def _write_scenarios(scenario_names, directory):
+    '''
+    Returns scenario name -> scenario filename
+    '''
+    scenario_filenames = {}
+    for scenario_name in scenario_names:
+        generator, generator_kwargs = SCENARIOS[scenario_name]
+        scenario_rng = get_scenario_rng(scenario_name, 0, base_seed=SCENARIO_SEED)
+        simulation_events = generator(scenario_rng, **generator_kwargs)
+        scenario_filenames[scenario_name] = os.path.join(directory, scenario_name + '.csv')
+        write_simulation_events(scenario_filenames[scenario_name], simulation_events)
+
+    return scenario_filenames
+
+
+def _get_metadata():
+    return dict(created_at=datetime.datetime.now().isoformat(timespec='seconds'), python=sys.version.split()[0],
+                numpy=np.__version__, platform=platform.platform(), cpu_count=os.cpu_count(), repeats=REPEATS)
+
+
+def run_benchmark(output_filename, algo_classes=ALGO_CLASSES, scenario_names=tuple(SCENARIOS)):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scenario_filenames = _write_scenarios(scenario_names, tmp_dir)
+        cases = [(algo_class, scenario_name, scenario_filenames[scenario_name])
+                 for scenario_name in scenario_names for algo_class in algo_classes]
+
+        print("{:<58} {:<13} {:>8} {:>12} {:>12} {:>10} {:>12}".format(
+            "algo", "scenario", "riders", "events/s", "riders/s", "run [s]", "peak RSS [MB]"))
+        # A worker process per case, one at a time, so cases don't compete for the CPU
+        with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+            for result in pool.imap(_run_case, cases):
+                print("{:<58} {:<13} {:>8} {:>12.0f} {:>12.0f} {:>10.3f} {:>12.1f}".format(
+                    result['algo'], result['scenario'], result['riders'], result['events_per_sec'],
+                    result['riders_per_sec'], result['run_sec'], result['peak_rss_kb'] / 1024))
+                results.append(result)
+
+    with open(output_filename, 'w') as f:
+        json.dump(dict(metadata=_get_metadata(), results=results), f, indent=2)
+
+
+def compare_results(baseline_filename, new_filename, threshold=REGRESSION_THRESHOLD):
+    '''
+    Prints the change of every metric between two benchmark results files, and returns the regressions -
+    (algo, scenario, metric, baseline value, new value) of every metric that got worse by more than the threshold
+    '''
+    with open(baseline_filename) as f:
+        baseline_results = {(result['algo'], result['scenario']): result for result in json.load(f)['results']}
+    with open(new_filename) as f:
+        new_results = {(result['algo'], result['scenario']): result for result in json.load(f)['results']}
+
+    regressions = []
+    print("{:<58} {:<13} {:<15} {:>14} {:>14} {:>9}".format("algo", "scenario", "metric", "baseline", "new",
+                                                            "change"))
+    for key in sorted(baseline_results.keys() & new_results.keys()):
+        for metric, is_higher_better in COMPARED_METRICS.items():
+            baseline_value, new_value = baseline_results[key][metric], new_results[key][metric]
+            change = (new_value - baseline_value) / baseline_value if baseline_value else 0
+            is_regression = (-change if is_higher_better else change) > threshold
+            if is_regression:
+                regressions.append(key + (metric, baseline_value, new_value))
+
+            print("{:<58} {:<13} {:<15} {:>14.4g} {:>14.4g} {:>+8.1%}{}".format(
+                key[0], key[1], metric, baseline_value, new_value, change, " REGRESSION" if is_regression else ""))
+
+    for key in sorted(baseline_results.keys() ^ new_results.keys()):
+        print("{} {} - only in {}".format(key[0], key[1], baseline_filename if key in baseline_results
+                                          else new_filename))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulator throughput benchmark")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="run the benchmark and save its results as JSON")
+    run_parser.add_argument('output', help="results JSON file")
+    run_parser.add_argument('--algos', nargs='+', default=ALGO_CLASSES)
+    run_parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+
+    compare_parser = subparsers.add_parser('compare', help="compare two results files, fails on regressions")
+    compare_parser.add_argument('baseline', help="baseline results JSON file")
+    compare_parser.add_argument('new', help="new results JSON file")
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                help="fraction by which a metric may get worse before it's a regression")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_benchmark(args.output, args.algos, args.scenarios)
+    else:
+        regressions = compare_results(args.baseline, args.new, args.threshold)
+        if regressions:
+            print("{} regressions above {:.0%}".format(len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,68 @@
+import array
+import collections
 import csv
+import os
+import struct
+import numpy as np
 
+# Parsed scenarios are cached in a binary file next to the CSV, which is memory-mapped on later loads
+SIMULATION_CACHE_SUFFIX = '.simcache'
+# Cache layout - header (magic, CSV mtime in ns, CSV size in bytes, event count, max floor) followed by the records
+_CACHE_MAGIC = b'ELEVSIM1'
+_CACHE_HEADER = struct.Struct('<8sqqqq')
+_CACHE_RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('source_floor', '<i8'), ('destination_floor', '<i8')])
+# Rows are formatted this many at a time when writing a scenario CSV
+CSV_WRITE_CHUNK_ROWS = 2 ** 16
 
-def load_simulation_events(filename):
+
+SimulationEvent = collections.namedtuple('SimulationEvent', ['timestamp', 'source_floor', 'destination_floor',
+                                                             'rider_id'])
+
+
+class SimulationEvents(object):
+    '''
+    Compact columnar representation of a simulation scenario - one typed numpy array per field instead of a dict
+    per row. Rider ids are the row indices, so they are generated on demand rather than stored.
+    '''
+    def __init__(self, timestamps, source_floors, destination_floors, max_floor):
+        self.timestamps = timestamps
+        self.source_floors = source_floors
+        self.destination_floors = destination_floors
+        self.max_floor = max_floor
+
+    @property
+    def rider_ids(self):
+        return np.arange(len(self), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def timestamp(self, index):
+        return float(self.timestamps[index])
+
+    def __getitem__(self, index):
+        '''
+        Returns a single event with plain python values (float timestamp, int floors), same as the CSV parser
+        '''
+        return SimulationEvent(timestamp=float(self.timestamps[index]),
+                               source_floor=int(self.source_floors[index]),
+                               destination_floor=int(self.destination_floors[index]),
+                               rider_id=index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def iter_simulation_events(filename):
+    '''
+    Lazily yields the scenario's events one by one, without holding the whole scenario in memory
+    '''
     with open(filename, "r") as f:
         reader = csv.reader(f)
         _ = next(reader)  # skip header
 
-        data = []
-        rider_id = 0
-        for row in reader:
+        for rider_id, row in enumerate(reader):
             timestamp = float(row[0])
             source_floor = int(row[1])
             destination_floor = int(row[2])
@@ -20,9 +74,149 @@ def load_simulation_events(filename):
                 raise Exception("Error in simulation file {} - source/destination floor can't be negative"
                                 .format(filename))
 
-            data_to_append = dict(timestamp=timestamp, source_floor=source_floor, destination_floor=destination_floor)
-            data_to_append["rider_id"] = rider_id
-            data.append(data_to_append)
-            rider_id += 1
+            yield SimulationEvent(timestamp, source_floor, destination_floor, rider_id)
+
+
+def _parse_simulation_events_columns(filename):
+    '''
+    Parses the scenario CSV into a SimulationEvents object, computing the max floor in the same pass over the file.
+    Values are accumulated in typed array buffers, so no per-row python objects are kept around.
+    '''
+    timestamps = array.array('d')
+    source_floors = array.array('q')
+    destination_floors = array.array('q')
+    max_floor = 0
+
+    for event in iter_simulation_events(filename):
+        timestamps.append(event.timestamp)
+        source_floors.append(event.source_floor)
+        destination_floors.append(event.destination_floor)
+        max_floor = max(max_floor, event.source_floor, event.destination_floor)
+
+    return SimulationEvents(timestamps=np.frombuffer(timestamps, dtype=np.float64),
+                            source_floors=np.frombuffer(source_floors, dtype=np.int64),
+                            destination_floors=np.frombuffer(destination_floors, dtype=np.int64),
+                            max_floor=max_floor)
+
+
+def _get_cache_filename(filename):
+    return filename + SIMULATION_CACHE_SUFFIX
+
+
+def _get_csv_signature(filename):
+    '''
+    The cache is considered valid as long as the CSV's modification time and size didn't change
+    '''
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
 
-    return data
+def _write_simulation_cache(filename, simulation_events):
+    records = np.empty(len(simulation_events), dtype=_CACHE_RECORD_DTYPE)
+    records['timestamp'] = simulation_events.timestamps
+    records['source_floor'] = simulation_events.source_floors
+    records['destination_floor'] = simulation_events.destination_floors
+
+    csv_mtime_ns, csv_size = _get_csv_signature(filename)
+    header = _CACHE_HEADER.pack(_CACHE_MAGIC, csv_mtime_ns, csv_size, len(records), simulation_events.max_floor)
+
+    # Write to a temporary file and rename it, so that concurrent runs never see a partially written cache
+    cache_filename = _get_cache_filename(filename)
+    tmp_cache_filename = "{}.{}.tmp".format(cache_filename, os.getpid())
+    try:
+        with open(tmp_cache_filename, 'wb') as f:
+            f.write(header)
+            f.write(records.tobytes())
+        os.replace(tmp_cache_filename, cache_filename)
+    except BaseException:
+        # Don't leave the partially written temporary file behind
+        try:
+            os.remove(tmp_cache_filename)
+        except OSError:
+            pass
+        raise
+
+
+def _load_simulation_cache(filename):
+    '''
+    Memory-maps the cached scenario, returns None if there's no valid cache for the CSV
+    '''
+    cache_filename = _get_cache_filename(filename)
+    try:
+        with open(cache_filename, 'rb') as f:
+            header = f.read(_CACHE_HEADER.size)
+    except OSError:
+        return None
+
+    if len(header) != _CACHE_HEADER.size:
+        return None
+
+    magic, csv_mtime_ns, csv_size, events_count, max_floor = _CACHE_HEADER.unpack(header)
+    if magic != _CACHE_MAGIC or (csv_mtime_ns, csv_size) != _get_csv_signature(filename):
+        return None
+
+    if events_count == 0:
+        records = np.empty(0, dtype=_CACHE_RECORD_DTYPE)
+    else:
+        try:
+            records = np.memmap(cache_filename, dtype=_CACHE_RECORD_DTYPE, mode='r',
+                                offset=_CACHE_HEADER.size, shape=(events_count,))
+        except (OSError, ValueError):
+            # Truncated or otherwise unreadable cache file
+            return None
+
+    return SimulationEvents(timestamps=records['timestamp'],
+                            source_floors=records['source_floor'],
+                            destination_floors=records['destination_floor'],
+                            max_floor=max_floor)
+
+
+def load_simulation_events_columns(filename, use_cache=True):
+    '''
+    Loads the scenario into a SimulationEvents object.
+    When use_cache is set, the parsed scenario is saved to a binary cache file next to the CSV on first load,
+    and later loads memory-map that file instead of parsing the CSV again (as long as the CSV didn't change).
+    '''
+    if not use_cache:
+        return _parse_simulation_events_columns(filename)
+
+    simulation_events = _load_simulation_cache(filename)
+    if simulation_events is not None:
+        return simulation_events
+
+    simulation_events = _parse_simulation_events_columns(filename)
+    try:
+        _write_simulation_cache(filename, simulation_events)
+    except OSError:
+        # Caching is only an optimization, a read-only scenario directory shouldn't fail the run
+        pass
+
+    return simulation_events
+
+
+def write_simulation_events(filename, simulation_events, write_cache=True):
+    '''
+    Writes the scenario as a CSV (events should be sorted by timestamp), formatting the rows in bulk, a chunk at a
+    time. When write_cache is set, its binary cache is written as well, so the first load doesn't parse the CSV.
+    '''
+    timestamps = np.asarray(simulation_events.timestamps, dtype=np.float64)
+    are_timestamps_whole = bool(np.all(timestamps == np.floor(timestamps)))
+    row_format = ('%d' if are_timestamps_whole else '%r') + ',%d,%d\n'
+
+    with open(filename, 'w') as f:
+        f.write('timestamp,source_floor,destination_floor\n')
+        for chunk_start in range(0, len(timestamps), CSV_WRITE_CHUNK_ROWS):
+            chunk = slice(chunk_start, chunk_start + CSV_WRITE_CHUNK_ROWS)
+            chunk_timestamps = timestamps[chunk].astype(np.int64) if are_timestamps_whole else timestamps[chunk]
+            rows = zip(chunk_timestamps.tolist(), simulation_events.source_floors[chunk].tolist(),
+                       simulation_events.destination_floors[chunk].tolist())
+            f.write(''.join(map(row_format.__mod__, rows)))
+
+    if write_cache:
+        _write_simulation_cache(filename, simulation_events)
+
+
+def load_simulation_events(filename):
+    return [dict(timestamp=event.timestamp, source_floor=event.source_floor,
+                 destination_floor=event.destination_floor, rider_id=event.rider_id)
+            for event in iter_simulation_events(filename)]
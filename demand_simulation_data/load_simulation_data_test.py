@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from demand_simulation_data.load_simulation_data import load_simulation_events, load_simulation_events_columns, \
+    write_simulation_events, SimulationEvents, SIMULATION_CACHE_SUFFIX
+
+
+class LoadSimulationDataTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, "sim.csv")
+        self._write_scenario([(0, 1, 3), (0, 1, 2), (1.5, 4, 1)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_scenario(self, rows):
+        with open(self.filename, 'w') as f:
+            f.write("timestamp,source_floor,destination_floor\n")
+            for row in rows:
+                f.write("{},{},{}\n".format(*row))
+
+    def _assert_matches_csv(self, simulation_events):
+        expected_events = load_simulation_events(self.filename)
+        self.assertEqual(len(simulation_events), len(expected_events))
+        for event, expected_event in zip(simulation_events, expected_events):
+            self.assertEqual(event._asdict(), expected_event)
+
+    def test_columns_match_csv(self):
+        simulation_events = load_simulation_events_columns(self.filename, use_cache=False)
+        self._assert_matches_csv(simulation_events)
+        self.assertEqual(simulation_events.max_floor, 4)
+        self.assertFalse(os.path.exists(self.filename + SIMULATION_CACHE_SUFFIX))
+
+    def test_cache_is_created_and_reused(self):
+        load_simulation_events_columns(self.filename)
+        self.assertTrue(os.path.exists(self.filename + SIMULATION_CACHE_SUFFIX))
+
+        simulation_events = load_simulation_events_columns(self.filename)
+        self._assert_matches_csv(simulation_events)
+        self.assertEqual(simulation_events.max_floor, 4)
+
+    def test_cache_is_invalidated_when_csv_changes(self):
+        load_simulation_events_columns(self.filename)
+
+        self._write_scenario([(0, 1, 7)])
+        simulation_events = load_simulation_events_columns(self.filename)
+        self._assert_matches_csv(simulation_events)
+        self.assertEqual(simulation_events.max_floor, 7)
+
+    def test_failed_cache_write_is_cleaned_up(self):
+        with mock.patch('os.replace', side_effect=OSError("replace failed")):
+            simulation_events = load_simulation_events_columns(self.filename)
+
+        # The run goes on without the cache, and the temporary file is removed
+        self._assert_matches_csv(simulation_events)
+        self.assertEqual(os.listdir(self.tmp_dir), ["sim.csv"])
+
+    def test_empty_scenario(self):
+        self._write_scenario([])
+        load_simulation_events_columns(self.filename)
+        simulation_events = load_simulation_events_columns(self.filename)
+        self.assertEqual(len(simulation_events), 0)
+
+    def test_write_simulation_events(self):
+        for timestamps in [[0, 0, 5], [0, 0.5, 1 / 3]]:
+            written_events = SimulationEvents(timestamps=np.array(timestamps, dtype=np.float64),
+                                              source_floors=np.array([1, 1, 4]),
+                                              destination_floors=np.array([3, 2, 1]), max_floor=4)
+            write_simulation_events(self.filename, written_events)
+            # Both the cache and the CSV itself hold the same events
+            for use_cache in [True, False]:
+                simulation_events = load_simulation_events_columns(self.filename, use_cache=use_cache)
+                self.assertEqual(list(simulation_events), list(written_events))
+                self.assertEqual(simulation_events.max_floor, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,89 +1,126 @@
-import random
-import csv
+import multiprocessing
 import os
+import zlib
+import numpy as np
 import tqdm
 
+from demand_simulation_data.load_simulation_data import SimulationEvents, write_simulation_events
+
 SIM_DIR = 'demand_simulation_data/random_scenario'
 GROUND_FLOOR = 1
 ONE_HOUR = 60 * 60 * 24
 
-
-def generate_random_free_for_all(sim_filename):
-    max_floor = random.randint(5,100)
-    number_of_events = random.randint(1,1000)
-
-    with open(os.path.join(SIM_DIR, 'free_for_all', sim_filename), 'w') as f:
-        csv_writer = csv.writer(f)
-        csv_writer.writerow(('timestamp', 'source_floor', 'destination_floor'))
-
-        current_ts = 0
-        for _ in range(number_of_events):
-            new_ts = current_ts + random.randint(0, 60)
-            source_floor = random.randint(1, max_floor)
-            destination_floor = random.randint(1, max_floor)
-            if source_floor == destination_floor:
-                continue
-
-            csv_writer.writerow((new_ts, source_floor, destination_floor))
-            current_ts = new_ts
-
-
-def generate_random_office_building(sim_type, sim_filename, max_floor, number_of_employees):
-    employee_floors = {employee_id : random.randint(2,max_floor) for employee_id in range(number_of_employees)}
-
-    # For an office building, we split the day according to:
-    # - first 2 hours of the day : people coming into the office
-    # - last 2 hours of the day : people leaving the office
-    # - everything else : people go randomly between their floor and ground floor
-    # Note : I'm assuming there's no movement between floors that doesn't involve the ground floor
+# Every scenario gets its own random generator, seeded by (BASE_SEED, scenario type, scenario number) - so a scenario
+# is reproducible on its own, no matter which other scenarios are generated, in which order or in which process
+BASE_SEED = 1
+SCENARIOS_PER_TYPE = 999
+# Number of worker processes to generate the scenarios in (1 generates everything serially in the current process)
+WORKERS = os.cpu_count()
+CHUNKSIZE = 16
+
+
+def get_scenario_rng(sim_type, sim_number, base_seed=BASE_SEED):
+    return np.random.default_rng([base_seed, zlib.crc32(sim_type.encode()), sim_number])
+
+
+def _to_simulation_events(timestamps, source_floors, destination_floors):
+    # A stable sort keeps events with the same timestamp in the order they were drawn
+    order = np.argsort(timestamps, kind='stable')
+    return SimulationEvents(timestamps=timestamps[order].astype(np.float64), source_floors=source_floors[order],
+                            destination_floors=destination_floors[order],
+                            max_floor=int(max(source_floors.max(initial=0), destination_floors.max(initial=0))))
+
+
+def generate_random_free_for_all(rng, max_floor, number_of_events):
+    '''
+    Riders travel between random floors, every rider arriving 0-60 seconds after the previous one.
+    Rides from a floor to itself are dropped.
+    '''
+    time_gaps = rng.integers(0, 60, size=number_of_events, endpoint=True)
+    source_floors = rng.integers(1, max_floor, size=number_of_events, endpoint=True)
+    destination_floors = rng.integers(1, max_floor, size=number_of_events, endpoint=True)
+
+    is_ride = source_floors != destination_floors
+    timestamps = np.cumsum(time_gaps[is_ride])
+    return _to_simulation_events(timestamps, source_floors[is_ride], destination_floors[is_ride])
+
+
+def generate_random_office_building(rng, max_floor, number_of_employees):
+    '''
+    For an office building, we split the day according to:
+    - first 2 hours of the day : people coming into the office
+    - last 2 hours of the day : people leaving the office
+    - everything else : people go randomly between their floor and ground floor
+    Note : I'm assuming there's no movement between floors that doesn't involve the ground floor
+    '''
     start_of_day_ts = 0
     end_of_day_ts = ONE_HOUR * 8
     end_of_inbound_ts = ONE_HOUR * 2
     start_of_outbound_ts = end_of_day_ts - (ONE_HOUR * 2)
 
-    events_list = []
-    # Every employee gets to the building at some point, leaves the building at some point,
-    # and potentially gets out of the building a few times during the day
-    for employee_id, employee_floor in employee_floors.items():
-        # Employee arriving in the morning
-        building_arrival_ts = random.randint(start_of_day_ts, end_of_inbound_ts)
-        events_list.append((building_arrival_ts, GROUND_FLOOR, employee_floor))
-
-        # Employee departing when the day is done
-        building_departure_ts = random.randint(start_of_outbound_ts, end_of_day_ts)
-        events_list.append((building_departure_ts, employee_floor, GROUND_FLOOR))
-
-        # Potentially leaving the building for lunch (80% chance)
-        if random.random() < 0.8:
-            lunch_start = random.randint(end_of_inbound_ts, start_of_outbound_ts)
-            events_list.append((lunch_start, employee_floor, GROUND_FLOOR))
-
-            lunch_end = random.randint(lunch_start, start_of_outbound_ts)
-            events_list.append((lunch_end, GROUND_FLOOR, employee_floor))
-
-    # Write sorted events to CSV file
-    with open(os.path.join(SIM_DIR, sim_type, sim_filename), 'w') as f:
-        csv_writer = csv.writer(f)
-        csv_writer.writerow(('timestamp', 'source_floor', 'destination_floor'))
-
-        sorted_events_list = sorted(events_list, key=lambda event: event[0])
-        for event in sorted_events_list:
-            csv_writer.writerow((event[0], event[1], event[2]))
+    employee_floors = rng.integers(2, max_floor, size=number_of_employees, endpoint=True)
+    # Every employee gets to the building at some point, and leaves the building at some point
+    arrival_ts = rng.integers(start_of_day_ts, end_of_inbound_ts, size=number_of_employees, endpoint=True)
+    departure_ts = rng.integers(start_of_outbound_ts, end_of_day_ts, size=number_of_employees, endpoint=True)
+    # and potentially gets out of the building for lunch (80% chance)
+    lunch_floors = employee_floors[rng.random(number_of_employees) < 0.8]
+    lunch_start_ts = rng.integers(end_of_inbound_ts, start_of_outbound_ts, size=len(lunch_floors), endpoint=True)
+    lunch_end_ts = rng.integers(lunch_start_ts, start_of_outbound_ts, endpoint=True)
+
+    ground_floors = np.full(number_of_employees, GROUND_FLOOR)
+    lunch_ground_floors = np.full(len(lunch_floors), GROUND_FLOOR)
+    return _to_simulation_events(
+        timestamps=np.concatenate([arrival_ts, departure_ts, lunch_start_ts, lunch_end_ts]),
+        source_floors=np.concatenate([ground_floors, employee_floors, lunch_floors, lunch_ground_floors]),
+        destination_floors=np.concatenate([employee_floors, ground_floors, lunch_ground_floors, lunch_floors]))
+
+
+def generate_scenario(sim_type, sim_number, base_seed=BASE_SEED):
+    '''
+    Generates and writes a single scenario (with its binary cache), returns its filename
+    '''
+    rng = get_scenario_rng(sim_type, sim_number, base_seed)
+    if sim_type == 'free_for_all':
+        simulation_events = generate_random_free_for_all(rng, max_floor=int(rng.integers(5, 100, endpoint=True)),
+                                                         number_of_events=int(rng.integers(1, 1000, endpoint=True)))
+    elif sim_type == 'large_office_building':
+        simulation_events = generate_random_office_building(
+            rng, max_floor=int(rng.integers(5, 100, endpoint=True)),
+            number_of_employees=int(rng.integers(50, 1000, endpoint=True)))
+    elif sim_type == 'tiny_office_building':
+        simulation_events = generate_random_office_building(rng, max_floor=3, number_of_employees=100)
+    else:
+        raise Exception("Unknown simulation type {}".format(sim_type))
+
+    sim_filename = os.path.join(SIM_DIR, sim_type, "sim_{}.csv".format(sim_number))
+    write_simulation_events(sim_filename, simulation_events)
+    return sim_filename
+
+
+def _generate_scenario(scenario):
+    '''
+    Defined at module level so it can be pickled and sent to the pool workers
+    '''
+    return generate_scenario(*scenario)
+
+
+def generate_scenarios(scenarios, workers=WORKERS, chunksize=CHUNKSIZE):
+    '''
+    scenarios - (sim_type, sim_number) pairs, generated over a pool of worker processes
+    '''
+    if workers == 1:
+        for scenario in tqdm.tqdm(scenarios):
+            _generate_scenario(scenario)
+        return
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        for _ in tqdm.tqdm(pool.imap_unordered(_generate_scenario, scenarios, chunksize=chunksize),
+                           total=len(scenarios)):
+            pass
 
 
 if "__main__" == __name__:
-    random.seed(1)
-
-    print("Free for all sims")
-    for i in tqdm.tqdm(range(1, 1000)):
-        generate_random_free_for_all("sim_{}.csv".format(i))
-
-    print("large office building sims")
-    for i in tqdm.tqdm(range(1, 1000)):
-        generate_random_office_building("large_office_building", "sim_{}.csv".format(i),
-                                        random.randint(5, 100), random.randint(50, 1000))
-
-    print("tiny office building sims")
-    for i in tqdm.tqdm(range(1, 1000)):
-        generate_random_office_building("tiny_office_building", "sim_{}.csv".format(i),
-                                        3, 100)
+    for sim_type in ['free_for_all', 'large_office_building', 'tiny_office_building']:
+        print("{} sims".format(sim_type))
+        os.makedirs(os.path.join(SIM_DIR, sim_type), exist_ok=True)
+        generate_scenarios([(sim_type, sim_number) for sim_number in range(1, SCENARIOS_PER_TYPE + 1)])
@@ -1,58 +1,176 @@
-import copy
+import array
 import math
 
 
+class FloorArrivalLog(object):
+    '''
+    The timestamps in which the elevator arrived at (or passed through) every floor, kept in two typed arrays instead
+    of a timestamp -> floor dict, since it holds an entry per floor passed.
+    Timestamps are logged in a non decreasing order, and like a dict, a repeated timestamp overwrites its floor.
+    '''
+    def __init__(self):
+        self.timestamps = array.array('d')
+        self.floors = array.array('q')
+
+    def append(self, timestamp, floor):
+        if self.timestamps and self.timestamps[-1] == timestamp:
+            self.floors[-1] = floor
+        else:
+            self.timestamps.append(timestamp)
+            self.floors.append(floor)
+
+    def last_timestamp(self):
+        return self.timestamps[-1]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        '''
+        Yields (timestamp, floor) pairs
+        '''
+        return zip(self.timestamps, self.floors)
+
+
+class FloorArrivalCounter(object):
+    '''
+    A FloorArrivalLog that only counts the floor arrivals and keeps the last timestamp, for runs that don't need the
+    full log (streaming metrics) - so its memory doesn't grow with the run.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.last_ts = None
+
+    def append(self, timestamp, floor):
+        if self.last_ts != timestamp:
+            self.count += 1
+            self.last_ts = timestamp
+
+    def last_timestamp(self):
+        return self.last_ts
+
+    def __len__(self):
+        return self.count
+
+
 class Elevator(object):
     '''
     This class simulates an elevator. Generally, for any single point in time the elevator has a length>=0 list of tasks,
     where a 'task' is a floor to be reached and then open and close the doors. Each task can be either a pickup, dropoff
     of a 'wait' task.
-    '''
-    class Task(object):
-        def __init__(self, floor, task_type):
-            self.floor = floor
-            self.task_type = task_type
 
-    def __init__(self, conf):
+    The tasks are consumed straight from the sequence the algo returned, without copying it - the elevator only keeps
+    its next task, and an iterator over the rest of the tasks.
+
+    The way to the next task is a single segment of constant speed, kept in closed form (where and when the move
+    started) - so the location at any timestamp, the floors passed and the arrival time are computed straight from
+    the segment, no matter how many times the elevator was stopped midway (e.g. by new riders) to report its location.
+    As long as the next task doesn't change, neither does the arrival time.
+    '''
+    def __init__(self, conf, floor_arrival_log=None):
+        '''
+        floor_arrival_log - where the floors arrivals are logged, a new FloorArrivalLog by default
+        '''
         self.current_location = conf["INITIAL_FLOOR"]
         self.time_to_ascend_one_floor = conf["TIME_TO_GO_UP_ONE_FLOOR"]
         self.time_to_descend_one_floor = conf["TIME_TO_GO_DOWN_ONE_FLOOR"]
         self.time_to_open_doors = conf["TIME_TO_OPEN_DOORS"]
         self.time_to_close_doors = conf["TIME_TO_CLOSE_DOORS"]
 
-        self.task_list = []
+        self.next_task = None
+        self.remaining_tasks = iter(())
         self.current_ts = 0
         self.doors_open = False
-        self.ts_to_arrival_floor_log = {self.current_ts : conf["INITIAL_FLOOR"]}
+        # The segment to the next task - the timestamp and location the elevator starts (or started) moving from
+        self.move_start_ts = None
+        self.move_start_location = None
+        self.floor_arrival_log = floor_arrival_log if floor_arrival_log is not None else FloorArrivalLog()
+        self.floor_arrival_log.append(self.current_ts, conf["INITIAL_FLOOR"])
 
     def register_next_tasks(self, tasks):
-        self.task_list = copy.copy(tasks)
+        '''
+        tasks - any iterable of floors (algos may generate them lazily), it replaces the current tasks.
+        It is consumed one task at a time, and is not used anymore once the next tasks are registered.
+        If the next task stays the same, the elevator keeps going on its current segment.
+        '''
+        previous_next_task = self.next_task
+        self.remaining_tasks = iter(tasks)
+        self.next_task = next(self.remaining_tasks, None)
+        if self.next_task != previous_next_task:
+            self._start_move_segment()
+
+    def _pop_next_task(self):
+        self.next_task = next(self.remaining_tasks, None)
+        self._start_move_segment()
+
+    def _start_move_segment(self):
+        self.move_start_ts = self._get_next_move_start_ts()
+        self.move_start_location = self.current_location
 
     def get_status(self):
         return self.current_ts, self.current_location
 
     def is_task_list_empty(self):
-        return self.task_list == []
+        return self.next_task is None
 
-    def get_ts_to_arrival_floor_log(self):
-        return self.ts_to_arrival_floor_log
+    def get_floor_arrival_log(self):
+        return self.floor_arrival_log
+
+    def _get_time_to_move_one_floor(self, floor_difference):
+        return self.time_to_ascend_one_floor if floor_difference >= 0 else self.time_to_descend_one_floor
+
+    def _get_next_move_start_ts(self):
+        '''
+        The elevator starts moving towards its next task once its doors are closed
+        '''
+        return self.current_ts + (self.time_to_close_doors if self.doors_open else 0)
+
+    def get_next_task_arrival_ts(self):
+        '''
+        Returns the timestamp in which the elevator will reach its next task (before opening its doors),
+        or None if there are no tasks
+        '''
+        if self.next_task is None:
+            return None
+
+        floor_difference_to_next_task = (self.next_task - self.move_start_location)
+        time_to_move_one_floor = self._get_time_to_move_one_floor(floor_difference_to_next_task)
+        return self.move_start_ts + time_to_move_one_floor * abs(floor_difference_to_next_task)
+
+    def get_location_at(self, timestamp):
+        '''
+        Returns the elevator location at a future timestamp (up to its next task), without changing its state
+        '''
+        if self.next_task is None or timestamp <= self.move_start_ts:
+            return self.current_location
+
+        floor_difference_to_next_task = (self.next_task - self.move_start_location)
+        time_to_move_one_floor = self._get_time_to_move_one_floor(floor_difference_to_next_task)
+        floors_moved = (timestamp - self.move_start_ts) / time_to_move_one_floor
+        if floors_moved >= abs(floor_difference_to_next_task):
+            return self.next_task
+
+        return self.move_start_location + (1 if floor_difference_to_next_task > 0 else -1) * floors_moved
 
     def _move_elevator(self, new_location, new_ts, time_to_move_one_floor):
         '''
         Used for 2 things:
             - Changing elevator value to indicate new location and current TS
-            - Log all the floors that the elevator visited/passed through
+            - Log all the floors that the elevator visited/passed through (their arrival time is taken from the
+              segment, so it's the same however the move was split)
         '''
+        # Every move logs the floors from its start location up to (not including) its end location, where the next
+        # move starts from - so a move split midway logs the same floors
         # Elevator going up
         if new_location > self.current_location:
-            all_floors = list(range(math.ceil(self.current_location), math.floor(new_location)))
+            all_floors = range(math.ceil(self.current_location), math.ceil(new_location))
         # Elevator going down
         else:
-            all_floors = list(range(math.floor(self.current_location), math.ceil(new_location), -1))
+            all_floors = range(math.floor(self.current_location), math.floor(new_location), -1)
 
         for floor in all_floors:
-            arrival_ts = self.current_ts + (abs(floor - self.current_location) * time_to_move_one_floor)
-            self.ts_to_arrival_floor_log[arrival_ts] = floor
+            arrival_ts = self.move_start_ts + (abs(floor - self.move_start_location) * time_to_move_one_floor)
+            self.floor_arrival_log.append(arrival_ts, floor)
 
         self.current_location = new_location
         self.current_ts = new_ts
@@ -63,7 +181,7 @@ class Elevator(object):
         If max_timestamp in None, assume we can always reach the next task
         '''
         # If no more tasks, advance time and return
-        if not self.task_list:
+        if self.next_task is None:
             self.current_ts = max_timestamp
             return
 
@@ -74,29 +192,23 @@ class Elevator(object):
             self.current_ts += self.time_to_close_doors
             self.doors_open = False
             # In case we went over max_timestamp by waiting for the doors to close, return without moving
-            # (for simplicity - round "current_ts" to be the same as "max_timestamp", although it's less accurate)
+            # (for simplicity - round "current_ts" to be the same as "max_timestamp", although it's less accurate,
+            # the segment then starts at max_timestamp)
             if max_timestamp is not None and (self.current_ts > max_timestamp):
                 self.current_ts = max_timestamp
+                self._start_move_segment()
                 return
 
-        floor_difference_to_next_task = (self.task_list[0] - self.current_location)
-        time_to_move_one_floor = self.time_to_ascend_one_floor \
-            if floor_difference_to_next_task >= 0 \
-            else self.time_to_descend_one_floor
-        time_to_next_task = time_to_move_one_floor * abs(floor_difference_to_next_task)
+        next_task_arrival_ts = self.get_next_task_arrival_ts()
+        time_to_move_one_floor = self._get_time_to_move_one_floor(self.next_task - self.move_start_location)
 
         # If the elevator CAN reach the next task in time
-        if max_timestamp is None or (self.current_ts + time_to_next_task <= max_timestamp):
-            self._move_elevator(new_location=self.task_list[0],
-                                new_ts=self.current_ts + time_to_next_task + self.time_to_open_doors,
+        if max_timestamp is None or (next_task_arrival_ts <= max_timestamp):
+            self._move_elevator(new_location=self.next_task, new_ts=next_task_arrival_ts + self.time_to_open_doors,
                                 time_to_move_one_floor=time_to_move_one_floor)
             self.doors_open = True
-            del self.task_list[0]
+            self._pop_next_task()
         # If the elevator CAN'T reach the next task in time
         else:
-            new_location = self.current_location + ((1 if floor_difference_to_next_task > 0 else -1) *
-                                                    (max_timestamp - self.current_ts) / time_to_move_one_floor)
-            self._move_elevator(new_location=new_location, new_ts=max_timestamp,
+            self._move_elevator(new_location=self.get_location_at(max_timestamp), new_ts=max_timestamp,
                                 time_to_move_one_floor=time_to_move_one_floor)
-
-
@@ -1,7 +1,7 @@
 import unittest
 import random
 from collections import defaultdict
-from elevator import Elevator
+from elevator.elevator import Elevator
 
 
 class ElevatorTest(unittest.TestCase):
@@ -77,6 +77,31 @@ class ElevatorTest(unittest.TestCase):
         self.assertEqual(ts2, max_ts_2)
         self.assertEqual(location2, next_tasks[0])
 
+    def test_RunToNextTaskOrMaxTs_split_move(self):
+        conf = self._get_default_conf()
+        conf["TIME_TO_GO_DOWN_ONE_FLOOR"] = 0.7
+        elevators = [Elevator(conf), Elevator(conf)]
+        for elevator in elevators:
+            elevator.register_next_tasks([conf["INITIAL_FLOOR"] + 30])
+            elevator.run_to_next_task_or_max_ts(None)
+            elevator.register_next_tasks([conf["INITIAL_FLOOR"]])
+        split_elevator, elevator = elevators
+        arrival_ts = elevator.get_next_task_arrival_ts()
+
+        # Stopping midway every second (and registering the same task again) doesn't change the arrival time, or the
+        # floors passed on the way
+        move_start_ts = int(elevator.get_status()[0]) + conf["TIME_TO_CLOSE_DOORS"]
+        for max_ts in range(move_start_ts + 1, int(arrival_ts)):
+            split_elevator.run_to_next_task_or_max_ts(max_ts)
+            split_elevator.register_next_tasks([conf["INITIAL_FLOOR"]])
+            self.assertEqual(split_elevator.get_next_task_arrival_ts(), arrival_ts)
+            self.assertEqual(split_elevator.get_status()[1], elevator.get_location_at(max_ts))
+
+        for elevator in elevators:
+            elevator.run_to_next_task_or_max_ts(None)
+            self.assertEqual(elevator.get_status(), (arrival_ts + conf["TIME_TO_OPEN_DOORS"], conf["INITIAL_FLOOR"]))
+        self.assertEqual(list(split_elevator.get_floor_arrival_log()), list(elevator.get_floor_arrival_log()))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,342 @@
+import collections
+import enum
+import itertools
+import time
+import yaml
+from algo.algo_interface import BaseAlgoInterface, BaseDispatcherInterface, CarStatus
+from elevator.elevator import Elevator, FloorArrivalCounter
+from demand_simulation_data.load_simulation_data import load_simulation_events_columns
+from event_scheduler import EventScheduler
+from monitoring.performance_monitor import PerformanceMonitor
+from monitoring.phase_profiler import PhaseProfiler
+from monitoring.streaming_performance_monitor import StreamingPerformanceMonitor
+
+
+# Methods timed when profiling, per component (see PhaseProfiler)
+PROFILED_ALGO_METHODS = ['convert_event_for_rider_registration', 'register_rider_source', 'register_rider_destination',
+                         'elevator_heartbeat', 'report_rider_pickup', 'report_rider_dropoff', 'register_rider_sources',
+                         'report_rider_pickups', 'report_rider_dropoffs']
+PROFILED_ELEVATOR_METHODS = ['register_next_tasks', 'run_to_next_task_or_max_ts', 'get_next_task_arrival_ts',
+                             'get_location_at']
+PROFILED_PERFORMANCE_MONITOR_METHODS = ['rider_request', 'rider_pickup', 'rider_dropoff', 'floors_visited']
+PROFILED_DISPATCHER_METHODS = ['assign_rider']
+
+
+def load_elevator_configuration(elevator_config_filename):
+    with open(elevator_config_filename, 'rb') as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
+
+
+class ElevatorCar(object):
+    '''
+    A single car in an elevator bank - an elevator, the algo instance that schedules it, and the riders assigned to it
+    '''
+    def __init__(self, car_id, elevator_conf, algo, performance_monitor, floor_arrival_log=None):
+        self.car_id = car_id
+        self.elevator = Elevator(elevator_conf, floor_arrival_log)
+        self.algo = algo
+        self.performance_monitor = performance_monitor
+
+        self.rider_id_to_dropoff_location_map = {}
+        # Floor -> riders waiting to be picked up / dropped off at that floor, kept in registration order
+        self.floor_to_pickup_riders = collections.defaultdict(dict)
+        self.floor_to_dropoff_riders = collections.defaultdict(dict)
+        self.assigned_riders_count = 0
+        # (rider_id, *event data) of the riders requesting a ride at the current timestamp, not registered yet
+        self.pending_rider_sources = []
+        # The car's pending CAR_ARRIVAL event (if it has any tasks), and whether it has a pending CAR_RIDERS_HANDLING
+        self.next_arrival_event = None
+        self.riders_handling_scheduled = False
+
+    def get_status(self, timestamp):
+        return CarStatus(location=self.elevator.get_location_at(timestamp),
+                         assigned_riders=self.assigned_riders_count)
+
+    def _decide_next_tasks(self, algo_callback, *args):
+        '''
+        Reports an event to the algo and hands its next tasks to the elevator, recording the decision latency - the
+        time the algo takes to return its next task (algos may return their tasks lazily, so it includes producing the
+        first one), against the number of riders queued in the car
+        '''
+        queue_depth = self.assigned_riders_count
+        start_ns = time.perf_counter_ns()
+        next_tasks = iter(algo_callback(*args))
+        next_task = next(next_tasks, None)
+        latency_ns = time.perf_counter_ns() - start_ns
+
+        self.elevator.register_next_tasks(itertools.chain([next_task], next_tasks) if next_task is not None else [])
+        self.performance_monitor.record_decision(latency_ns, queue_depth, self.car_id)
+
+    def record_rider_request(self, sim_event):
+        '''
+        The rider is only registered with the algo by register_rider_requests, along with the rest of the riders
+        requesting a ride at the same time
+        '''
+        current_ts, current_location = self.elevator.get_status()
+        self.performance_monitor.rider_request(current_ts, sim_event.rider_id, sim_event.source_floor,
+                                               sim_event.destination_floor, current_location, self.car_id)
+
+        event_data = self.algo.convert_event_for_rider_registration(sim_event.source_floor,
+                                                                    sim_event.destination_floor)
+        self.pending_rider_sources.append((sim_event.rider_id, *event_data))
+
+        self.floor_to_pickup_riders[sim_event.source_floor][sim_event.rider_id] = None
+        self.rider_id_to_dropoff_location_map[sim_event.rider_id] = sim_event.destination_floor
+        self.assigned_riders_count += 1
+
+    def register_rider_requests(self):
+        current_ts, current_location = self.elevator.get_status()
+        self.algo.elevator_heartbeat(current_ts, current_location)
+        self._decide_next_tasks(self.algo.register_rider_sources, self.pending_rider_sources)
+        self.pending_rider_sources = []
+
+    def _handle_rider_pickup(self, current_ts, current_location):
+        rider_destinations = []
+        for rider_id in self.floor_to_pickup_riders.pop(current_location):
+            self.performance_monitor.rider_pickup(current_ts, rider_id, current_location, self.car_id)
+            dropoff_floor = self.rider_id_to_dropoff_location_map.pop(rider_id)
+            self.floor_to_dropoff_riders[dropoff_floor][rider_id] = None
+            rider_destinations.append((rider_id, dropoff_floor))
+
+        self._decide_next_tasks(self.algo.report_rider_pickups, current_ts, current_location, rider_destinations)
+
+    def _handle_rider_dropoff(self, current_ts, current_location):
+        rider_ids = list(self.floor_to_dropoff_riders.pop(current_location))
+        for rider_id in rider_ids:
+            self.performance_monitor.rider_dropoff(current_ts, rider_id, current_location, self.car_id)
+
+        self._decide_next_tasks(self.algo.report_rider_dropoffs, current_ts, rider_ids)
+        self.assigned_riders_count -= len(rider_ids)
+
+    def handle_riders_at_current_location(self):
+        current_ts, current_location = self.elevator.get_status()
+        if current_location in self.floor_to_pickup_riders:
+            self._handle_rider_pickup(current_ts, current_location)
+
+        if current_location in self.floor_to_dropoff_riders:
+            self._handle_rider_dropoff(current_ts, current_location)
+
+
+class SimulationEventType(enum.IntEnum):
+    '''
+    Events with the same timestamp are handled by this order
+    '''
+    # A car reaches its next task and opens its doors
+    CAR_ARRIVAL = 0
+    # All the riders requesting a ride at the same timestamp
+    RIDER_REQUEST = 1
+    # Riders boarding/leaving a car that is at a rider request's timestamp - this happens only after all the requests
+    # of that timestamp were recorded, so that riders requesting at the car's floor get on immediately
+    CAR_RIDERS_HANDLING = 2
+
+
+class ElevatorBankSimulationRunner(object):
+    '''
+    Runs a bank of cars on a single shared clock.
+    Every rider request is assigned to a car by the dispatcher, and from then on only that car handles the rider.
+
+    The simulation is driven by an EventScheduler, so it jumps from one event to the next instead of polling all cars -
+    every busy car has a single pending CAR_ARRIVAL event, and only the next rider request is queued at any time.
+    A car is brought to a rider request's timestamp only if the rider is assigned to it.
+    With a single car, this is exactly SimulationRunner.
+
+    With streaming_metrics, the runner only keeps aggregated metrics (see StreamingPerformanceMonitor) instead of
+    logging every event and floor arrival, so long runs take memory for the active riders only - stats have the same
+    keys, but medians/percentiles are approximated, and there is no visualization data.
+
+    With profile, the call count and wall time of every simulation phase (scheduler event handlers, elevator moves,
+    algo callbacks, dispatcher and performance monitor calls) are recorded, and added to the performance stats.
+    Without it, nothing is instrumented, so there's no overhead.
+    '''
+    def __init__(self, simulation_filename, algo_class, dispatcher_class, cars_count,
+                 elevator_config_filename=None, conf=None, streaming_metrics=False, profile=False, algo_kwargs=None):
+        self.conf = conf if conf is not None else load_elevator_configuration(elevator_config_filename)
+        self.algo_class = algo_class
+        self.dispatcher_class = dispatcher_class
+        self.cars_count = cars_count
+        self.streaming_metrics = streaming_metrics
+        self.profile = profile
+        self.reset(simulation_filename, algo_kwargs)
+
+    def reset(self, simulation_filename, algo_kwargs=None):
+        '''
+        Puts the runner back in its initial state, running the given scenario with fresh cars and algo instances.
+        The already parsed configuration is reused, and the algo class is only resolved once per process.
+        algo_kwargs - extra arguments for the constructor of every car's algo (see BaseAlgoInterface.get_algo)
+        '''
+        elevator_conf = self.conf["ELEVATOR"]
+        self.simulation_events = load_simulation_events_columns(simulation_filename)
+        self.simulation_events_count = len(self.simulation_events)
+        self.max_floor = self.simulation_events.max_floor
+        if self.streaming_metrics:
+            self.performance_monitor = StreamingPerformanceMonitor(self.max_floor)
+        else:
+            self.performance_monitor = PerformanceMonitor(self.max_floor, self.simulation_events_count)
+        self.dispatcher = BaseDispatcherInterface.get_dispatcher(self.dispatcher_class, elevator_conf,
+                                                                 self.max_floor, self.cars_count)
+        algo_kwargs = algo_kwargs or {}
+        self.cars = [ElevatorCar(car_id, elevator_conf,
+                                 BaseAlgoInterface.get_algo(self.algo_class, elevator_conf, self.max_floor,
+                                                            **algo_kwargs),
+                                 self.performance_monitor,
+                                 FloorArrivalCounter() if self.streaming_metrics else None)
+                     for car_id in range(self.cars_count)]
+        self.next_event_index = 0
+
+        self.scheduler = EventScheduler()
+        self.scheduler.register_handler(SimulationEventType.CAR_ARRIVAL, self._handle_car_arrival)
+        self.scheduler.register_handler(SimulationEventType.RIDER_REQUEST, self._handle_rider_requests)
+        self.scheduler.register_handler(SimulationEventType.CAR_RIDERS_HANDLING, self._handle_car_riders)
+        self._schedule_next_rider_request()
+
+        self.profiler = None
+        if self.profile:
+            self._instrument()
+
+    def _instrument(self):
+        '''
+        Attaches a new PhaseProfiler to the scheduler, its event handlers, and to the components of all cars
+        (phases of different cars are counted together)
+        '''
+        self.profiler = PhaseProfiler()
+        self.profiler.instrument(self.scheduler, ['run'], 'scheduler')
+        for event_type, handler in list(self.scheduler.handlers.items()):
+            self.scheduler.handlers[event_type] = self.profiler.wrap("scheduler." + event_type.name.lower(), handler)
+        self.profiler.instrument(self.dispatcher, PROFILED_DISPATCHER_METHODS, 'dispatcher')
+        self.profiler.instrument(self.performance_monitor, PROFILED_PERFORMANCE_MONITOR_METHODS, 'performance_monitor')
+        for car in self.cars:
+            self.profiler.instrument(car.algo, PROFILED_ALGO_METHODS, 'algo')
+            self.profiler.instrument(car.elevator, PROFILED_ELEVATOR_METHODS, 'elevator')
+
+    def get_algo_name(self):
+        return self.cars[0].algo.get_algo_name()
+
+    def _get_next_rider_request_ts(self):
+        if self.next_event_index < self.simulation_events_count:
+            return self.simulation_events.timestamp(self.next_event_index)
+
+        return None
+
+    def _schedule_next_rider_request(self):
+        next_rider_request_ts = self._get_next_rider_request_ts()
+        if next_rider_request_ts is not None:
+            self.scheduler.schedule(next_rider_request_ts, SimulationEventType.RIDER_REQUEST)
+
+    def _schedule_car(self, car):
+        next_task_arrival_ts = car.elevator.get_next_task_arrival_ts()
+        if car.next_arrival_event is not None:
+            # The car's arrival time only changes if its next task does (see Elevator), so the pending event is
+            # usually still right, and is kept instead of being cancelled and scheduled again
+            if self.scheduler.get_timestamp(car.next_arrival_event) == next_task_arrival_ts:
+                return
+            self.scheduler.cancel(car.next_arrival_event)
+            car.next_arrival_event = None
+
+        if next_task_arrival_ts is not None:
+            car.next_arrival_event = self.scheduler.schedule(next_task_arrival_ts, SimulationEventType.CAR_ARRIVAL,
+                                                             car)
+
+    def _schedule_car_riders_handling(self, car, timestamp):
+        if not car.riders_handling_scheduled:
+            car.riders_handling_scheduled = True
+            self.scheduler.schedule(timestamp, SimulationEventType.CAR_RIDERS_HANDLING, car)
+
+    def _stop_if_done(self):
+        # Once there are no more rider requests coming up, the simulation ends when all the riders reached their
+        # destination (cars may still have tasks, e.g. the shabbat elevator always does)
+        if self.next_event_index >= self.simulation_events_count and \
+                not any(car.assigned_riders_count for car in self.cars):
+            self.scheduler.stop()
+
+    def _handle_car_arrival(self, timestamp, car):
+        car.next_arrival_event = None
+        next_rider_request_ts = self._get_next_rider_request_ts()
+        car.elevator.run_to_next_task_or_max_ts(max_timestamp=next_rider_request_ts)
+
+        # If the car's doors finish opening exactly when riders request a ride, let them register first
+        current_ts, _ = car.elevator.get_status()
+        if current_ts == next_rider_request_ts:
+            self._schedule_car_riders_handling(car, current_ts)
+        else:
+            self._handle_car_riders(timestamp, car)
+
+    def _handle_car_riders(self, timestamp, car):
+        car.riders_handling_scheduled = False
+        car.handle_riders_at_current_location()
+        self._schedule_car(car)
+        self._stop_if_done()
+
+    def _handle_rider_requests(self, current_ts, _):
+        # Loop over all riders registering at the same time, every car then registers its riders with its algo at once
+        requested_cars = {}
+        while self.next_event_index < self.simulation_events_count and \
+                self.simulation_events.timestamp(self.next_event_index) == current_ts:
+            sim_event = self.simulation_events[self.next_event_index]
+            if self.cars_count == 1:
+                car = self.cars[0]
+            else:
+                car_statuses = [car.get_status(current_ts) for car in self.cars]
+                car = self.cars[self.dispatcher.assign_rider(current_ts, sim_event.rider_id, sim_event.source_floor,
+                                                             sim_event.destination_floor, car_statuses)]
+
+            # Bring the car to the request timestamp (unless it's already there), its pending arrival event is
+            # rescheduled once its riders are handled, if the algo changed its next task
+            car_ts, _ = car.elevator.get_status()
+            if car_ts != current_ts:
+                car.elevator.run_to_next_task_or_max_ts(max_timestamp=current_ts)
+            self._schedule_car_riders_handling(car, current_ts)
+
+            car.record_rider_request(sim_event)
+            requested_cars[car.car_id] = car
+            self.next_event_index += 1
+
+        for car in requested_cars.values():
+            car.register_rider_requests()
+
+        self._schedule_next_rider_request()
+
+    def run_simulation(self):
+        self.scheduler.run()
+
+        # Log all floors visited
+        for car in self.cars:
+            self.performance_monitor.floors_visited(car.elevator.get_floor_arrival_log(), car.car_id)
+
+    def get_performance_stats(self):
+        '''
+        When profiling, the stats also include the profile of every phase, as profile_<phase>_<stat>
+        '''
+        stats = self.performance_monitor.calculate_performace_stats()
+        if self.profiler is not None:
+            for phase_name, phase_stats in self.get_profile_stats().items():
+                stats.update({"profile_{}_{}".format(phase_name, stat_name): value
+                              for stat_name, value in phase_stats.items()})
+
+        return stats
+
+    def get_profile_stats(self):
+        '''
+        Returns phase -> call count, total time and call time percentiles (see PhaseProfiler.get_stats)
+        '''
+        if self.profiler is None:
+            raise Exception("Profiling is disabled, create the runner with profile=True")
+
+        return self.profiler.get_stats()
+
+    def write_profile_trace(self, filename):
+        '''
+        Writes the profile as folded stacks, to be rendered as a flame graph (see PhaseProfiler.write_folded_stacks)
+        '''
+        if self.profiler is None:
+            raise Exception("Profiling is disabled, create the runner with profile=True")
+
+        self.profiler.write_folded_stacks(filename)
+
+    def get_car_performance_stats(self):
+        return self.performance_monitor.calculate_car_performance_stats()
+
+    def print_performance_stats(self):
+        self.performance_monitor.print_performance_stats()
+        for car_id, car_stats in self.get_car_performance_stats().items():
+            print("Car {} - riders served: {:>5} floors passed: {:>6} done at: {}".format(
+                car_id, car_stats["riders_served"], car_stats["floors_passed"], car_stats["time_to_complete_all_tasks"]))
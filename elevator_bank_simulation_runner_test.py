@@ -0,0 +1,158 @@
+import glob
+import time
+import unittest
+from unittest import mock
+from algo.algo_interface import BaseAlgoInterface
+from algo.naive_elevator import fifo_elevator, knuth_elevator as naive_knuth_elevator
+from algo.up_down_elevator import knuth_elevator as up_down_knuth_elevator
+from elevator_bank_simulation_runner import ElevatorBankSimulationRunner, ElevatorCar, load_elevator_configuration
+from simulation_runner import SimulationRunner
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+ROUND_ROBIN_DISPATCHER_CLASS = 'algo.dispatcher.round_robin_dispatcher.RoundRobinDispatcher'
+NEAREST_CAR_DISPATCHER_CLASS = 'algo.dispatcher.nearest_car_dispatcher.NearestCarDispatcher'
+ALGO_CLASSES = [
+    'algo.naive_elevator.fifo_elevator.FIFOElevatorAlgo',
+    'algo.naive_elevator.knuth_elevator.KnuthElevatorAlgo',
+    'algo.naive_elevator.shabbat_elevator.ShabbatElevatorAlgo',
+    'algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo'
+]
+SIMULATION_FILENAMES = sorted(glob.glob('demand_simulation_data/manual_scenario/*.csv'))
+# (algo class, scenario) -> (time to complete all tasks, total wait time, total ride time) of a 3 car bank, with the
+# nearest car dispatcher
+EXPECTED_BANK_STATS = {
+    ('algo.naive_elevator.fifo_elevator.FIFOElevatorAlgo', 'simple_1.csv'): (108, 237, 171),
+    ('algo.naive_elevator.knuth_elevator.KnuthElevatorAlgo', 'simple_1.csv'): (108, 193, 291),
+    ('algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo', 'simple_1.csv'): (108, 249, 191),
+    ('algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo', 'small_office_2.csv'): (101, 276, 311),
+}
+# Algo class -> the same algo, handling batch events one rider at a time
+PER_RIDER_ALGO_CLASSES = {
+    'algo.naive_elevator.fifo_elevator.FIFOElevatorAlgo':
+        'elevator_bank_simulation_runner_test.PerRiderFIFOElevatorAlgo',
+    'algo.naive_elevator.knuth_elevator.KnuthElevatorAlgo':
+        'elevator_bank_simulation_runner_test.PerRiderNaiveKnuthElevatorAlgo',
+    'algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo':
+        'elevator_bank_simulation_runner_test.PerRiderUpDownKnuthElevatorAlgo',
+}
+# All the bundled scenarios, including the generated random scenarios if there are any
+ALL_SIMULATION_FILENAMES = sorted(glob.glob('demand_simulation_data/**/*.csv', recursive=True))
+
+
+class PerRiderAlgoMixin(object):
+    '''
+    Handles batch events with the BaseAlgoInterface defaults, one rider at a time
+    '''
+    register_rider_sources = BaseAlgoInterface.register_rider_sources
+    report_rider_pickups = BaseAlgoInterface.report_rider_pickups
+    report_rider_dropoffs = BaseAlgoInterface.report_rider_dropoffs
+
+
+class PerRiderFIFOElevatorAlgo(PerRiderAlgoMixin, fifo_elevator.FIFOElevatorAlgo):
+    pass
+
+
+class PerRiderNaiveKnuthElevatorAlgo(PerRiderAlgoMixin, naive_knuth_elevator.KnuthElevatorAlgo):
+    pass
+
+
+class PerRiderUpDownKnuthElevatorAlgo(PerRiderAlgoMixin, up_down_knuth_elevator.KnuthElevatorAlgo):
+    pass
+
+
+class ElevatorBankSimulationRunnerTest(unittest.TestCase):
+    @staticmethod
+    def _get_simulated_stats(runner):
+        return {stat_name: value for stat_name, value in runner.get_performance_stats().items()
+                if "decision_latency" not in stat_name}
+
+    def test_single_car_matches_simulation_runner(self):
+        for algo_class in ALGO_CLASSES:
+            for simulation_filename in SIMULATION_FILENAMES:
+                with self.subTest(algo_class=algo_class, simulation_filename=simulation_filename):
+                    sim_runner = SimulationRunner(simulation_filename, algo_class, ELEVATOR_CONFIGURATION_FILE)
+                    sim_runner.run_simulation()
+
+                    # With a single car, the dispatcher must not change the results
+                    bank_runner = ElevatorBankSimulationRunner(simulation_filename, algo_class,
+                                                               NEAREST_CAR_DISPATCHER_CLASS, 1,
+                                                               ELEVATOR_CONFIGURATION_FILE)
+                    bank_runner.run_simulation()
+
+                    # (apart from the decision latencies, which are measured wall times)
+                    self.assertEqual(self._get_simulated_stats(bank_runner), self._get_simulated_stats(sim_runner))
+
+    def test_expected_bank_stats(self):
+        for (algo_class, scenario), expected_stats in EXPECTED_BANK_STATS.items():
+            with self.subTest(algo_class=algo_class, scenario=scenario):
+                bank_runner = ElevatorBankSimulationRunner('demand_simulation_data/manual_scenario/' + scenario,
+                                                           algo_class, NEAREST_CAR_DISPATCHER_CLASS, 3,
+                                                           ELEVATOR_CONFIGURATION_FILE)
+                bank_runner.run_simulation()
+                stats = bank_runner.get_performance_stats()
+                self.assertEqual((stats["time_to_complete_all_tasks"], stats["total_wait_time"],
+                                  stats["total_ride_time"]), expected_stats)
+
+    def test_batch_events_match_per_rider_events(self):
+        for algo_class, per_rider_algo_class in PER_RIDER_ALGO_CLASSES.items():
+            for simulation_filename in ALL_SIMULATION_FILENAMES:
+                for cars_count in [1, 3]:
+                    with self.subTest(algo_class=algo_class, simulation_filename=simulation_filename,
+                                      cars_count=cars_count):
+                        runners = [ElevatorBankSimulationRunner(simulation_filename, algo, NEAREST_CAR_DISPATCHER_CLASS,
+                                                                cars_count, ELEVATOR_CONFIGURATION_FILE)
+                                   for algo in [algo_class, per_rider_algo_class]]
+                        for runner in runners:
+                            runner.run_simulation()
+
+                        self.assertEqual(*[self._get_simulated_stats(runner) for runner in runners])
+
+    def test_decision_latency_times_only_the_algo(self):
+        def get_next_tasks():
+            time.sleep(0.01)
+            yield 5
+
+        performance_monitor = mock.Mock()
+        car = ElevatorCar(0, load_elevator_configuration(ELEVATOR_CONFIGURATION_FILE)["ELEVATOR"], None,
+                          performance_monitor)
+        register_next_tasks = car.elevator.register_next_tasks
+        with mock.patch.object(car.elevator, 'register_next_tasks',
+                               side_effect=lambda tasks: (time.sleep(0.1), register_next_tasks(tasks))):
+            car._decide_next_tasks(get_next_tasks)
+
+        # Producing the (lazily generated) first task is timed, handing the tasks to the elevator is not
+        latency_ns, _, _ = performance_monitor.record_decision.call_args[0]
+        self.assertGreaterEqual(latency_ns, 10 ** 7)
+        self.assertLess(latency_ns, 10 ** 8)
+        self.assertEqual(car.elevator.next_task, 5)
+
+    def test_all_riders_served(self):
+        simulation_filename = 'demand_simulation_data/manual_scenario/medium_office_1.csv'
+        for dispatcher_class in [ROUND_ROBIN_DISPATCHER_CLASS, NEAREST_CAR_DISPATCHER_CLASS]:
+            with self.subTest(dispatcher_class=dispatcher_class):
+                bank_runner = ElevatorBankSimulationRunner(simulation_filename, ALGO_CLASSES[1], dispatcher_class, 4,
+                                                           ELEVATOR_CONFIGURATION_FILE)
+                bank_runner.run_simulation()
+
+                car_stats = bank_runner.get_car_performance_stats()
+                self.assertEqual(len(car_stats), 4)
+                self.assertEqual(sum(s["riders_served"] for s in car_stats.values()),
+                                 len(bank_runner.simulation_events))
+                self.assertEqual(bank_runner.get_performance_stats()["time_to_complete_all_tasks"],
+                                 max(s["time_to_complete_all_tasks"] for s in car_stats.values()))
+
+    def test_round_robin_assignment(self):
+        simulation_filename = 'demand_simulation_data/manual_scenario/small_office_2.csv'
+        bank_runner = ElevatorBankSimulationRunner(simulation_filename, ALGO_CLASSES[0], ROUND_ROBIN_DISPATCHER_CLASS,
+                                                   3, ELEVATOR_CONFIGURATION_FILE)
+        bank_runner.run_simulation()
+
+        performance_monitor = bank_runner.performance_monitor
+        rider_to_car = {rider_id: performance_monitor.rider_car_ids[rider_id]
+                        for rider_id in performance_monitor.get_requested_rider_ids()}
+        self.assertEqual(rider_to_car, {rider_id: rider_id % 3 for rider_id in rider_to_car})
+        self.assertEqual(set(rider_to_car.values()), {0, 1, 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
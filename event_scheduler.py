@@ -0,0 +1,63 @@
+import heapq
+import itertools
+
+
+class EventScheduler(object):
+    '''
+    A discrete-event simulation core - a priority queue of timestamped events, and a handler per event type.
+    The simulation jumps straight from one event to the next, and handlers schedule any follow-up events.
+
+    Event types must be orderable (e.g. an enum.IntEnum) - events with the same timestamp are handled by event type
+    order, and then by the order in which they were scheduled.
+    New event types are added by registering a handler for them, without changing the scheduler's loop.
+    '''
+    def __init__(self):
+        self.events_queue = []
+        self.handlers = {}
+        self.current_ts = 0
+        self._sequence = itertools.count()
+        self._stopped = False
+        # Number of (non cancelled) events handled so far, e.g. for measuring simulation throughput
+        self.handled_events_count = 0
+
+    def register_handler(self, event_type, handler):
+        '''
+        handler(timestamp, payload) is called for every event of the given type
+        '''
+        self.handlers[event_type] = handler
+
+    def schedule(self, timestamp, event_type, payload=None):
+        '''
+        Returns the scheduled event, which can later be passed to cancel()
+        '''
+        event = [timestamp, event_type, next(self._sequence), payload, True]
+        heapq.heappush(self.events_queue, event)
+        return event
+
+    @staticmethod
+    def get_timestamp(event):
+        return event[0]
+
+    @staticmethod
+    def cancel(event):
+        '''
+        Cancelled events are left in the queue (removing them would cost O(n)), and skipped once popped
+        '''
+        event[-1] = False
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self):
+        '''
+        Handles events by timestamp order, until there are no more events or a handler stops the scheduler
+        '''
+        self._stopped = False
+        while self.events_queue and not self._stopped:
+            timestamp, event_type, _, payload, is_active = heapq.heappop(self.events_queue)
+            if not is_active:
+                continue
+
+            self.current_ts = timestamp
+            self.handled_events_count += 1
+            self.handlers[event_type](timestamp, payload)
@@ -0,0 +1,296 @@
+import glob
+import os
+import random
+import tempfile
+import unittest
+from algo.algo_interface import NaiveElevatorAlgoInterface, UpDownElevatorAlgoInterface
+from algo.algo_interface import TaskType, UpDown
+from algo.naive_elevator import knuth_elevator as naive_knuth_elevator
+from algo.up_down_elevator import knuth_elevator as up_down_knuth_elevator
+from elevator_bank_simulation_runner import ElevatorBankSimulationRunner
+from simulation_runner import SimulationRunner
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+NEAREST_CAR_DISPATCHER_CLASS = 'algo.dispatcher.nearest_car_dispatcher.NearestCarDispatcher'
+DIFFERENTIAL_ALGO_CLASSES = [
+    'knuth_elevator_differential_test.DifferentialNaiveKnuthElevatorAlgo',
+    'knuth_elevator_differential_test.DifferentialUpDownKnuthElevatorAlgo'
+]
+# All the bundled scenarios, and the generated random scenarios if there are any
+SIMULATION_FILENAMES = sorted(glob.glob('demand_simulation_data/**/*.csv', recursive=True))
+RANDOM_SCENARIOS_SEED = 17
+RANDOM_SCENARIOS_COUNT = 10
+
+
+# The sorting based implementations that the floor buckets ones replaced, used as the reference
+class ReferenceNaiveKnuthElevatorAlgo(NaiveElevatorAlgoInterface):
+    '''
+    The KnuthElevatorAlgo follows the following logic:
+    1. Continue travelling in the same direction while there are remaining requests in that same direction.
+    2. If there are no further requests in that direction,
+        then stop and become idle, or change direction if there are requests in the opposite direction.
+    '''
+    class Task(object):
+        def __init__(self, rider_id, floor, task_type):
+            self.rider_id = rider_id
+            self.floor = floor
+            self.task_type = task_type
+
+    def __init__(self, elevator_conf, max_floor):
+        super().__init__(elevator_conf, max_floor)
+        self.all_tasks = []
+        # Arbitrarily set initial direction as "UP" if the elevator location is not the top floor
+        self.current_direction = UpDown.UP if self.elevator_location < self.max_floor else UpDown.DOWN
+
+    def _remaining_tasks_in_current_direction(self):
+        if (self.current_direction == UpDown.UP and [a for a in self.all_tasks if a.floor >= self.elevator_location]) \
+                or \
+                (self.current_direction == UpDown.DOWN and [a for a in self.all_tasks if a.floor <= self.elevator_location]):
+            return True
+        else:
+            return False
+
+    def _change_direction(self):
+        if self.current_direction == UpDown.UP:
+            self.current_direction = UpDown.DOWN
+        else:
+            self.current_direction = UpDown.UP
+
+    def _get_next_tasks(self):
+        # If not more tasks - return an empty list
+        if not self.all_tasks:
+            return []
+
+        # If no more tasks in current direction - change direction
+        if not self._remaining_tasks_in_current_direction():
+            self._change_direction()
+
+        # Return ordered list of tasks in the current direction followed be reverse direction
+        if self.current_direction == UpDown.UP:
+            current_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor >= self.elevator_location],
+                                             reverse=False)
+            reverse_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor < self.elevator_location],
+                                             reverse=True)
+        else:
+            current_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor <= self.elevator_location],
+                                             reverse=True)
+            reverse_direction_tasks = sorted([t.floor for t in self.all_tasks if t.floor > self.elevator_location],
+                                             reverse=False)
+
+        next_tasks = current_direction_tasks + reverse_direction_tasks
+        return next_tasks
+
+    def register_rider_source(self, rider_id, source_floor):
+        self.all_tasks.append(ReferenceNaiveKnuthElevatorAlgo.Task(rider_id, source_floor, TaskType.PICKUP))
+        return self._get_next_tasks()
+
+    def register_rider_destination(self, rider_id, destination_floor):
+        self.all_tasks.append(ReferenceNaiveKnuthElevatorAlgo.Task(rider_id, destination_floor, TaskType.DROPOFF))
+        return self._get_next_tasks()
+
+    def report_rider_pickup(self, timestamp, rider_id):
+        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.PICKUP][0]
+        self.all_tasks.remove(pickup_task)
+        return self._get_next_tasks()
+
+    def report_rider_dropoff(self, timestamp, rider_id):
+        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.DROPOFF][0]
+        self.all_tasks.remove(pickup_task)
+        return self._get_next_tasks()
+
+
+class ReferenceUpDownKnuthElevatorAlgo(UpDownElevatorAlgoInterface):
+    '''
+    The KnuthElevatorAlgo follows the following logic:
+    1. Continue travelling in the same direction while there are remaining requests in that same direction.
+    2. If there are no further requests in that direction,
+        then stop and become idle, or change direction if there are requests in the opposite direction.
+    '''
+    class Task(object):
+        def __init__(self, rider_id, floor, task_type, pickup_direction=None):
+            self.rider_id = rider_id
+            self.floor = floor
+            self.task_type = task_type
+            self.pickup_direction = pickup_direction
+
+    def __init__(self, elevator_conf, max_floor):
+        super().__init__(elevator_conf, max_floor)
+        self.all_tasks = []
+        # Arbitrarily set initial direction as "UP" if the elevator location is not the top floor
+        self.current_direction = UpDown.UP if self.elevator_location < self.max_floor else UpDown.DOWN
+
+    def _remaining_tasks_in_current_direction(self):
+        if (self.current_direction == UpDown.UP and [a for a in self.all_tasks if a.floor >= self.elevator_location]) \
+                or \
+                (self.current_direction == UpDown.DOWN and [a for a in self.all_tasks if a.floor <= self.elevator_location]):
+            return True
+        else:
+            return False
+
+    def _change_direction(self):
+        if self.current_direction == UpDown.UP:
+            self.current_direction = UpDown.DOWN
+        else:
+            self.current_direction = UpDown.UP
+
+    def _get_pickups_for_direction(self, direction, start_from_floor=None):
+        all_pickups = [t for t in self.all_tasks if
+                       t.task_type == TaskType.PICKUP and
+                       (not start_from_floor or
+                        (t.floor >= self.elevator_location and direction == UpDown.UP) or
+                        (t.floor <= self.elevator_location and direction == UpDown.DOWN)
+                        )
+                       ]
+
+        sorted_pickups = sorted(all_pickups, key=lambda x: x.floor, reverse=(direction == UpDown.DOWN))
+        relevant_pickups = [t for t in sorted_pickups if t.pickup_direction == direction]
+        if sorted_pickups and sorted_pickups[-1].pickup_direction != direction:
+            relevant_pickups += [sorted_pickups[-1]]
+
+        return relevant_pickups
+
+    def _get_next_tasks(self):
+        # If not more tasks - return an empty list
+        if not self.all_tasks:
+            return []
+
+        # If no more tasks in current direction - change direction
+        if not self._remaining_tasks_in_current_direction():
+            self._change_direction()
+
+        if self.current_direction == UpDown.UP:
+            current_direction_tasks = self._get_pickups_for_direction(UpDown.UP, self.elevator_location) + \
+                                      [t for t in self.all_tasks if
+                                       t.floor >= self.elevator_location and t.task_type != TaskType.PICKUP]
+
+            remaining_tasks = list(set(self.all_tasks) - set(current_direction_tasks))
+            reverse_direction_tasks = self._get_pickups_for_direction(UpDown.DOWN, None) + \
+                                      [t for t in remaining_tasks if t.task_type == TaskType.DROPOFF]
+        else:
+            current_direction_tasks = self._get_pickups_for_direction(UpDown.DOWN, self.elevator_location) + \
+                                      [t for t in self.all_tasks if
+                                       t.floor <= self.elevator_location and t.task_type != TaskType.PICKUP]
+
+            remaining_tasks = list(set(self.all_tasks) - set(current_direction_tasks))
+            reverse_direction_tasks = self._get_pickups_for_direction(UpDown.UP, None) + \
+                                      [t for t in remaining_tasks if t.task_type == TaskType.DROPOFF]
+
+        # Return ordered list of tasks in the current direction followed be reverse direction
+        return sorted([t.floor for t in current_direction_tasks], reverse=self.current_direction == UpDown.DOWN) + \
+               sorted([t.floor for t in reverse_direction_tasks], reverse=self.current_direction == UpDown.UP)
+
+    def register_rider_source(self, rider_id, source_floor, direction):
+        self.all_tasks.append(ReferenceUpDownKnuthElevatorAlgo.Task(rider_id, source_floor, TaskType.PICKUP, direction))
+        return self._get_next_tasks()
+
+    def register_rider_destination(self, rider_id, destination_floor):
+        self.all_tasks.append(ReferenceUpDownKnuthElevatorAlgo.Task(rider_id, destination_floor, TaskType.DROPOFF, None))
+        return self._get_next_tasks()
+
+    def report_rider_pickup(self, timestamp, rider_id):
+        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.PICKUP][0]
+        self.all_tasks.remove(pickup_task)
+        return self._get_next_tasks()
+
+    def report_rider_dropoff(self, timestamp, rider_id):
+        pickup_task = [a for a in self.all_tasks if a.rider_id == rider_id and a.task_type == TaskType.DROPOFF][0]
+        self.all_tasks.remove(pickup_task)
+        return self._get_next_tasks()
+
+
+class DifferentialAlgoMixin(object):
+    '''
+    Runs the reference algo side by side, and fails on the first event where the two algos return different tasks
+    '''
+    REFERENCE_ALGO_CLASS = None
+
+    def __init__(self, elevator_conf, max_floor):
+        super().__init__(elevator_conf, max_floor)
+        self.reference_algo = self.REFERENCE_ALGO_CLASS(elevator_conf, max_floor)
+
+    def _compare(self, event_name, tasks, reference_tasks):
+        tasks = list(tasks)
+        if tasks != reference_tasks:
+            raise Exception("{} at {} (location {}) returned {}, expected {}".format(
+                event_name, self.current_timestamp, self.elevator_location, tasks, reference_tasks))
+        return tasks
+
+    def elevator_heartbeat(self, timestamp, elevator_location):
+        super().elevator_heartbeat(timestamp, elevator_location)
+        self.reference_algo.elevator_heartbeat(timestamp, elevator_location)
+
+    def register_rider_source(self, rider_id, *args):
+        return self._compare("register_rider_source", super().register_rider_source(rider_id, *args),
+                             self.reference_algo.register_rider_source(rider_id, *args))
+
+    def register_rider_destination(self, rider_id, destination_floor):
+        return self._compare("register_rider_destination",
+                             super().register_rider_destination(rider_id, destination_floor),
+                             self.reference_algo.register_rider_destination(rider_id, destination_floor))
+
+    def report_rider_pickup(self, timestamp, rider_id):
+        return self._compare("report_rider_pickup", super().report_rider_pickup(timestamp, rider_id),
+                             self.reference_algo.report_rider_pickup(timestamp, rider_id))
+
+    def report_rider_dropoff(self, timestamp, rider_id):
+        return self._compare("report_rider_dropoff", super().report_rider_dropoff(timestamp, rider_id),
+                             self.reference_algo.report_rider_dropoff(timestamp, rider_id))
+
+    # The reference algos handle batches one rider at a time (see BaseAlgoInterface)
+
+    def register_rider_sources(self, rider_sources):
+        return self._compare("register_rider_sources", super().register_rider_sources(rider_sources),
+                             self.reference_algo.register_rider_sources(rider_sources))
+
+    def report_rider_pickups(self, timestamp, elevator_location, rider_destinations):
+        # The reference goes first - the algo's heartbeats during the batch are passed on to the reference too
+        reference_tasks = self.reference_algo.report_rider_pickups(timestamp, elevator_location, rider_destinations)
+        return self._compare("report_rider_pickups",
+                             super().report_rider_pickups(timestamp, elevator_location, rider_destinations),
+                             reference_tasks)
+
+    def report_rider_dropoffs(self, timestamp, rider_ids):
+        return self._compare("report_rider_dropoffs", super().report_rider_dropoffs(timestamp, rider_ids),
+                             self.reference_algo.report_rider_dropoffs(timestamp, rider_ids))
+
+
+class DifferentialNaiveKnuthElevatorAlgo(DifferentialAlgoMixin, naive_knuth_elevator.KnuthElevatorAlgo):
+    REFERENCE_ALGO_CLASS = ReferenceNaiveKnuthElevatorAlgo
+
+
+class DifferentialUpDownKnuthElevatorAlgo(DifferentialAlgoMixin, up_down_knuth_elevator.KnuthElevatorAlgo):
+    REFERENCE_ALGO_CLASS = ReferenceUpDownKnuthElevatorAlgo
+
+
+class KnuthElevatorDifferentialTest(unittest.TestCase):
+    def _run_all_algos(self, simulation_filename):
+        for algo_class in DIFFERENTIAL_ALGO_CLASSES:
+            with self.subTest(algo_class=algo_class, simulation_filename=simulation_filename):
+                SimulationRunner(simulation_filename, algo_class, ELEVATOR_CONFIGURATION_FILE).run_simulation()
+                # Cars of a bank are also reported locations between floors
+                ElevatorBankSimulationRunner(simulation_filename, algo_class, NEAREST_CAR_DISPATCHER_CLASS, 3,
+                                             ELEVATOR_CONFIGURATION_FILE).run_simulation()
+
+    def test_bundled_scenarios(self):
+        for simulation_filename in SIMULATION_FILENAMES:
+            self._run_all_algos(simulation_filename)
+
+    def test_random_scenarios(self):
+        # Busy scenarios with many riders on the same floors, including floor 0
+        rand = random.Random(RANDOM_SCENARIOS_SEED)
+        with tempfile.TemporaryDirectory() as directory:
+            for i in range(RANDOM_SCENARIOS_COUNT):
+                simulation_filename = os.path.join(directory, 'random_{}.csv'.format(i))
+                with open(simulation_filename, 'w') as f:
+                    f.write("timestamp,source_floor,destination_floor\n")
+                    timestamp = 0
+                    for _ in range(60):
+                        timestamp += rand.choice([0, 0, 1, 4, 10])
+                        source_floor, destination_floor = rand.sample(range(0, 8), 2)
+                        f.write("{},{},{}\n".format(timestamp, source_floor, destination_floor))
+
+                self._run_all_algos(simulation_filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import array
+import base64
+import collections
 import enum
+import glob
 import json
-import statistics
+import os
 import numpy as np
 
 
@@ -11,126 +15,340 @@ class EventType(enum.Enum):
     FLOOR_PASSED = 3
 
 
-class NpEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        else:
-            return super(NpEncoder, self).default(obj)
+# Where visualize.html loads the visualization data from - data.js holds the keyframes index, and the events are
+# split into windows, a data_<window index>.js file each
+VISUALIZATION_DATA_DIRECTORY = 'monitoring/visualize'
+VISUALIZATION_DATA_FILENAME = 'data.js'
+VISUALIZATION_WINDOW_FILENAME_FORMAT = 'data_{}.js'
+# A keyframe (a snapshot of the state) is kept every VISUALIZATION_KEYFRAME_EVENTS events, and every window file holds
+# the events of VISUALIZATION_WINDOW_KEYFRAMES keyframes
+VISUALIZATION_KEYFRAME_EVENTS = 256
+VISUALIZATION_WINDOW_KEYFRAMES = 32
+# Visualization data column -> its (little endian) dtype, visualize.js decodes every column into a matching typed array
+VISUALIZATION_COLUMN_DTYPES = dict(ts='<f8', event_floor='<f8', elevator_floor='<f8', event_type='i1', rider='<i4')
+# Percentiles reported for the wait, ride and total times of the riders (the median is always reported)
+STATS_PERCENTILES = [90, 95, 99]
+DURATION_METRIC_NAMES = ["wait_time", "ride_time", "time_to_destination"]
+# Percentiles reported for the algo decision latency
+DECISION_LATENCY_PERCENTILES = [50, 99]
+
+
+def _as_int_if_whole(value):
+    return int(value) if value.is_integer() else float(value)
+
+
+def _get_queue_depth_buckets(queue_depths):
+    '''
+    Returns the power of 2 bucket of every queue depth (0, 1, 2, 4, 8...) - its lower bound
+    '''
+    queue_depths = np.asarray(queue_depths, dtype=np.int64)
+    buckets = np.left_shift(1, np.floor(np.log2(np.maximum(queue_depths, 1))).astype(np.int64))
+    return np.where(queue_depths > 0, buckets, 0)
+
+
+def get_queue_depth_bucket(queue_depth):
+    '''
+    Returns the bucket of a single queue depth (see _get_queue_depth_buckets)
+    '''
+    return int(_get_queue_depth_buckets([queue_depth])[0])
+
+
+def _encode_column(values, dtype):
+    '''
+    Returns the values as a visualization data column - a typed array of the given dtype, encoded in base64
+    '''
+    return dict(dtype=np.dtype(dtype).name,
+                base64=base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii'))
 
 
 class PerformanceMonitor(object):
-    def __init__(self, floor_count):
-        self.rider_to_events_map = {}
-        self.events_log = []
+    '''
+    Rider events are kept in a columnar log (a typed array per field), and every rider's request, pickup and dropoff
+    timestamps are kept in per-rider columns indexed by rider id, so stats are computed without searching or sorting
+    the events.
+    '''
+    def __init__(self, floor_count, riders_count=0):
+        '''
+        riders_count - expected number of riders (rider ids are 0..riders_count-1), the per-rider columns are
+        preallocated for them and grow if needed
+        '''
         self.floor_count = floor_count
+        # Rider events log columns, in the order in which the events were reported
+        self.event_rider_ids = array.array('q')
+        self.event_types = array.array('b')
+        self.event_timestamps = array.array('d')
+        self.event_locations = array.array('d')
+        self.event_elevator_locations = array.array('d')
+        self.event_car_ids = array.array('q')
+        # Per rider columns (NaN / -1 until the event happens)
+        self.rider_request_ts = np.full(riders_count, np.nan)
+        self.rider_pickup_ts = np.full(riders_count, np.nan)
+        self.rider_dropoff_ts = np.full(riders_count, np.nan)
+        self.rider_car_ids = np.full(riders_count, -1, dtype=np.int64)
+        # Per-car state, for elevator banks (a single elevator is always car 0)
+        self.car_to_last_floor_passed_ts = {}
+        self.car_to_floors_passed_count = {}
+        # (car_id, floor arrival log) - floor passed events are only created from these when visualizing
+        self.floor_arrival_logs = []
+        # Every algo decision's latency, and the number of riders queued in the car when it was made
+        self.decision_latencies_ns = array.array('q')
+        self.decision_queue_depths = array.array('q')
+
+    def _ensure_rider_capacity(self, rider_id):
+        capacity = len(self.rider_request_ts)
+        if rider_id < capacity:
+            return
+
+        new_capacity = max(rider_id + 1, 2 * capacity)
+        for column_name in ["rider_request_ts", "rider_pickup_ts", "rider_dropoff_ts", "rider_car_ids"]:
+            column = getattr(self, column_name)
+            new_column = np.full(new_capacity, -1 if column.dtype == np.int64 else np.nan, dtype=column.dtype)
+            new_column[:capacity] = column
+            setattr(self, column_name, new_column)
+
+    def _add_rider_event(self, timestamp, rider_id, event_type, event_location, elevator_location, car_id):
+        self.event_rider_ids.append(rider_id)
+        self.event_types.append(event_type.value)
+        self.event_timestamps.append(timestamp)
+        self.event_locations.append(event_location)
+        self.event_elevator_locations.append(elevator_location)
+        self.event_car_ids.append(car_id)
+
+    def rider_request(self, timestamp, rider_id, pickup_location, dropoff_location, elevator_location, car_id=0):
+        self._add_rider_event(timestamp, rider_id, EventType.REQUEST, pickup_location, elevator_location, car_id)
+        self._ensure_rider_capacity(rider_id)
+        self.rider_request_ts[rider_id] = timestamp
+        self.rider_car_ids[rider_id] = car_id
+
+    def rider_pickup(self, timestamp, rider_id, location, car_id=0):
+        self._add_rider_event(timestamp, rider_id, EventType.PICKUP, location, location, car_id)
+        self.rider_pickup_ts[rider_id] = timestamp
+
+    def rider_dropoff(self, timestamp, rider_id, location, car_id=0):
+        self._add_rider_event(timestamp, rider_id, EventType.DROPOFF, location, location, car_id)
+        self.rider_dropoff_ts[rider_id] = timestamp
+
+    def record_decision(self, latency_ns, queue_depth, car_id=0):
+        '''
+        latency_ns - the time it took the car's algo to decide on its next tasks (see ElevatorCar)
+        queue_depth - the number of riders queued in the car (assigned and not yet dropped off) at the time
+        '''
+        self.decision_latencies_ns.append(latency_ns)
+        self.decision_queue_depths.append(queue_depth)
+
+    def get_requested_rider_ids(self):
+        return np.flatnonzero(~np.isnan(self.rider_request_ts))
+
+    def floors_visited(self, floor_arrival_log, car_id=0):
+        '''
+        floor_arrival_log - the car's FloorArrivalLog, (timestamp, floor) pairs in timestamp order
+        '''
+        self.floor_arrival_logs.append((car_id, floor_arrival_log))
+        if len(floor_arrival_log):
+            self.car_to_last_floor_passed_ts[car_id] = floor_arrival_log.last_timestamp()
+
+        self.car_to_floors_passed_count[car_id] = \
+            self.car_to_floors_passed_count.get(car_id, 0) + len(floor_arrival_log)
+
+    def _get_events_columns(self):
+        '''
+        Returns visualization data column name -> values, for the rider events followed by the floor passed events of
+        every car (floor passed events have a rider of -1)
+        '''
+        columns = collections.defaultdict(list)
+        columns["ts"].append(np.frombuffer(self.event_timestamps, dtype=np.float64))
+        columns["event_floor"].append(np.frombuffer(self.event_locations, dtype=np.float64))
+        columns["elevator_floor"].append(np.frombuffer(self.event_elevator_locations, dtype=np.float64))
+        columns["event_type"].append(np.frombuffer(self.event_types, dtype=np.int8))
+        columns["rider"].append(np.frombuffer(self.event_rider_ids, dtype=np.int64))
+        for _, floor_arrival_log in self.floor_arrival_logs:
+            floors = np.frombuffer(floor_arrival_log.floors, dtype=np.int64)
+            columns["ts"].append(np.frombuffer(floor_arrival_log.timestamps, dtype=np.float64))
+            columns["event_floor"].append(floors)
+            columns["elevator_floor"].append(floors)
+            columns["event_type"].append(np.full(len(floors), EventType.FLOOR_PASSED.value, dtype=np.int8))
+            columns["rider"].append(np.full(len(floors), -1, dtype=np.int64))
+
+        return {column_name: np.concatenate(column_parts) for column_name, column_parts in columns.items()}
 
-    class Event(object):
-        def __init__(self, rider_id, event_type, timestamp, event_location, elevator_location):
-            self.rider_id = rider_id
-            self.event_type = event_type
-            self.timestamp = timestamp
-            self.event_location = event_location
-            self.elevator_location = elevator_location
-
-    def _sort_events(self):
-        self.events_log = sorted(self.events_log, key=lambda x: x.timestamp)
-
-    def _add_rider_event(self, timestamp, rider_id, event_type, event_location, elevator_location):
-        if rider_id not in self.rider_to_events_map:
-            self.rider_to_events_map[rider_id] = []
-
-        event = PerformanceMonitor.Event(rider_id, event_type, timestamp, event_location, elevator_location)
-        self.rider_to_events_map[rider_id].append(event)
-        self.events_log.append(event)
-
-    def rider_request(self, timestamp, rider_id, pickup_location, dropoff_location, elevator_location):
-        self._add_rider_event(timestamp, rider_id, EventType.REQUEST, pickup_location, elevator_location)
-
-    def rider_pickup(self, timestamp, rider_id, location):
-        self._add_rider_event(timestamp, rider_id, EventType.PICKUP, location, location)
-
-    def rider_dropoff(self, timestamp, rider_id, location):
-        self._add_rider_event(timestamp, rider_id, EventType.DROPOFF, location, location)
-
-    def floors_visited(self, ts_to_floor_mapping):
-        for ts, floor in ts_to_floor_mapping.items():
-            event = PerformanceMonitor.Event(rider_id=None,
-                                             event_type=EventType.FLOOR_PASSED,
-                                             timestamp=ts,
-                                             event_location=floor,
-                                             elevator_location=floor)
-            self.events_log.append(event)
-
-    def write_visualization_data_file(self):
-        self._sort_events()
-        data = dict(floors=self.floor_count, initial_floor=1, events=[])
-
-        for e in self.events_log:
-            print("TS: {:>7} ; Elevator Floor: {:>4} Event Floor {} ; {} rider {}".format(e.timestamp,
-                                                                                          e.elevator_location,
-                                                                                          e.event_location,
-                                                                                          e.event_type,
-                                                                                          e.rider_id))
-            data["events"].append(dict(ts=e.timestamp, event_floor=e.event_location, elevator_floor=e.elevator_location,
-                                       event_type=e.event_type.name, rider=e.rider_id))
-
-        with open('monitoring/visualize/data.js', 'w') as outfile:
-            # UGLINESS AHEAD - I need to put the json data in a .js file, so I do some string modification
-            text = json.dumps(data, cls=NpEncoder, indent=2)
-            text = "data = " + text
-            outfile.write(text)
+    @staticmethod
+    def _print_events(columns, order):
+        for i in order:
+            rider_id = columns["rider"][i]
+            print("TS: {:>7} ; Elevator Floor: {:>4} Event Floor {} ; {} rider {}".format(
+                columns["ts"][i], _as_int_if_whole(columns["elevator_floor"][i]),
+                _as_int_if_whole(columns["event_floor"][i]), EventType(columns["event_type"][i]),
+                rider_id if rider_id >= 0 else None))
+
+    def _get_keyframes(self, columns, order, initial_floor):
+        '''
+        Returns the keyframes columns - the state right before the first event of every keyframe: the elevator
+        location, the riders in the elevator and the riders waiting on every floor (a row of floor_count + 1 counts
+        per keyframe, flattened)
+        '''
+        keyframe_starts = np.arange(0, len(order), VISUALIZATION_KEYFRAME_EVENTS)
+        event_types = columns["event_type"][order]
+        is_request = event_types == EventType.REQUEST.value
+        is_pickup = event_types == EventType.PICKUP.value
+        is_dropoff = event_types == EventType.DROPOFF.value
+
+        riders_in_elevator = np.concatenate([[0], np.cumsum(is_pickup.astype(np.int64) - is_dropoff)])
+        elevator_floors = np.concatenate([[initial_floor], columns["elevator_floor"][order]])
+
+        # Waiting riders changes per (keyframe, floor), summed up to the end of every keyframe
+        waiting_riders_changes = np.zeros((len(keyframe_starts), self.floor_count + 1), dtype=np.int64)
+        changed = np.flatnonzero(is_request | is_pickup)
+        np.add.at(waiting_riders_changes,
+                  (changed // VISUALIZATION_KEYFRAME_EVENTS, columns["event_floor"][order[changed]].astype(np.int64)),
+                  np.where(is_request[changed], 1, -1))
+        waiting_riders = np.cumsum(waiting_riders_changes, axis=0) - waiting_riders_changes
+
+        return dict(ts=_encode_column(columns["ts"][order[keyframe_starts]], '<f8'),
+                    elevator_floor=_encode_column(elevator_floors[keyframe_starts], '<f8'),
+                    elevator_riders=_encode_column(riders_in_elevator[keyframe_starts], '<i4'),
+                    waiting_riders=_encode_column(waiting_riders.ravel(), '<i4'))
+
+    def write_visualization_data_file(self, directory=VISUALIZATION_DATA_DIRECTORY, print_events=False):
+        '''
+        Writes the events in timestamp order for visualize.js, as a typed array per column encoded in base64 (see
+        VISUALIZATION_COLUMN_DTYPES). Events are written window by window, a file each, so the visualizer only loads
+        the windows it shows, and data.js holds the keyframes for seeking to any timestamp.
+        print_events - also print every event (for debugging)
+        '''
+        columns = self._get_events_columns()
+        # A stable sort keeps rider events before floor passed events with the same timestamp
+        order = np.argsort(columns["ts"], kind='stable')
+        if print_events:
+            self._print_events(columns, order)
+
+        # Windows of a previous (longer) simulation must not be loaded
+        stale_window_filenames = glob.glob(os.path.join(directory, VISUALIZATION_WINDOW_FILENAME_FORMAT.format('*')))
+        for stale_window_filename in stale_window_filenames:
+            os.remove(stale_window_filename)
+
+        window_events = VISUALIZATION_KEYFRAME_EVENTS * VISUALIZATION_WINDOW_KEYFRAMES
+        for window_index, window_start in enumerate(range(0, len(order), window_events)):
+            window_order = order[window_start:window_start + window_events]
+            window_columns = {column_name: _encode_column(columns[column_name][window_order], dtype)
+                              for column_name, dtype in VISUALIZATION_COLUMN_DTYPES.items()}
+            window_filename = os.path.join(directory, VISUALIZATION_WINDOW_FILENAME_FORMAT.format(window_index))
+            with open(window_filename, 'w') as outfile:
+                outfile.write("load_data_window({}, {});\n".format(window_index, json.dumps(window_columns)))
+
+        initial_floor = 1
+        data = dict(floors=int(self.floor_count), initial_floor=initial_floor, events_count=len(order),
+                    event_types=[event_type.name for event_type in EventType],
+                    window_filename_format=VISUALIZATION_WINDOW_FILENAME_FORMAT,
+                    keyframe_events=VISUALIZATION_KEYFRAME_EVENTS, window_keyframes=VISUALIZATION_WINDOW_KEYFRAMES,
+                    keyframes=self._get_keyframes(columns, order, initial_floor))
+        with open(os.path.join(directory, VISUALIZATION_DATA_FILENAME), 'w') as outfile:
+            # The data is loaded by <script> tags (so the visualizer also works straight from the file system)
+            outfile.write("data = {};\n".format(json.dumps(data)))
+
+    def get_rider_durations(self):
+        '''
+        Returns a (3, riders) array - the wait, ride and total (time to destination) durations of every rider
+        '''
+        rider_ids = self.get_requested_rider_ids()
+        request_ts = self.rider_request_ts[rider_ids]
+        pickup_ts = self.rider_pickup_ts[rider_ids]
+        dropoff_ts = self.rider_dropoff_ts[rider_ids]
+        return np.stack([pickup_ts - request_ts, dropoff_ts - pickup_ts, dropoff_ts - request_ts])
+
+    def get_time_to_complete_all_tasks(self):
+        # With several cars, all tasks are complete once the last car is done
+        if self.car_to_last_floor_passed_ts:
+            return max(self.car_to_last_floor_passed_ts.values())
+
+        # Events are not logged in timestamp order, so the last one isn't necessarily the latest
+        return max(self.event_timestamps)
 
     def calculate_performace_stats(self):
-        wait_times = []
-        ride_times = []
-        times_to_destination = []
-        for rider_id, events in self.rider_to_events_map.items():
-            request = [a for a in events if a.event_type == EventType.REQUEST][0]
-            pickup = [a for a in events if a.event_type == EventType.PICKUP][0]
-            dropoff = [a for a in events if a.event_type == EventType.DROPOFF][0]
-
-            wait_times.append(pickup.timestamp - request.timestamp)
-            ride_times.append(dropoff.timestamp - pickup.timestamp)
-            times_to_destination.append(dropoff.timestamp - request.timestamp)
-
-        time_to_complete_all_tasks = self.events_log[-1].timestamp
-
-        total_wait_time = sum(wait_times)
-        mean_wait_time = statistics.mean(wait_times)
-        median_wait_time = statistics.median(wait_times)
-
-        total_ride_time = sum(ride_times)
-        mean_ride_time = statistics.mean(ride_times)
-        median_ride_time = statistics.median(ride_times)
-
-        total_time_to_destination = sum(times_to_destination)
-        mean_time_to_destination = statistics.mean(times_to_destination)
-        median_time_to_destination = statistics.median(times_to_destination)
-
-        return dict(
-            time_to_complete_all_tasks=time_to_complete_all_tasks,
-            total_wait_time=total_wait_time,
-            mean_wait_time=mean_wait_time,
-            median_wait_time=median_wait_time,
-            total_ride_time=total_ride_time,
-            mean_ride_time=mean_ride_time,
-            median_ride_time=median_ride_time,
-            total_time_to_destination=total_time_to_destination,
-            mean_time_to_destination=mean_time_to_destination,
-            median_time_to_destination=median_time_to_destination
-        )
+        '''
+        Stats of the wait, ride and total times of all the riders - total, mean, median (the 50th percentile),
+        the STATS_PERCENTILES percentiles and max. Computed in a single vectorized pass over the per-rider columns.
+        '''
+        durations = self.get_rider_durations()
+        totals = durations.sum(axis=1)
+        means = durations.mean(axis=1)
+        medians = np.median(durations, axis=1)
+        percentiles = np.percentile(durations, STATS_PERCENTILES, axis=1)
+        maxes = durations.max(axis=1)
+
+        stats = dict(time_to_complete_all_tasks=self.get_time_to_complete_all_tasks())
+        for i, metric_name in enumerate(DURATION_METRIC_NAMES):
+            stats["total_" + metric_name] = float(totals[i])
+            stats["mean_" + metric_name] = float(means[i])
+            stats["median_" + metric_name] = float(medians[i])
+            for percentile, percentile_values in zip(STATS_PERCENTILES, percentiles):
+                stats["p{}_{}".format(percentile, metric_name)] = float(percentile_values[i])
+            stats["max_" + metric_name] = float(maxes[i])
+
+        stats.update(self.calculate_decision_latency_stats())
+        return stats
+
+    def calculate_decision_latency_stats(self):
+        '''
+        Stats of the algo decision latency (in us) - mean, the DECISION_LATENCY_PERCENTILES percentiles and max, and
+        the mean queue depth of the decisions
+        '''
+        latencies_us = np.frombuffer(self.decision_latencies_ns, dtype=np.int64) / 1000
+        if not len(latencies_us):
+            latencies_us = np.array([np.nan])
+
+        stats = dict(mean_decision_latency_us=float(latencies_us.mean()))
+        for percentile, value in zip(DECISION_LATENCY_PERCENTILES,
+                                     np.percentile(latencies_us, DECISION_LATENCY_PERCENTILES)):
+            stats["p{}_decision_latency_us".format(percentile)] = float(value)
+        stats["max_decision_latency_us"] = float(latencies_us.max())
+        stats["mean_decision_queue_depth"] = float(np.mean(self.decision_queue_depths)) \
+            if self.decision_queue_depths else float('nan')
+
+        return stats
+
+    def calculate_decision_latency_by_queue_depth(self):
+        '''
+        Returns queue depth bucket (0, 1, 2, 4, 8... - its lower bound) -> decisions count and the
+        DECISION_LATENCY_PERCENTILES percentiles of their latency (in us), to see how the latency grows with the queue
+        '''
+        latencies_us = np.frombuffer(self.decision_latencies_ns, dtype=np.int64) / 1000
+        buckets = _get_queue_depth_buckets(self.decision_queue_depths)
+        stats = {}
+        for bucket in np.unique(buckets).tolist():
+            bucket_latencies_us = latencies_us[buckets == bucket]
+            stats[bucket] = dict(decisions=len(bucket_latencies_us))
+            for percentile, value in zip(DECISION_LATENCY_PERCENTILES,
+                                         np.percentile(bucket_latencies_us, DECISION_LATENCY_PERCENTILES)):
+                stats[bucket]["p{}_decision_latency_us".format(percentile)] = float(value)
+
+        return stats
+
+    def calculate_car_performance_stats(self):
+        '''
+        Returns car_id -> stats of that car (riders served, floors passed, time to complete its tasks)
+        '''
+        served_rider_ids = np.flatnonzero(~np.isnan(self.rider_dropoff_ts))
+        car_to_riders_served = collections.Counter(self.rider_car_ids[served_rider_ids].tolist())
+
+        return {car_id: dict(riders_served=car_to_riders_served.get(car_id, 0),
+                             floors_passed=self.car_to_floors_passed_count[car_id],
+                             time_to_complete_all_tasks=self.car_to_last_floor_passed_ts[car_id])
+                for car_id in sorted(self.car_to_last_floor_passed_ts)}
 
     def print_performance_stats(self):
         stats_dict = self.calculate_performace_stats()
 
         print("Time to complete all tasks - {}".format(stats_dict["time_to_complete_all_tasks"]))
-        print("Wait time - total: {:>7} avg: {}".format(stats_dict["total_wait_time"], stats_dict["mean_wait_time"]))
-        print("Ride time - total: {:>7} avg: {}".format(stats_dict["total_ride_time"], stats_dict["mean_ride_time"]))
-        print("Rider time to destination - total: {:>7} avg: {}".format(stats_dict["total_time_to_destination"],
-                                                                        stats_dict["mean_time_to_destination"]))
+        print("Wait time - total: {:>7} avg: {} p99: {}".format(stats_dict["total_wait_time"],
+                                                              stats_dict["mean_wait_time"],
+                                                              stats_dict["p99_wait_time"]))
+        print("Ride time - total: {:>7} avg: {} p99: {}".format(stats_dict["total_ride_time"],
+                                                              stats_dict["mean_ride_time"],
+                                                              stats_dict["p99_ride_time"]))
+        print("Rider time to destination - total: {:>7} avg: {} p99: {}".format(
+            stats_dict["total_time_to_destination"], stats_dict["mean_time_to_destination"],
+            stats_dict["p99_time_to_destination"]))
+        print("Decision latency [us] - avg: {:.1f} p50: {:.1f} p99: {:.1f}".format(
+            stats_dict["mean_decision_latency_us"], stats_dict["p50_decision_latency_us"],
+            stats_dict["p99_decision_latency_us"]))
 
@@ -0,0 +1,97 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from monitoring.performance_monitor import PerformanceMonitor, VISUALIZATION_KEYFRAME_EVENTS
+
+
+class PerformanceMonitorTest(unittest.TestCase):
+    @staticmethod
+    def _get_monitor(wait_times):
+        '''
+        Every rider waits the given time and then rides for 10, riders are reported in reverse timestamp order
+        '''
+        performance_monitor = PerformanceMonitor(floor_count=10)
+        for rider_id, wait_time in reversed(list(enumerate(wait_times))):
+            request_ts = 100 * rider_id
+            performance_monitor.rider_request(request_ts, rider_id, 1, 2, 1)
+            performance_monitor.rider_pickup(request_ts + wait_time, rider_id, 1)
+            performance_monitor.rider_dropoff(request_ts + wait_time + 10, rider_id, 2)
+
+        return performance_monitor
+
+    def test_stats(self):
+        stats = self._get_monitor(list(range(1, 101))).calculate_performace_stats()
+        self.assertEqual(stats["total_wait_time"], 5050)
+        self.assertEqual(stats["mean_wait_time"], 50.5)
+        self.assertEqual(stats["median_wait_time"], 50.5)
+        self.assertAlmostEqual(stats["p90_wait_time"], 90.1)
+        self.assertAlmostEqual(stats["p99_wait_time"], 99.01)
+        self.assertEqual(stats["max_wait_time"], 100)
+        self.assertEqual(stats["p95_ride_time"], 10)
+        self.assertEqual(stats["max_time_to_destination"], 110)
+
+    def test_decision_latency_stats(self):
+        performance_monitor = self._get_monitor([1])
+        self.assertTrue(np.isnan(performance_monitor.calculate_performace_stats()["p99_decision_latency_us"]))
+        for queue_depth, latency_ns in [(0, 1000), (1, 2000), (2, 3000), (3, 5000), (5, 9000)]:
+            performance_monitor.record_decision(latency_ns, queue_depth)
+
+        stats = performance_monitor.calculate_performace_stats()
+        self.assertEqual(stats["mean_decision_latency_us"], 4)
+        self.assertEqual(stats["p50_decision_latency_us"], 3)
+        self.assertEqual(stats["max_decision_latency_us"], 9)
+        self.assertEqual(stats["mean_decision_queue_depth"], 2.2)
+        by_queue_depth = performance_monitor.calculate_decision_latency_by_queue_depth()
+        self.assertEqual(list(by_queue_depth), [0, 1, 2, 4])
+        self.assertEqual(by_queue_depth[2]["decisions"], 2)
+        self.assertEqual(by_queue_depth[2]["p50_decision_latency_us"], 4)
+
+    def test_time_to_complete_unsorted_events(self):
+        # The first rider is reported last, but it's not the last event in time
+        stats = self._get_monitor([5, 1]).calculate_performace_stats()
+        self.assertEqual(stats["time_to_complete_all_tasks"], 111)
+
+    @staticmethod
+    def _decode_columns(encoded_columns):
+        return {column_name: np.frombuffer(base64.b64decode(column["base64"]), dtype=column["dtype"])
+                for column_name, column in encoded_columns.items()}
+
+    def test_visualization_data_file(self):
+        performance_monitor = self._get_monitor([5, 1])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            performance_monitor.write_visualization_data_file(temp_dir)
+            with open(os.path.join(temp_dir, 'data.js')) as f:
+                data = json.loads(f.read()[len("data = "):].rstrip().rstrip(";"))
+            with open(os.path.join(temp_dir, 'data_0.js')) as f:
+                window_data = f.read()
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'data_1.js')))
+
+        self.assertEqual(data["events_count"], 6)
+        columns = self._decode_columns(json.loads(window_data[len("load_data_window(0, "):].rstrip().rstrip(");")))
+        # Events are written in timestamp order
+        self.assertEqual(list(columns["ts"]), [0, 5, 15, 100, 101, 111])
+        self.assertEqual([data["event_types"][event_type] for event_type in columns["event_type"][:3]],
+                         ["REQUEST", "PICKUP", "DROPOFF"])
+        self.assertEqual(list(columns["rider"]), [0, 0, 0, 1, 1, 1])
+
+    def test_visualization_keyframes(self):
+        performance_monitor = PerformanceMonitor(floor_count=3)
+        for rider_id in range(VISUALIZATION_KEYFRAME_EVENTS):
+            performance_monitor.rider_request(rider_id, rider_id, 2, 3, 1)
+        performance_monitor.rider_pickup(VISUALIZATION_KEYFRAME_EVENTS, 0, 2)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            performance_monitor.write_visualization_data_file(temp_dir)
+            with open(os.path.join(temp_dir, 'data.js')) as f:
+                data = json.loads(f.read()[len("data = "):].rstrip().rstrip(";"))
+
+        keyframes = self._decode_columns(data["keyframes"])
+        self.assertEqual(list(keyframes["ts"]), [0, VISUALIZATION_KEYFRAME_EVENTS])
+        # The second keyframe starts right before the pickup, after all the requests
+        self.assertEqual(list(keyframes["elevator_riders"]), [0, 0])
+        self.assertEqual(keyframes["waiting_riders"].reshape(2, 4)[:, 2].tolist(), [0, VISUALIZATION_KEYFRAME_EVENTS])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import array
+import collections
+import time
+import numpy as np
+
+# Percentiles of the call durations reported for every phase
+PROFILE_PERCENTILES = [50, 99]
+
+
+class PhaseProfiler(object):
+    '''
+    Records the call count and wall time (perf_counter_ns) of every profiled phase - a function or method wrapped by
+    wrap() / instrument(). Instrumenting replaces the profiled methods on the instances themselves, so nothing is
+    timed (and nothing costs anything) unless a profiler is attached.
+
+    Phases may be nested (e.g. an algo callback called from a scheduler event handler), every phase's self time (its
+    time minus its profiled children's) is kept per call stack, for exporting a flame graph.
+    Note - algos may return their tasks lazily, the time spent generating them is counted where they are consumed.
+    '''
+    def __init__(self):
+        self.phase_durations = collections.defaultdict(lambda: array.array('q'))
+        # Call stack (tuple of phase names) -> self time in ns
+        self.stack_self_ns = collections.Counter()
+        self._stack = []
+        # Time spent in the profiled children of every phase on the stack
+        self._children_ns = []
+
+    def wrap(self, phase_name, function):
+        '''
+        Returns a function that calls the given function, and records its call as a call of the given phase
+        '''
+        def profiled_function(*args, **kwargs):
+            self._stack.append(phase_name)
+            self._children_ns.append(0)
+            start_ns = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration_ns = time.perf_counter_ns() - start_ns
+                self.stack_self_ns[tuple(self._stack)] += duration_ns - self._children_ns.pop()
+                self._stack.pop()
+                if self._children_ns:
+                    self._children_ns[-1] += duration_ns
+                self.phase_durations[phase_name].append(duration_ns)
+
+        return profiled_function
+
+    def instrument(self, obj, method_names, prefix):
+        '''
+        Profiles the given methods of the object (only this instance), as phases named <prefix>.<method name>
+        '''
+        for method_name in method_names:
+            setattr(obj, method_name, self.wrap("{}.{}".format(prefix, method_name), getattr(obj, method_name)))
+
+    def get_stats(self):
+        '''
+        Returns phase -> call count, total time in ms, mean and percentiles of the call time in us
+        '''
+        stats = {}
+        for phase_name, durations_ns in self.phase_durations.items():
+            durations_us = np.frombuffer(durations_ns, dtype=np.int64) / 1000
+            phase_stats = dict(calls=len(durations_us), total_ms=float(durations_us.sum() / 1000),
+                               mean_us=float(durations_us.mean()))
+            for percentile, value in zip(PROFILE_PERCENTILES, np.percentile(durations_us, PROFILE_PERCENTILES)):
+                phase_stats["p{}_us".format(percentile)] = float(value)
+            stats[phase_name] = phase_stats
+
+        return stats
+
+    def write_folded_stacks(self, filename):
+        '''
+        Writes the self time (in ns) of every call stack in the folded stacks format ("outer;inner;phase time"),
+        which flamegraph.pl, speedscope (https://www.speedscope.app) and inferno render as a flame graph
+        '''
+        with open(filename, 'w') as f:
+            for stack, self_ns in sorted(self.stack_self_ns.items()):
+                f.write("{} {}\n".format(";".join(stack), self_ns))
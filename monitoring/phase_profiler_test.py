@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from monitoring.phase_profiler import PhaseProfiler
+
+
+class PhaseProfilerTest(unittest.TestCase):
+    def test_nested_phases(self):
+        class Component(object):
+            def inner(self):
+                return 1
+
+            def outer(self):
+                return self.inner() + self.inner()
+
+        profiler = PhaseProfiler()
+        component = Component()
+        profiler.instrument(component, ['inner', 'outer'], 'component')
+        self.assertEqual(component.outer(), 2)
+        component.inner()
+
+        stats = profiler.get_stats()
+        self.assertEqual(stats['component.outer']['calls'], 1)
+        self.assertEqual(stats['component.inner']['calls'], 3)
+        self.assertEqual(set(profiler.stack_self_ns), {('component.outer',), ('component.inner',),
+                                                       ('component.outer', 'component.inner')})
+        # The self times of all the stacks add up to the total time of the outermost phases
+        total_ns = sum(profiler.phase_durations['component.outer']) + profiler.phase_durations['component.inner'][-1]
+        self.assertEqual(sum(profiler.stack_self_ns.values()), total_ns)
+        # Other instances aren't profiled
+        Component().outer()
+        self.assertEqual(profiler.get_stats()['component.outer']['calls'], 1)
+
+    def test_folded_stacks(self):
+        profiler = PhaseProfiler()
+        profiler.wrap('outer', profiler.wrap('inner', lambda: None))()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'profile.folded')
+            profiler.write_folded_stacks(filename)
+            with open(filename) as f:
+                stacks = [line.rsplit(' ', 1)[0] for line in f.read().splitlines()]
+
+        self.assertEqual(stacks, ['outer', 'outer;inner'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import collections
+import math
+from monitoring.performance_monitor import DECISION_LATENCY_PERCENTILES, DURATION_METRIC_NAMES, STATS_PERCENTILES, \
+    get_queue_depth_bucket
+
+# Relative accuracy of the quantile sketches - every reported median/percentile is within this relative error of the
+# exact (numpy, linearly interpolated) percentile of the same riders
+QUANTILE_SKETCH_RELATIVE_ACCURACY = 0.01
+
+
+class QuantileSketch(object):
+    '''
+    A streaming quantile sketch of non-negative values, with log-sized buckets (the DDSketch scheme).
+    Value x > 0 falls in bucket i = ceil(log_gamma(x)), gamma = (1 + a) / (1 - a), and every bucket is represented by
+    a single value that is within relative error a of all the values in the bucket. Zeros are counted exactly.
+
+    Memory depends only on the range of the values (about log(max / min) / (2 * a) buckets), not on their count.
+    '''
+    def __init__(self, relative_accuracy=QUANTILE_SKETCH_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bucket_counts = collections.Counter()
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value < 0:
+            raise Exception("QuantileSketch only supports non-negative values, got {}".format(value))
+
+        if value == 0:
+            self.zero_count += 1
+        else:
+            self.bucket_counts[math.ceil(math.log(value) / self.log_gamma)] += 1
+
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def _get_bucket_value(self, bucket_index):
+        return 2 * self.gamma ** bucket_index / (self.gamma + 1)
+
+    def _get_values_at_ranks(self, ranks):
+        '''
+        Returns the estimated value of the element at every rank (0-based, in ascending order) of the sorted values
+        '''
+        values = {}
+        pending_ranks = sorted(set(ranks))
+        seen_count = self.zero_count
+        while pending_ranks and pending_ranks[0] < seen_count:
+            values[pending_ranks.pop(0)] = 0
+
+        for bucket_index in sorted(self.bucket_counts):
+            seen_count += self.bucket_counts[bucket_index]
+            while pending_ranks and pending_ranks[0] < seen_count:
+                # Clamping to the exact min/max only makes the estimate closer
+                values[pending_ranks.pop(0)] = min(max(self._get_bucket_value(bucket_index), self.min), self.max)
+
+        return values
+
+    def quantiles(self, qs):
+        '''
+        Returns the estimated quantile (0 <= q <= 1) for every q, interpolated between ranks like numpy's default
+        percentile - so the estimate is within the sketch's relative accuracy of numpy's exact percentile
+        '''
+        if not self.count:
+            raise Exception("QuantileSketch is empty")
+
+        positions = [q * (self.count - 1) for q in qs]
+        values_at_ranks = self._get_values_at_ranks([math.floor(p) for p in positions] +
+                                                    [math.ceil(p) for p in positions])
+        results = []
+        for position in positions:
+            lower_value = values_at_ranks[math.floor(position)]
+            upper_value = values_at_ranks[math.ceil(position)]
+            results.append(lower_value + (position - math.floor(position)) * (upper_value - lower_value))
+
+        return results
+
+
+class StreamingPerformanceMonitor(object):
+    '''
+    A PerformanceMonitor for long runs, which only keeps aggregates instead of the events history - running sums,
+    counts, min/max and a QuantileSketch per rider duration (wait, ride and total time).
+    A rider's state is dropped once it is dropped off, so memory is O(active riders) and not O(all riders).
+
+    Stats have the same keys as PerformanceMonitor's. Totals, means and maxes are exact, medians and percentiles are
+    within QUANTILE_SKETCH_RELATIVE_ACCURACY relative error of the exact ones.
+    Since no events are kept, there is no visualization data.
+    '''
+    def __init__(self, floor_count, riders_count=0):
+        self.floor_count = floor_count
+        # rider_id -> [request ts, pickup ts, car id] of the riders that haven't been dropped off yet
+        self.active_riders = {}
+        self.duration_sketches = {metric_name: QuantileSketch() for metric_name in DURATION_METRIC_NAMES}
+        self.duration_totals = {metric_name: 0 for metric_name in DURATION_METRIC_NAMES}
+        self.max_event_ts = None
+        # Algo decision latencies (in us) - of all decisions, and per queue depth bucket
+        self.decision_latency_sketch = QuantileSketch()
+        self.decision_latency_total_us = 0
+        self.decision_queue_depth_total = 0
+        self.queue_depth_bucket_to_latency_sketch = collections.defaultdict(QuantileSketch)
+        # Per-car state, for elevator banks (a single elevator is always car 0)
+        self.car_to_riders_served = collections.Counter()
+        self.car_to_last_floor_passed_ts = {}
+        self.car_to_floors_passed_count = {}
+
+    def _report_event_ts(self, timestamp):
+        self.max_event_ts = timestamp if self.max_event_ts is None else max(self.max_event_ts, timestamp)
+
+    def rider_request(self, timestamp, rider_id, pickup_location, dropoff_location, elevator_location, car_id=0):
+        self._report_event_ts(timestamp)
+        self.active_riders[rider_id] = [timestamp, None, car_id]
+
+    def rider_pickup(self, timestamp, rider_id, location, car_id=0):
+        self._report_event_ts(timestamp)
+        self.active_riders[rider_id][1] = timestamp
+
+    def rider_dropoff(self, timestamp, rider_id, location, car_id=0):
+        self._report_event_ts(timestamp)
+        request_ts, pickup_ts, rider_car_id = self.active_riders.pop(rider_id)
+        durations = [pickup_ts - request_ts, timestamp - pickup_ts, timestamp - request_ts]
+        for metric_name, duration in zip(DURATION_METRIC_NAMES, durations):
+            self.duration_sketches[metric_name].add(duration)
+            self.duration_totals[metric_name] += duration
+
+        self.car_to_riders_served[rider_car_id] += 1
+
+    def record_decision(self, latency_ns, queue_depth, car_id=0):
+        latency_us = latency_ns / 1000
+        self.decision_latency_sketch.add(latency_us)
+        self.decision_latency_total_us += latency_us
+        self.decision_queue_depth_total += queue_depth
+        self.queue_depth_bucket_to_latency_sketch[get_queue_depth_bucket(queue_depth)].add(latency_us)
+
+    def floors_visited(self, floor_arrival_log, car_id=0):
+        '''
+        floor_arrival_log - the car's FloorArrivalLog, or a FloorArrivalCounter (only its length and last timestamp
+        are used)
+        '''
+        if len(floor_arrival_log):
+            self.car_to_last_floor_passed_ts[car_id] = floor_arrival_log.last_timestamp()
+
+        self.car_to_floors_passed_count[car_id] = \
+            self.car_to_floors_passed_count.get(car_id, 0) + len(floor_arrival_log)
+
+    def get_time_to_complete_all_tasks(self):
+        # With several cars, all tasks are complete once the last car is done
+        if self.car_to_last_floor_passed_ts:
+            return max(self.car_to_last_floor_passed_ts.values())
+
+        return self.max_event_ts
+
+    def write_visualization_data_file(self, *args, **kwargs):
+        raise Exception("Visualization data isn't available in streaming metrics mode, since no events are kept")
+
+    def calculate_performace_stats(self):
+        stats = dict(time_to_complete_all_tasks=self.get_time_to_complete_all_tasks())
+        for metric_name in DURATION_METRIC_NAMES:
+            sketch = self.duration_sketches[metric_name]
+            quantiles = sketch.quantiles([0.5] + [percentile / 100 for percentile in STATS_PERCENTILES])
+
+            stats["total_" + metric_name] = float(self.duration_totals[metric_name])
+            stats["mean_" + metric_name] = float(self.duration_totals[metric_name] / sketch.count)
+            stats["median_" + metric_name] = float(quantiles[0])
+            for percentile, value in zip(STATS_PERCENTILES, quantiles[1:]):
+                stats["p{}_{}".format(percentile, metric_name)] = float(value)
+            stats["max_" + metric_name] = float(sketch.max)
+
+        stats.update(self.calculate_decision_latency_stats())
+        return stats
+
+    @staticmethod
+    def _get_decision_latency_percentiles(sketch):
+        quantiles = sketch.quantiles([percentile / 100 for percentile in DECISION_LATENCY_PERCENTILES])
+        return {"p{}_decision_latency_us".format(percentile): float(value)
+                for percentile, value in zip(DECISION_LATENCY_PERCENTILES, quantiles)}
+
+    def calculate_decision_latency_stats(self):
+        sketch = self.decision_latency_sketch
+        if not sketch.count:
+            stat_names = ["mean_decision_latency_us"] + \
+                ["p{}_decision_latency_us".format(percentile) for percentile in DECISION_LATENCY_PERCENTILES] + \
+                ["max_decision_latency_us", "mean_decision_queue_depth"]
+            return {stat_name: float('nan') for stat_name in stat_names}
+
+        stats = dict(mean_decision_latency_us=float(self.decision_latency_total_us / sketch.count))
+        stats.update(self._get_decision_latency_percentiles(sketch))
+        stats["max_decision_latency_us"] = float(sketch.max)
+        stats["mean_decision_queue_depth"] = float(self.decision_queue_depth_total / sketch.count)
+        return stats
+
+    def calculate_decision_latency_by_queue_depth(self):
+        stats = {}
+        for bucket in sorted(self.queue_depth_bucket_to_latency_sketch):
+            sketch = self.queue_depth_bucket_to_latency_sketch[bucket]
+            stats[bucket] = dict(decisions=sketch.count, **self._get_decision_latency_percentiles(sketch))
+
+        return stats
+
+    def calculate_car_performance_stats(self):
+        '''
+        Returns car_id -> stats of that car (riders served, floors passed, time to complete its tasks)
+        '''
+        return {car_id: dict(riders_served=self.car_to_riders_served.get(car_id, 0),
+                             floors_passed=self.car_to_floors_passed_count[car_id],
+                             time_to_complete_all_tasks=self.car_to_last_floor_passed_ts[car_id])
+                for car_id in sorted(self.car_to_last_floor_passed_ts)}
+
+    def print_performance_stats(self):
+        stats_dict = self.calculate_performace_stats()
+
+        print("Time to complete all tasks - {}".format(stats_dict["time_to_complete_all_tasks"]))
+        print("Wait time - total: {:>7} avg: {} p99: ~{}".format(stats_dict["total_wait_time"],
+                                                               stats_dict["mean_wait_time"],
+                                                               stats_dict["p99_wait_time"]))
+        print("Ride time - total: {:>7} avg: {} p99: ~{}".format(stats_dict["total_ride_time"],
+                                                               stats_dict["mean_ride_time"],
+                                                               stats_dict["p99_ride_time"]))
+        print("Rider time to destination - total: {:>7} avg: {} p99: ~{}".format(
+            stats_dict["total_time_to_destination"], stats_dict["mean_time_to_destination"],
+            stats_dict["p99_time_to_destination"]))
+        print("Decision latency [us] - avg: {:.1f} p50: ~{:.1f} p99: ~{:.1f}".format(
+            stats_dict["mean_decision_latency_us"], stats_dict["p50_decision_latency_us"],
+            stats_dict["p99_decision_latency_us"]))
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from monitoring.performance_monitor import PerformanceMonitor
+from monitoring.streaming_performance_monitor import StreamingPerformanceMonitor, QuantileSketch, \
+    QUANTILE_SKETCH_RELATIVE_ACCURACY
+
+
+class StreamingPerformanceMonitorTest(unittest.TestCase):
+    def test_sketch_relative_error(self):
+        values = np.random.default_rng(0).exponential(30, 10000).round(1)
+        sketch = QuantileSketch()
+        for value in values:
+            sketch.add(value)
+
+        qs = [0, 0.01, 0.5, 0.9, 0.95, 0.99, 1]
+        for q, estimate in zip(qs, sketch.quantiles(qs)):
+            exact = np.percentile(values, q * 100)
+            self.assertLessEqual(abs(estimate - exact), QUANTILE_SKETCH_RELATIVE_ACCURACY * exact + 1e-9)
+
+    def test_same_stats_as_performance_monitor(self):
+        performance_monitor = PerformanceMonitor(floor_count=10)
+        streaming_monitor = StreamingPerformanceMonitor(floor_count=10)
+        for rider_id in range(1000):
+            request_ts = 10 * rider_id
+            wait_time = (rider_id * 7) % 60
+            for monitor in [performance_monitor, streaming_monitor]:
+                monitor.rider_request(request_ts, rider_id, 1, 2, 1)
+                monitor.rider_pickup(request_ts + wait_time, rider_id, 1)
+                monitor.rider_dropoff(request_ts + wait_time + 15, rider_id, 2)
+                monitor.record_decision(1000 + (rider_id * 13) % 500, rider_id % 20)
+
+        # Riders are dropped once they reach their destination
+        self.assertEqual(len(streaming_monitor.active_riders), 0)
+
+        stats = performance_monitor.calculate_performace_stats()
+        streaming_stats = streaming_monitor.calculate_performace_stats()
+        self.assertEqual(list(streaming_stats), list(stats))
+        for key, value in stats.items():
+            if key.startswith("median_") or key.startswith("p9") or key.startswith("p50_"):
+                self.assertLessEqual(abs(streaming_stats[key] - value), QUANTILE_SKETCH_RELATIVE_ACCURACY * value)
+            else:
+                self.assertAlmostEqual(streaming_stats[key], value)
+
+        by_queue_depth = performance_monitor.calculate_decision_latency_by_queue_depth()
+        streaming_by_queue_depth = streaming_monitor.calculate_decision_latency_by_queue_depth()
+        self.assertEqual(list(streaming_by_queue_depth), [0, 1, 2, 4, 8, 16])
+        self.assertEqual(list(streaming_by_queue_depth), list(by_queue_depth))
+        for bucket, bucket_stats in by_queue_depth.items():
+            self.assertEqual(streaming_by_queue_depth[bucket]["decisions"], bucket_stats["decisions"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,85 @@ var elevator_width = 40;
 
 var current_event_index = -1;
 
+// The events are stored as a base64 encoded typed array per column (see PerformanceMonitor.write_visualization_data_file)
+var typed_array_types = {"float64": Float64Array, "int32": Int32Array, "int8": Int8Array};
+
+function decode_column(column) {
+    var binary = atob(column.base64);
+    var bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+
+    return new typed_array_types[column.dtype](bytes.buffer);
+}
+
+var events_count = data["events_count"];
+var keyframe_events = data["keyframe_events"];
+var window_events = keyframe_events * data["window_keyframes"];
+
+// The state right before the first event of every keyframe, for seeking (see PerformanceMonitor._get_keyframes)
+var keyframes = {};
+for (var column_name in data.keyframes) {
+    keyframes[column_name] = decode_column(data.keyframes[column_name]);
+}
+delete data.keyframes;
+
+// Events are loaded a window at a time (every window file calls load_data_window), only the windows around the
+// current event are kept
+var loaded_windows = {};
+var window_load_callbacks = {};
+
+function load_data_window(window_index, columns) {
+    var window_columns = {};
+    for (var column_name in columns) {
+        window_columns[column_name] = decode_column(columns[column_name]);
+    }
+
+    for (var loaded_window_index in loaded_windows) {
+        if (Math.abs(loaded_window_index - window_index) > 1) {
+            delete loaded_windows[loaded_window_index];
+        }
+    }
+    loaded_windows[window_index] = window_columns;
+
+    var callbacks = window_load_callbacks[window_index];
+    delete window_load_callbacks[window_index];
+    callbacks.forEach(function(callback) {callback();});
+}
+
+function with_event_window(event_index, callback) {
+    var window_index = Math.floor(event_index / window_events);
+    if (window_index in loaded_windows) {
+        callback();
+        return;
+    }
+
+    if (window_index in window_load_callbacks) {
+        window_load_callbacks[window_index].push(callback);
+        return;
+    }
+
+    window_load_callbacks[window_index] = [callback];
+    var script = document.createElement("script");
+    script.src = data["window_filename_format"].replace("{}", window_index);
+    script.onload = function() {script.remove();};
+    document.head.appendChild(script);
+}
+
+function get_event(event_index) {
+    var window_columns = loaded_windows[Math.floor(event_index / window_events)];
+    var i = event_index % window_events;
+    var rider = window_columns.rider[i];
+    return {
+        ts: window_columns.ts[i],
+        event_floor: window_columns.event_floor[i],
+        elevator_floor: window_columns.elevator_floor[i],
+        event_type: data.event_types[window_columns.event_type[i]],
+        rider: rider >= 0 ? rider : null
+    };
+}
+
 var floors_count = data["floors"];
 var initial_floor = data["initial_floor"];
 var current_floor = initial_floor;
@@ -19,6 +98,7 @@ var timestamp_display_element = document.getElementById("timestamp_display");
 var event_index_display_element = document.getElementById("event_index_display");
 var event_display_element = document.getElementById("event_display");
 var forward_btn = document.getElementById("forward");
+var seek_timestamp_element = document.getElementById("seek_timestamp");
 
 var canvas = new fabric.Canvas('my_canvas');
 
@@ -122,26 +202,17 @@ function draw_initial_state() {
     canvas.renderAll();
 }
 
-function increase_text_element(element) {
-    var new_count = parseInt(element.text) + 1;
-    element.set('text', '' + new_count);
-
-    if (new_count > 0) {
-        element.setColor('red');
-    }
+function set_text_element_count(element, count) {
+    element.set('text', '' + count);
+    element.setColor(count > 0 ? 'red' : 'black');
+}
 
-    canvas.renderAll();
+function increase_text_element(element) {
+    set_text_element_count(element, parseInt(element.text) + 1);
 }
 
 function decrease_text_element(element) {
-    var new_count = parseInt(element.text) - 1;
-    element.set('text', '' + new_count);
-
-    if (new_count <= 0) {
-        element.setColor('black');
-    }
-
-    canvas.renderAll();
+    set_text_element_count(element, parseInt(element.text) - 1);
 }
 
 function render_request(source_floor) {
@@ -196,8 +267,14 @@ function render_event(event_type, event_floor) {
     canvas.renderAll();
 }
 
+function update_event_display(event) {
+    timestamp_display_element.innerHTML = event.ts;
+    event_index_display_element.innerHTML = current_event_index + ' / ' + events_count;
+    event_display.innerHTML = JSON.stringify(event);
+}
+
 function draw_event() {
-    var event = data.events[current_event_index];
+    var event = get_event(current_event_index);
     var event_floor = event.event_floor;
     var previous_floor = current_floor;
 
@@ -207,9 +284,7 @@ function draw_event() {
     elevator_event_text.set('text', '');
 
     // Update controls display
-    timestamp_display_element.innerHTML = event.ts;
-    event_index_display_element.innerHTML = current_event_index + ' / ' + data.events.length;
-    event_display.innerHTML = JSON.stringify(event);
+    update_event_display(event);
 
     // Move elevator
     visualize_elevator_movement(previous_floor, current_floor);
@@ -218,13 +293,74 @@ function draw_event() {
 }
 
 function step_forward() {
-    current_event_index += 1;
-    if (current_event_index >= data.events.length) {
+    var next_event_index = current_event_index + 1;
+    if (next_event_index >= events_count) {
         alert("No more steps!");
         return;
     }
 
-    draw_event();
+    with_event_window(next_event_index, function() {
+        current_event_index = next_event_index;
+        draw_event();
+    });
+}
+
+function find_keyframe(timestamp) {
+    // Binary search for the last keyframe that starts at or before the timestamp
+    var low = 0;
+    var high = keyframes.ts.length - 1;
+    while (low < high) {
+        var middle = Math.ceil((low + high) / 2);
+        if (keyframes.ts[middle] <= timestamp) {
+            low = middle;
+        } else {
+            high = middle - 1;
+        }
+    }
+
+    return low;
+}
+
+function restore_keyframe(keyframe_index) {
+    var floors_row_start = keyframe_index * (floors_count + 1);
+    for (let floor = 1; floor <= floors_count; floor++) {
+        set_text_element_count(floor_rider_counter_map[floor], keyframes.waiting_riders[floors_row_start + floor]);
+    }
+    set_text_element_count(elevator_riders_count, keyframes.elevator_riders[keyframe_index]);
+    current_floor = keyframes.elevator_floor[keyframe_index];
+}
+
+function seek(timestamp) {
+    if (!events_count) {
+        return;
+    }
+
+    // Start from the keyframe's state, and apply its events up to the timestamp (no later keyframe starts before it,
+    // so they are all in the keyframe)
+    var keyframe_index = find_keyframe(timestamp);
+    var keyframe_start = keyframe_index * keyframe_events;
+    with_event_window(keyframe_start, function() {
+        restore_keyframe(keyframe_index);
+        current_event_index = keyframe_start - 1;
+        var keyframe_end = Math.min(keyframe_start + keyframe_events, events_count);
+        while (current_event_index + 1 < keyframe_end && get_event(current_event_index + 1).ts <= timestamp) {
+            current_event_index += 1;
+            var event = get_event(current_event_index);
+            render_event(event.event_type, event.event_floor);
+            current_floor = event.elevator_floor;
+        }
+
+        if (current_event_index >= 0) {
+            update_event_display(get_event(current_event_index));
+        }
+        elevator_event_text.set('text', '');
+        elevator.set('top', floor_to_elevator_y(current_floor));
+        canvas.renderAll();
+    });
+}
+
+function seek_to_input_timestamp() {
+    seek(parseFloat(seek_timestamp_element.value));
 }
 
 draw_initial_state();
@@ -1,33 +1,101 @@
 import os
+import multiprocessing
+import numpy as np
 import pandas as pd
-import yaml
 from algo.algo_interface import BaseAlgoInterface
 from tqdm import tqdm
 
-from simulation_runner import SimulationRunner
+from simulation_runner import SimulationRunnerFactory, load_elevator_configuration
 
 ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
 
+# Number of worker processes to spread the simulations over (1 runs everything serially in the current process)
+WORKERS = os.cpu_count()
+# Number of simulations handed to a worker process at once - larger chunks mean less IPC overhead,
+# smaller chunks mean better load balancing between workers
+CHUNKSIZE = 8
 
-def run_all_simulations_in_dir(directory, algo_class):
-    with open(ELEVATOR_CONFIGURATION_FILE, 'rb') as f:
-        elevator_conf = yaml.load(f, Loader=yaml.FullLoader)["ELEVATOR"]
+# Runner factories are kept per process, so every worker parses the configuration only once per algo
+_runner_factories = {}
 
-    algo = BaseAlgoInterface.get_algo(algo_class, elevator_conf, 100)
-    print("running all simulations using: {}".format(algo.get_algo_name()))
 
-    stats_dicts = []
-    for filename in tqdm(os.listdir(directory)[:]):
-        if not filename.endswith(".csv"):
-            continue
+def _get_runner_factory(algo_class):
+    if algo_class not in _runner_factories:
+        _runner_factories[algo_class] = SimulationRunnerFactory(algo_class, ELEVATOR_CONFIGURATION_FILE)
+
+    return _runner_factories[algo_class]
+
+
+def _run_single_simulation(simulation):
+    '''
+    Runs a single (algo_class, scenario file, scenario index) simulation and returns its performance stats.
+    The random state is seeded with the scenario index, so stochastic algos (e.g. Q-learning exploration) make the
+    same choices no matter which process runs the simulation, or what it ran before.
+    Defined at module level so it can be pickled and sent to the pool workers.
+    '''
+    algo_class, simulation_filename, scenario_index = simulation
+    np.random.seed(scenario_index)
+    sim_runner = _get_runner_factory(algo_class).get_runner(simulation_filename)
+    sim_runner.run_simulation()
+    return sim_runner.get_performance_stats()
+
+
+def _run_simulations(simulations, workers, chunksize):
+    '''
+    Yields the performance stats of every simulation (see _run_single_simulation), in the same order as the input
+    simulations, no matter how many workers are used. This keeps the parallel output identical to the serial one,
+    apart from the decision latency stats, which are measured wall times.
+    '''
+    if workers == 1:
+        for simulation in tqdm(simulations):
+            yield _run_single_simulation(simulation)
+        return
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        yield from tqdm(pool.imap(_run_single_simulation, simulations, chunksize=chunksize), total=len(simulations))
+
+
+def _get_simulation_filenames(directory):
+    return [os.path.join(directory, filename) for filename in os.listdir(directory) if filename.endswith(".csv")]
+
+
+def _get_algo_name(algo_class):
+    elevator_conf = load_elevator_configuration(ELEVATOR_CONFIGURATION_FILE)["ELEVATOR"]
+    algo = BaseAlgoInterface.get_algo(algo_class, elevator_conf, 100)
+    return algo.get_algo_name()
 
-        sim_runner = SimulationRunner(os.path.join(directory, filename), algo_class, ELEVATOR_CONFIGURATION_FILE)
-        sim_runner.run_simulation()
-        stats = sim_runner.get_performance_stats()
-        stats_dicts.append(stats)
 
+def _write_algo_results(algo_class, stats_dicts):
     df = pd.DataFrame(stats_dicts)
-    df.to_csv(os.path.join("simulation_results", sim_runner.get_algo_name() + ".csv"), index=False)
+    df.to_csv(os.path.join("simulation_results", _get_algo_name(algo_class) + ".csv"), index=False)
+
+
+def run_all_simulations_in_dir(directory, algo_class, workers=1, chunksize=CHUNKSIZE):
+    print("running all simulations using: {}".format(_get_algo_name(algo_class)))
+
+    simulations = [(algo_class, filename, scenario_index)
+                   for scenario_index, filename in enumerate(_get_simulation_filenames(directory))]
+    stats_dicts = list(_run_simulations(simulations, workers, chunksize))
+    _write_algo_results(algo_class, stats_dicts)
+
+
+def run_all_simulations_in_dir_for_algos(directory, algo_classes, workers=WORKERS, chunksize=CHUNKSIZE):
+    '''
+    Spreads all the (algo_class, scenario file) simulations over a single process pool, so that the pool is kept busy
+    across algorithms, and writes every algorithm's results to the same CSV the serial run would have written.
+    '''
+    print("running all simulations using: {}".format(", ".join(_get_algo_name(a) for a in algo_classes)))
+
+    simulation_filenames = _get_simulation_filenames(directory)
+    simulations = [(algo_class, filename, scenario_index)
+                   for algo_class in algo_classes for scenario_index, filename in enumerate(simulation_filenames)]
+
+    algo_to_stats_dicts = {algo_class: [] for algo_class in algo_classes}
+    for (algo_class, _, _), stats in zip(simulations, _run_simulations(simulations, workers, chunksize)):
+        algo_to_stats_dicts[algo_class].append(stats)
+
+    for algo_class, stats_dicts in algo_to_stats_dicts.items():
+        _write_algo_results(algo_class, stats_dicts)
 
 
 def run_multiple_simulations():
@@ -41,8 +109,7 @@ def run_multiple_simulations():
         'algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo'
     ]
 
-    for algo_class in algo_classes_to_run:
-        run_all_simulations_in_dir(sim_data_dir, algo_class)
+    run_all_simulations_in_dir_for_algos(sim_data_dir, algo_classes_to_run, workers=WORKERS, chunksize=CHUNKSIZE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,28 @@
+import glob
+import unittest
+from run_all_simulations import _run_simulations
+
+Q_LEARNING_ALGO_CLASS = 'algo.naive_elevator.q_learning_elevator.q_learning_elevator.QLearningElevatorAlgo'
+SIMULATION_FILENAMES = sorted(glob.glob('demand_simulation_data/manual_scenario/*.csv'))
+
+
+class RunAllSimulationsTest(unittest.TestCase):
+    @staticmethod
+    def _get_simulated_stats(stats_dicts):
+        # (apart from the decision latencies, which are measured wall times)
+        return [{stat_name: value for stat_name, value in stats.items() if "decision_latency" not in stat_name}
+                for stats in stats_dicts]
+
+    def test_parallel_matches_serial(self):
+        # Q-learning explores randomly, so this only holds if every simulation is seeded on its own
+        simulations = [(Q_LEARNING_ALGO_CLASS, filename, scenario_index)
+                       for scenario_index, filename in enumerate(SIMULATION_FILENAMES)]
+        serial_stats = list(_run_simulations(simulations, workers=1, chunksize=1))
+        parallel_stats = list(_run_simulations(simulations, workers=2, chunksize=2))
+
+        self.assertEqual(len(serial_stats), len(SIMULATION_FILENAMES))
+        self.assertEqual(self._get_simulated_stats(parallel_stats), self._get_simulated_stats(serial_stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+from elevator_bank_simulation_runner import ElevatorBankSimulationRunner
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+CARS_COUNT = 4
+
+
+if __name__ == "__main__":
+    bank_runner = ElevatorBankSimulationRunner(
+        elevator_config_filename=ELEVATOR_CONFIGURATION_FILE,
+        simulation_filename='demand_simulation_data/manual_scenario/medium_office_1.csv',
+        algo_class='algo.naive_elevator.knuth_elevator.KnuthElevatorAlgo',
+        dispatcher_class='algo.dispatcher.nearest_car_dispatcher.NearestCarDispatcher',
+        # dispatcher_class='algo.dispatcher.round_robin_dispatcher.RoundRobinDispatcher',
+        cars_count=CARS_COUNT)
+
+    bank_runner.run_simulation()
+    bank_runner.print_performance_stats()
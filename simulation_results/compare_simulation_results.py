@@ -5,6 +5,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 DIRECTORY = "simulation_results"
+# Metrics the algorithms are ranked by (lower is better) - rider time, and the compute cost of the algo's decisions
+RANKING_METRICS = ["mean_time_to_destination", "p99_time_to_destination", "p50_decision_latency_us",
+                   "p99_decision_latency_us"]
 
 
 def _load_algo_results_data():
@@ -26,6 +29,18 @@ def _print_algo_results(algo_results):
         print(results_df.describe())
 
 
+def _print_algo_ranking(algo_results):
+    '''
+    Prints every algo's mean value and rank (1 is best) in each of the RANKING_METRICS, from the best algo by rider
+    time to destination to the worst
+    '''
+    ranking_df = pd.DataFrame({algo_name.split(".")[-1]: {metric: results_df[metric].mean()
+                                                          for metric in RANKING_METRICS if metric in results_df}
+                               for algo_name, results_df in algo_results.items()}).T
+    ranks_df = ranking_df.rank(method='min').add_suffix("_rank")
+    print(pd.concat([ranking_df, ranks_df], axis=1).sort_values(RANKING_METRICS[0]))
+
+
 def _display_plots(algo_results):
     metric_names = list(list(algo_results.values())[0])
     algo_names = [x.split(".")[-1] for x in algo_results.keys()]
@@ -61,6 +76,7 @@ def compare_simulation_results():
 
     algo_results = _load_algo_results_data()
     # _print_algo_results(algo_results)
+    _print_algo_ranking(algo_results)
     _display_plots(algo_results)
 
 
@@ -0,0 +1,75 @@
+import unittest
+from simulation_runner import SimulationRunner, SimulationRunnerFactory
+
+ELEVATOR_CONFIGURATION_FILE = 'elevator_configuration.yaml'
+FIFO_ALGO_CLASS = 'algo.naive_elevator.fifo_elevator.FIFOElevatorAlgo'
+NAIVE_KNUTH_ALGO_CLASS = 'algo.naive_elevator.knuth_elevator.KnuthElevatorAlgo'
+SHABBAT_ALGO_CLASS = 'algo.naive_elevator.shabbat_elevator.ShabbatElevatorAlgo'
+UP_DOWN_KNUTH_ALGO_CLASS = 'algo.up_down_elevator.knuth_elevator.KnuthElevatorAlgo'
+MANUAL_SCENARIO_DIR = 'demand_simulation_data/manual_scenario/'
+
+# (algo class, scenario) -> (time to complete all tasks, total wait time, total ride time)
+EXPECTED_STATS = {
+    (FIFO_ALGO_CLASS, 'simple_1.csv'): (184, 499, 473),
+    (FIFO_ALGO_CLASS, 'small_office_2.csv'): (149, 454, 532),
+    (FIFO_ALGO_CLASS, 'tiny_office_1.csv'): (104, 220, 253),
+    (NAIVE_KNUTH_ALGO_CLASS, 'simple_1.csv'): (150, 281, 285),
+    (NAIVE_KNUTH_ALGO_CLASS, 'small_office_2.csv'): (112, 366, 480),
+    (NAIVE_KNUTH_ALGO_CLASS, 'tiny_office_1.csv'): (104, 202, 217),
+    (SHABBAT_ALGO_CLASS, 'simple_1.csv'): (475, 518, 1672),
+    (SHABBAT_ALGO_CLASS, 'small_office_2.csv'): (271, 878, 1303),
+    (SHABBAT_ALGO_CLASS, 'tiny_office_1.csv'): (119, 456, 863),
+    (UP_DOWN_KNUTH_ALGO_CLASS, 'simple_1.csv'): (150, 281, 285),
+    (UP_DOWN_KNUTH_ALGO_CLASS, 'small_office_2.csv'): (112, 366, 480),
+    (UP_DOWN_KNUTH_ALGO_CLASS, 'tiny_office_1.csv'): (104, 202, 217),
+}
+
+
+class SimulationRunnerTest(unittest.TestCase):
+    @staticmethod
+    def _get_stats_summary(sim_runner):
+        stats = sim_runner.get_performance_stats()
+        return stats["time_to_complete_all_tasks"], stats["total_wait_time"], stats["total_ride_time"]
+
+    def test_expected_stats(self):
+        for (algo_class, scenario), expected_stats in EXPECTED_STATS.items():
+            with self.subTest(algo_class=algo_class, scenario=scenario):
+                sim_runner = SimulationRunner(MANUAL_SCENARIO_DIR + scenario, algo_class, ELEVATOR_CONFIGURATION_FILE)
+                sim_runner.run_simulation()
+                self.assertEqual(self._get_stats_summary(sim_runner), expected_stats)
+
+    def test_factory_runner_reset(self):
+        runner_factory = SimulationRunnerFactory(NAIVE_KNUTH_ALGO_CLASS, ELEVATOR_CONFIGURATION_FILE)
+        for scenario in ['simple_1.csv', 'tiny_office_1.csv', 'simple_1.csv']:
+            sim_runner = runner_factory.get_runner(MANUAL_SCENARIO_DIR + scenario)
+            sim_runner.run_simulation()
+            self.assertEqual(self._get_stats_summary(sim_runner), EXPECTED_STATS[(NAIVE_KNUTH_ALGO_CLASS, scenario)])
+
+    def test_streaming_metrics(self):
+        for scenario in ['simple_1.csv', 'small_office_2.csv']:
+            with self.subTest(scenario=scenario):
+                sim_runner = SimulationRunner(MANUAL_SCENARIO_DIR + scenario, UP_DOWN_KNUTH_ALGO_CLASS,
+                                              ELEVATOR_CONFIGURATION_FILE, streaming_metrics=True)
+                sim_runner.run_simulation()
+                self.assertEqual(self._get_stats_summary(sim_runner), EXPECTED_STATS[(UP_DOWN_KNUTH_ALGO_CLASS,
+                                                                                      scenario)])
+                with self.assertRaises(Exception):
+                    sim_runner.write_visualization_data_file()
+
+    def test_profile(self):
+        sim_runner = SimulationRunner(MANUAL_SCENARIO_DIR + 'simple_1.csv', NAIVE_KNUTH_ALGO_CLASS,
+                                      ELEVATOR_CONFIGURATION_FILE, profile=True)
+        sim_runner.run_simulation()
+        self.assertEqual(self._get_stats_summary(sim_runner), EXPECTED_STATS[(NAIVE_KNUTH_ALGO_CLASS, 'simple_1.csv')])
+
+        stats = sim_runner.get_performance_stats()
+        self.assertEqual(stats["profile_scheduler.run_calls"], 1)
+        # The riders requesting a ride at the same time are registered at once
+        request_timestamps = {sim_runner.simulation_events.timestamp(rider_id)
+                              for rider_id in range(sim_runner.simulation_events_count)}
+        self.assertEqual(stats["profile_algo.register_rider_sources_calls"], len(request_timestamps))
+        self.assertIn("profile_elevator.run_to_next_task_or_max_ts_p99_us", stats)
+
+
+if __name__ == '__main__':
+    unittest.main()